@@ -1,66 +1,139 @@
-import os
+import math
 import random
 from PIL import Image
 from pathlib import Path
-from rembg import remove
+from rembg import remove, new_session
+
+# The background remover's model works at 320x320, so its mask is computed
+# on a copy of the photo at most this size and upsampled to the output. This
+# approximates the full-resolution mask; edges can differ by a pixel or two.
+MASK_WORK_SIZE = 1024
+TENSOR_SIZE = (128, 128)  # CNN input size, as in fruitdetection.py
 
 def random_color():
     return tuple(random.randint(0, 255) for _ in range(3))
 
-def crop_to_content(img):
-    bbox = img.getbbox()
-    if bbox:
-        return img.crop(bbox)
-    return img
+def open_at_least(path, size):
+    # JPEG files are decoded at 1/2, 1/4 or 1/8 scale when that is still at least `size`
+    img = Image.open(path)
+    img.draft('RGB', size)
+    return img.convert('RGB')
 
-def create_background(bg_mode, size, bg_images_dir=None):
+def create_background(bg_mode, size, bg_paths=None):
     if bg_mode == 'color':
         return Image.new('RGB', size, random_color())
-    elif bg_mode == 'image' and bg_images_dir:
-        bg_path = random.choice(list(Path(bg_images_dir).glob("*")))
-        bg = Image.open(bg_path).convert('RGB')
-        return bg.resize(size)
+    elif bg_mode == 'image' and bg_paths:
+        return open_at_least(random.choice(bg_paths), size).resize(size)
     else:
         raise ValueError("Invalid background mode or background directory not provided.")
 
-def pad_with_background(fruit_img, padding_ratio, bg_mode, bg_images_dir=None):
-    w, h = fruit_img.size
+def find_fruit(img_path, session, work_size=MASK_WORK_SIZE):
+    '''
+    Run the background remover on a reduced copy of the photo
+
+    Returns the full-resolution size of the photo, the mask of the copy and
+    the fruit's bounding box in the copy (the whole copy if no fruit was found).
+    '''
+    with Image.open(img_path) as img:
+        full_size = img.size
+        img.draft('RGB', (work_size, work_size))
+        small = img.convert('RGB')
+    small.thumbnail((work_size, work_size), Image.LANCZOS)
+    mask = remove(small, session=session, only_mask=True)
+    bbox = mask.getbbox() or (0, 0) + mask.size
+    return full_size, mask, bbox
+
+def compose_padded(img_path, padding_ratio, bg_mode, session, bg_paths=None, max_size=512):
+    '''
+    Cut out the fruit and composite it on a background, working at output resolution
+
+    The fruit's bounding box is padded by padding_ratio on each side and
+    the result scaled down to fit max_size. The scale is worked out before
+    any pixels are touched: the photo is decoded only as large as the
+    output needs, the fruit and its mask are resampled once, and the
+    background is generated directly at the output size.
+    '''
+    (full_w, full_h), mask, bbox = find_fruit(img_path, session)
+    sx, sy = full_w / mask.width, full_h / mask.height
+
+    # Fruit size and padding at full resolution, then the output size
+    w = max(1, round((bbox[2] - bbox[0]) * sx))
+    h = max(1, round((bbox[3] - bbox[1]) * sy))
     pad_w = int(w * padding_ratio)
     pad_h = int(h * padding_ratio)
-    new_size = (w + 2 * pad_w, h + 2 * pad_h)
+    canvas_w, canvas_h = w + 2 * pad_w, h + 2 * pad_h
+    scale = min(1.0, max_size / max(canvas_w, canvas_h))
+    size = (int(canvas_w * scale), int(canvas_h * scale))
+    ex, ey = size[0] / canvas_w, size[1] / canvas_h
 
-    bg = create_background(bg_mode, new_size, bg_images_dir)
-    bg.paste(fruit_img, (pad_w, pad_h), fruit_img)
+    # Output pixels the fruit covers, and the full-resolution area they show
+    x0, y0 = math.floor(pad_w * ex), math.floor(pad_h * ey)
+    x1, y1 = min(size[0], math.ceil((pad_w + w) * ex)), min(size[1], math.ceil((pad_h + h) * ey))
+    left, top = bbox[0] * sx - pad_w, bbox[1] * sy - pad_h
+    area = (max(0.0, left + x0 / ex), max(0.0, top + y0 / ey),
+            min(full_w, left + x1 / ex), min(full_h, top + y1 / ey))
+
+    photo = open_at_least(img_path, (math.ceil(full_w * ex), math.ceil(full_h * ey)))
+    kx, ky = photo.width / full_w, photo.height / full_h
+    fruit = photo.resize((x1 - x0, y1 - y0), resample=Image.LANCZOS,
+                         box=(area[0] * kx, area[1] * ky, area[2] * kx, area[3] * ky))
+    fruit_mask = mask.resize(fruit.size, resample=Image.LANCZOS,
+                             box=(area[0] / sx, area[1] / sy, area[2] / sx, area[3] / sy))
+
+    bg = create_background(bg_mode, size, bg_paths)
+    bg.paste(fruit, (x0, y0), fruit_mask)
     return bg
 
-def process_images(input_dir, output_dir, padding_range=(0.2, 0.4), bg_modes=['color', 'image'], bg_images_dir=None):
+def label_from_path(relative_path):
+    # 0 = Fresh, 1 = Rotten, as label_map in fruitdetection.py ("rottenapples", "Rotten/banana", ...)
+    return int(any('rotten' in part.lower() for part in relative_path.parts[:-1]))
+
+def save_tensor(pixels, labels, tensor_path, groups=None):
+    # Same layout as fruit_dataset_padded_128.pt in CNN_basic_raspi.ipynb: float RGB in [0, 1];
+    # 'groups' holds near-duplicate group ids for a group-aware train/test split
+    import torch
+    w, h = TENSOR_SIZE
+    data = torch.frombuffer(bytearray(b''.join(pixels)), dtype=torch.uint8)
+    data = data.view(len(pixels), h, w, 3).permute(0, 3, 1, 2).float().div(255)
+    dataset = {'data': data, 'labels': torch.tensor(labels)}
+    if groups is not None:
+        dataset['groups'] = torch.tensor(groups)
+    torch.save(dataset, tensor_path)
+    print(f"Saved {len(pixels)} images to {tensor_path}")
+
+def process_images(input_dir, output_dir, padding_range=(0.2, 0.4), bg_modes=['color', 'image'], bg_images_dir=None,
+                   tensor_path=None, groups=None):
+    # groups: {path relative to input_dir: near-duplicate group id}, as loaded by dedup.load_groups()
     input_paths = list(Path(input_dir).rglob("*.[jp][pn]g"))
+    bg_paths = list(Path(bg_images_dir).glob("*")) if bg_images_dir else None
+    session = new_session()  # Load the background removal model once, not for every image
+    pixels, labels, image_groups = [], [], []  # Training tensor contents, if tensor_path is set
+    next_group = max(groups.values(), default=-1) + 1 if groups else 0  # For images missing from groups
 
     for img_path in input_paths:
         try:
-            img = Image.open(img_path).convert("RGBA")
-            fruit_nobg = remove(img)
-            fruit_nobg = crop_to_content(fruit_nobg)
             bg_mode = random.choice(bg_modes)
             padding_ratio = random.uniform(*padding_range)
-            new_img = pad_with_background(fruit_nobg, padding_ratio, bg_mode, bg_images_dir)
+            new_img = compose_padded(img_path, padding_ratio, bg_mode, session, bg_paths, max_size=512)
 
             relative_path = img_path.relative_to(input_dir).with_suffix('')
             save_subdir = Path(output_dir) / relative_path.parent
             save_subdir.mkdir(parents=True, exist_ok=True)
             save_path = save_subdir / f"{img_path.stem}_padded.jpg"
-            new_img = resize_image_max_size(new_img, max_size=512)
             new_img.save(save_path)
+            if tensor_path:
+                pixels.append(new_img.resize(TENSOR_SIZE, resample=Image.BILINEAR).tobytes())
+                labels.append(label_from_path(relative_path))
+                if groups is not None:
+                    group = groups.get(img_path.relative_to(input_dir).as_posix())
+                    if group is None:
+                        group, next_group = next_group, next_group + 1
+                    image_groups.append(group)
         except Exception as e:
             print(f"❌ Failed to process {img_path.name}: {e}")
 
-def resize_image_max_size(img, max_size=512):
-    w, h = img.size
-    if max(w, h) <= max_size:
-        return img
-    scale = max_size / max(w, h)
-    new_size = (int(w * scale), int(h * scale))
-    return img.resize(new_size, resample=Image.LANCZOS)
+    if tensor_path and pixels:
+        save_tensor(pixels, labels, tensor_path, image_groups if groups is not None else None)
 
 
 input_directory = "./dataset"
@@ -68,5 +141,13 @@ output_directory = "./fruit_padded1"
 padding_range = (0.15, 0.4)
 background_modes = ['color', 'image']
 background_images_dir = "./bg_pool"
+tensor_output = None  # e.g. "./fruit_dataset_padded_128.pt" to also write the 128x128 training tensor
+duplicate_report = None  # e.g. "./duplicates.csv" from dedup.py, to store near-duplicate groups in the tensor
 
-process_images(input_directory, output_directory, padding_range, background_modes, background_images_dir)
+if __name__ == "__main__":
+    groups = None
+    if duplicate_report:
+        from dedup import load_groups
+        groups = load_groups(duplicate_report)
+    process_images(input_directory, output_directory, padding_range, background_modes, background_images_dir,
+                   tensor_output, groups)
@@ -0,0 +1,175 @@
+import csv
+import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+
+# Difference hash: HASH_SIZE x HASH_SIZE bits, each telling whether a pixel of a
+# tiny greyscale copy is brighter than its right neighbour. Resized, recompressed
+# or slightly re-lit copies of a photo land within a few bits of each other.
+HASH_SIZE = 8
+MAX_DISTANCE = 6  # Largest Hamming distance (of 64 bits) between near-duplicates
+
+def image_hash(path, hash_size=HASH_SIZE):
+    # Returns (hash, width, height); JPEG files are decoded straight to a small greyscale copy
+    with Image.open(path) as img:
+        width, height = img.size
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        small = img.convert('L').resize((hash_size + 1, hash_size), resample=Image.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for y in range(hash_size):
+        row = pixels[y * (hash_size + 1):(y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            bits = bits << 1 | (row[x] < row[x + 1])
+    return bits, width, height
+
+def _hash_or_none(path):
+    try:
+        return image_hash(path)
+    except Exception as e:
+        print(f"❌ Failed to hash {Path(path).name}: {e}")
+        return None
+
+def hash_images(paths, workers=None):
+    # One worker process per CPU by default; decoding dominates, so this scales with cores
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_hash_or_none, paths, chunksize=32))
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class BandIndex:
+    '''
+    Exact near-neighbour index over Hamming distance (multi-index hashing, a form of LSH)
+
+    Hashes are cut into radius + 1 bands. Two hashes within radius bits of
+    each other agree exactly on at least one band, so a search only
+    compares the hashes that share a band value with the query.
+    '''
+    def __init__(self, radius, bits=HASH_SIZE * HASH_SIZE):
+        edges = [bits * k // (radius + 1) for k in range(radius + 2)]
+        self.bands = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self.tables = [{} for _ in self.bands]
+        self.radius = radius
+        self.values = {}
+
+    def add(self, value, item):
+        self.values[item] = value
+        for (shift, mask), table in zip(self.bands, self.tables):
+            table.setdefault(value >> shift & mask, []).append(item)
+
+    def search(self, value):
+        # Returns (distance, item) of every item within radius of value
+        found, seen = [], set()
+        for (shift, mask), table in zip(self.bands, self.tables):
+            for item in table.get(value >> shift & mask, ()):
+                if item not in seen:
+                    seen.add(item)
+                    d = hamming(value, self.values[item])
+                    if d <= self.radius:
+                        found.append((d, item))
+        return found
+
+def find_groups(hashes, max_distance=MAX_DISTANCE):
+    # Group id per image: images within max_distance of each other, directly or through a chain, share a group
+    parent = list(range(len(hashes)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = BandIndex(max_distance)
+    for i, h in enumerate(hashes):
+        if h is not None:
+            index.add(h, i)
+    for i, h in enumerate(hashes):
+        if h is None:
+            continue
+        for _, j in index.search(h):
+            a, b = root(i), root(j)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    ids = {}
+    return [ids.setdefault(root(i), len(ids)) for i in range(len(hashes))]
+
+def choose_kept(paths, groups, sizes):
+    # Keep the largest image of each group within each class directory, so pruning never drops a class
+    best = {}
+    for i, path in enumerate(paths):
+        key = (groups[i], path.parent)
+        if key not in best or sizes[i] > sizes[best[key]]:
+            best[key] = i
+    return set(best.values())
+
+def group_split(groups, test_size=0.2, seed=0):
+    # 'train' or 'test' per image, with every near-duplicate group entirely on one side
+    members = {}
+    for i, g in enumerate(groups):
+        members.setdefault(g, []).append(i)
+    order = list(members)
+    random.Random(seed).shuffle(order)
+    split = ['train'] * len(groups)
+    target = test_size * len(groups)
+    in_test = 0
+    for g in order:
+        if in_test >= target:
+            break
+        for i in members[g]:
+            split[i] = 'test'
+        in_test += len(members[g])
+    return split
+
+def load_groups(report_path):
+    # {relative path: group id} from a report written by find_duplicates()
+    with open(report_path, newline='') as f:
+        return {row['path']: int(row['group']) for row in csv.DictReader(f)}
+
+def find_duplicates(input_dir, report_path, max_distance=MAX_DISTANCE, test_size=0.2, pruned_dir=None,
+                    workers=None, seed=0):
+    input_paths = sorted(Path(input_dir).rglob("*.[jp][pn]g"))
+    results = hash_images(input_paths, workers)
+    hashes = [r[0] if r else None for r in results]
+    sizes = [r[1] * r[2] if r else 0 for r in results]
+    groups = find_groups(hashes, max_distance)
+    kept = choose_kept(input_paths, groups, sizes)
+    split = group_split(groups, test_size, seed)
+
+    with open(report_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'group', 'hash', 'kept', 'split'])
+        for i, path in enumerate(input_paths):
+            writer.writerow([path.relative_to(input_dir).as_posix(), groups[i],
+                             f"{hashes[i]:016x}" if hashes[i] is not None else '', int(i in kept), split[i]])
+
+    counts = {}
+    for g in groups:
+        counts[g] = counts.get(g, 0) + 1
+    duplicated = sum(n for n in counts.values() if n > 1)
+    print(f"{len(input_paths)} images, {len(counts)} groups; {duplicated} images in {sum(n > 1 for n in counts.values())} "
+          f"groups of near-duplicates (largest: {max(counts.values(), default=0)}); "
+          f"{len(input_paths) - len(kept)} would be pruned")
+    print(f"Report written to {report_path}")
+
+    if pruned_dir:
+        # Copy, never delete: the pruned directory is what addpadding.process_images() reads
+        for i in sorted(kept):
+            target = Path(pruned_dir) / input_paths[i].relative_to(input_dir)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(input_paths[i], target)
+        print(f"Copied {len(kept)} images to {pruned_dir}")
+    return groups
+
+
+input_directory = "./dataset"
+report_file = "./duplicates.csv"
+pruned_directory = None  # e.g. "./dataset_dedup" to also copy one image per near-duplicate group
+max_distance = MAX_DISTANCE
+test_fraction = 0.2
+
+if __name__ == "__main__":
+    find_duplicates(input_directory, report_file, max_distance, test_fraction, pruned_directory)
@@ -0,0 +1,224 @@
+"""
+Indexed binary archive of rotated G6 motion logs
+
+check_and_rotate_json.sh moves each day's logs to
+ArchieveLog/motion_log_<date>.json and motion_sensor_log_<date>.json.
+build() converts every rotated day into two sorted, fixed-width segments
+per kind under ArchieveLog/segments/:
+
+    <kind>_<date>.ts   float64 epoch timestamps, ascending (native byte order)
+    <kind>_<date>.st   uint8 state per timestamp
+
+where kind is "elevation" (desk signal 0/1/2) or "presence" (PIR 0/1).
+index.json records count, first and last timestamp of every segment, so a
+query only opens the days it overlaps. Each day's segments are then
+memory-mapped and binary-searched, so no JSON is parsed at query time.
+The daily presence/standing/sitting totals are computed once per day at
+build time and kept in the index, so reports over months read one file.
+
+Usage:
+    python archive.py build
+    python archive.py report --from 2025-04-01 --to 2025-04-30
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import re
+from array import array
+from datetime import date, datetime, timedelta
+
+from rollup import PresenceRollup
+
+
+ARCHIVE_DIR = "/home/pi/Desktop/G6Final/ArchieveLog"
+SEGMENT_DIR = "segments"
+INDEX_NAME = "index.json"
+
+# kind -> (source log prefix, timestamp parser, state field)
+SOURCES = {
+    "elevation": ("motion_log", float, "signal"),
+    "presence": ("motion_sensor_log", lambda ts: datetime.fromisoformat(ts).timestamp(), "gpio_state"),
+}
+DATE_RE = re.compile(r"^(motion_log|motion_sensor_log)_(\d{4}-\d{2}-\d{2})\.json$")
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Archive:
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        """
+        :param archive_dir: Directory the rotation script archives into
+        """
+        self.archive_dir = archive_dir
+        self.segment_dir = os.path.join(archive_dir, SEGMENT_DIR)
+        self.index_path = os.path.join(self.segment_dir, INDEX_NAME)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        for kind in SOURCES:
+            index.setdefault(kind, {})
+        index.setdefault("totals", {})
+        return index
+
+    def _segment_path(self, kind, day, ext):
+        return os.path.join(self.segment_dir, f"{kind}_{day}.{ext}")
+
+    # ----- conversion -----
+
+    def build(self):
+        """Convert rotated days that are new or changed; returns the days converted"""
+        os.makedirs(self.segment_dir, exist_ok=True)
+        prefix_kind = {prefix: kind for kind, (prefix, _, _) in SOURCES.items()}
+        converted = []
+        for name in sorted(os.listdir(self.archive_dir)):
+            match = DATE_RE.match(name)
+            if not match:
+                continue
+            kind, day = prefix_kind[match.group(1)], match.group(2)
+            source = os.path.join(self.archive_dir, name)
+            mtime = os.path.getmtime(source)
+            if self.index[kind].get(day, {}).get("source_mtime") == mtime:
+                continue
+            self._convert(kind, day, source, mtime)
+            converted.append((kind, day))
+        # A day's segments can hold events of the days either side of it (rotation
+        # is not exactly at midnight), so their totals may have changed too
+        known = set().union(*(self.index[kind] for kind in SOURCES))
+        affected = set()
+        for _, day in converted:
+            d = date.fromisoformat(day)
+            affected.update(n.isoformat() for n in (d - timedelta(days=1), d, d + timedelta(days=1)))
+        for day in sorted(affected & known):
+            self.index["totals"][day] = self.day_summary(day)
+        _write_atomic(self.index_path, json.dumps(self.index, sort_keys=True).encode())
+        return converted
+
+    def _convert(self, kind, day, source, mtime):
+        _, parse_time, field = SOURCES[kind]
+        try:
+            with open(source, "r") as f:
+                entries = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Skipping {source}: {e}")
+            return
+
+        rows = sorted((parse_time(e["timestamp"]), int(e[field])) for e in entries)
+        timestamps = array("d", (t for t, _ in rows))
+        states = array("B", (s for _, s in rows))
+        _write_atomic(self._segment_path(kind, day, "ts"), timestamps.tobytes())
+        _write_atomic(self._segment_path(kind, day, "st"), states.tobytes())
+        self.index[kind][day] = {
+            "count": len(rows),
+            "first": rows[0][0] if rows else None,
+            "last": rows[-1][0] if rows else None,
+            "source_mtime": mtime,
+        }
+
+    # ----- queries -----
+
+    def days(self, kind):
+        return sorted(self.index[kind])
+
+    def totals(self, day):
+        """Cached daily totals, computed from the segments if not in the index"""
+        if day not in self.index["totals"]:
+            self.index["totals"][day] = self.day_summary(day)
+        return self.index["totals"][day]
+
+    def range(self, kind, start, end):
+        """
+        Events of one kind with start <= timestamp < end, in time order
+
+        :return: List of (timestamp, state)
+        """
+        result = []
+        for day in self.days(kind):
+            meta = self.index[kind][day]
+            if not meta["count"] or meta["last"] < start or meta["first"] >= end:
+                continue
+            result.extend(self._read_range(kind, day, start, end))
+        return result
+
+    def _read_range(self, kind, day, start, end):
+        with open(self._segment_path(kind, day, "ts"), "rb") as ts_file, \
+                open(self._segment_path(kind, day, "st"), "rb") as st_file, \
+                mmap.mmap(ts_file.fileno(), 0, access=mmap.ACCESS_READ) as ts_map, \
+                mmap.mmap(st_file.fileno(), 0, access=mmap.ACCESS_READ) as st_map:
+            raw = memoryview(ts_map)
+            timestamps = raw.cast("d")
+            try:
+                lo = bisect.bisect_left(timestamps, start)
+                hi = bisect.bisect_left(timestamps, end)
+                rows = list(zip(timestamps[lo:hi].tolist(), st_map[lo:hi]))
+            finally:
+                # The maps cannot be closed while views into them exist
+                timestamps.release()
+                raw.release()
+        return rows
+
+    def day_summary(self, day):
+        """Presence/elevation totals for one archived day (see rollup.py)"""
+        start = datetime.strptime(day, "%Y-%m-%d").timestamp()
+        end = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).timestamp()
+        events = [(t, "presence", s) for t, s in self.range("presence", start, end)]
+        events += [(t, "elevation", s) for t, s in self.range("elevation", start, end)]
+        if not events:
+            return None
+
+        rollup = PresenceRollup(summary_path=None)
+        for timestamp, kind, state in sorted(events):
+            if kind == "presence":
+                rollup.add_motion(timestamp, state)
+            else:
+                rollup.add_elevation(timestamp, state)
+        return rollup.totals
+
+    def report(self, first_day, last_day):
+        """Daily totals (standing/sitting seconds, minutes present/up/down) for a span of days"""
+        report = {}
+        day = date.fromisoformat(first_day)
+        while day <= date.fromisoformat(last_day):
+            totals = self.totals(day.isoformat())
+            if totals is not None:
+                report[day.isoformat()] = totals
+            day += timedelta(days=1)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the G6 log archive")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--from", dest="first_day", help="First day of the report (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="last_day", help="Last day of the report (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    archive = Archive(args.archive_dir)
+    if args.command == "build":
+        converted = archive.build()
+        print(f"{len(converted)} segment(s) converted")
+        return
+
+    last_day = args.last_day or date.today().isoformat()
+    first_day = args.first_day or (date.fromisoformat(last_day) - timedelta(days=30)).isoformat()
+    report = archive.report(first_day, last_day)
+    print("Day         Standing  Sitting  Present")
+    for day, totals in report.items():
+        print(f"{day}  {totals['standing_s'] // 60:7d}m {totals['sitting_s'] // 60:7d}m {totals['present_min']:7d}m")
+
+
+if __name__ == "__main__":
+    main()
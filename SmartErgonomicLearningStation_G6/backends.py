@@ -0,0 +1,267 @@
+"""
+GPIO and messaging backends for the G6 station
+
+The desk controller and the motion monitor take a GPIO object with the
+RPi.GPIO interface and a messaging object with publish/subscribe methods.
+On the Pi these are RPi.GPIO and PubNub; the in-memory fakes below let the
+same code run and be benchmarked on any machine.
+"""
+
+import queue
+import threading
+import time
+
+
+# PubNub settings shared by gpio_control.py and motion-alert-pubnub.py
+PUBLISH_KEY = 'pub-c-85ba3694-4855-4861-a14b-fdfcb90cf839'
+SUBSCRIBE_KEY = 'sub-c-7c1de1d9-ea5b-451f-bb88-35ae502a81c4'
+DEVICE_UUID = 'userId'
+CHANNEL = 'chenweisong728'
+
+
+def load_rpi_gpio():
+    """Import RPi.GPIO only when real hardware is requested"""
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+class FakeGPIO:
+    """In-memory stand-in for the RPi.GPIO module"""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.levels = {}
+        self.write_count = 0
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.pins[pin] = direction
+            if initial is not None:
+                self.levels[pin] = int(initial)
+            else:
+                self.levels.setdefault(pin, 0)
+
+    def output(self, pin, value):
+        with self._lock:
+            self.levels[pin] = int(bool(value))
+            self.write_count += 1
+
+    def input(self, pin):
+        return self.levels.get(pin, 0)
+
+    def cleanup(self, pins=None):
+        with self._lock:
+            if pins is None:
+                pins = list(self.pins)
+            elif isinstance(pins, int):
+                pins = [pins]
+            for pin in pins:
+                self.pins.pop(pin, None)
+                self.levels.pop(pin, None)
+                self._callbacks.pop(pin, None)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            if pin in self._callbacks:
+                raise RuntimeError(f"Conflicting edge detection already enabled for GPIO{pin}")
+            self._callbacks[pin] = (edge, [callback] if callback else [])
+
+    def add_event_callback(self, pin, callback):
+        with self._lock:
+            self._callbacks[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._callbacks.pop(pin, None)
+
+    def set_input(self, pin, value):
+        """Drive an input pin from a test or simulator and fire edge callbacks"""
+        value = int(bool(value))
+        with self._lock:
+            previous = self.levels.get(pin, 0)
+            self.levels[pin] = value
+            edge, callbacks = self._callbacks.get(pin, (None, []))
+        if previous == value or edge is None:
+            return
+        rising = value == 1
+        if edge == self.BOTH or (edge == self.RISING) == rising:
+            for callback in list(callbacks):
+                callback(pin)
+
+
+class PubNubMessaging:
+    """Publish/subscribe over a single PubNub client"""
+
+    def __init__(self, publish_key=PUBLISH_KEY, subscribe_key=SUBSCRIBE_KEY, uuid=DEVICE_UUID):
+        from pubnub.pnconfiguration import PNConfiguration
+        from pubnub.pubnub import PubNub
+        from pubnub.callbacks import SubscribeCallback
+
+        pnconfig = PNConfiguration()
+        pnconfig.publish_key = publish_key
+        pnconfig.subscribe_key = subscribe_key
+        pnconfig.uuid = uuid
+        self.uuid = uuid
+        self.pubnub = PubNub(pnconfig)
+        self._handlers = {}
+
+        messaging = self
+
+        class _Listener(SubscribeCallback):
+            def message(self, pubnub, message):
+                for handler in list(messaging._handlers.get(message.channel, [])):
+                    try:
+                        handler(message.message, message.timetoken)
+                    except Exception as e:
+                        print(f"Error processing message: {e}")
+
+        self.pubnub.add_listener(_Listener())
+
+    def publish(self, channel, message):
+        """Publish and wait for the result; raises on failure"""
+        envelope = self.pubnub.publish().channel(channel).message(message).sync()
+        if envelope.status.is_error():
+            raise RuntimeError(envelope.status.error_data)
+        return envelope
+
+    def subscribe(self, channel, handler):
+        """Call handler(message, timetoken) for every message on channel"""
+        first = channel not in self._handlers
+        self._handlers.setdefault(channel, []).append(handler)
+        if first:
+            self.pubnub.subscribe().channels(channel).execute()
+
+    def unsubscribe(self, channel, handler):
+        """Remove one handler; the channel is left when no handlers remain"""
+        handlers = self._handlers.get(channel, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if channel in self._handlers and not handlers:
+            del self._handlers[channel]
+            self.pubnub.unsubscribe().channels(channel).execute()
+
+    def close(self):
+        self._handlers.clear()
+        self.pubnub.unsubscribe_all()
+        self.pubnub.stop()
+
+
+class FakeMessaging:
+    """In-memory publish/subscribe bus that records every published message"""
+
+    def __init__(self, uuid=DEVICE_UUID, publish_delay=0.0):
+        self.uuid = uuid
+        self.publish_delay = publish_delay
+        self.published = []
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        if self.publish_delay:
+            time.sleep(self.publish_delay)
+        timetoken = int(time.time() * 1e7)
+        with self._lock:
+            self.published.append((time.time(), channel, message))
+            handlers = list(self._handlers.get(channel, []))
+        for handler in handlers:
+            handler(message, timetoken)
+
+    def subscribe(self, channel, handler):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+
+    def unsubscribe(self, channel, handler):
+        with self._lock:
+            handlers = self._handlers.get(channel, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def close(self):
+        with self._lock:
+            self._handlers.clear()
+
+
+class RetryingPublisher:
+    """
+    Publish from a background thread, retrying failures with backoff
+
+    publish() only queues the message, so callers (timer callbacks, GPIO
+    handlers) never wait on the network.
+    """
+
+    def __init__(self, messaging, retries=3, backoff=1.0):
+        """
+        :param messaging: Backend with publish(channel, message)
+        :param retries: Attempts after the first failure
+        :param backoff: Delay before the first retry, doubled on each attempt
+        """
+        self.messaging = messaging
+        self.retries = retries
+        self.backoff = backoff
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def publish(self, channel, message, on_done=None):
+        """Queue a message; on_done(ok) is called once it is sent or given up on"""
+        self._queue.put((channel, message, on_done))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            channel, message, on_done = item
+            delay = self.backoff
+            for attempt in range(self.retries + 1):
+                try:
+                    self.messaging.publish(channel, message)
+                    self.sent += 1
+                    ok = True
+                    break
+                except Exception as e:
+                    print(f"Publish failed (attempt {attempt + 1}): {e}")
+                    if attempt < self.retries:
+                        time.sleep(delay)
+                        delay *= 2
+            else:
+                self.failed += 1
+                ok = False
+            if on_done is not None:
+                on_done(ok)
@@ -0,0 +1,243 @@
+"""
+Replay recorded G6 traces against the in-memory backends
+
+Drives GPIOPubNubController and MotionAlertMonitor with FakeGPIO and
+FakeMessaging, replaying motion_log.json (desk commands) and
+motion_sensor_log.json (PIR edges) at N times real speed, then pushes the
+command trace through as fast as possible. Reports commands/sec, cost of
+each log write, PIR detection latency and no-motion alert latency.
+
+Usage:
+    python bench_station.py --speed 60 --desks 4
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from backends import CHANNEL, FakeGPIO, FakeMessaging
+from gpio_control import GPIOPubNubController
+from station import load_motion_alert_module
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_COMMAND_TRACE = os.path.join(HERE, 'frontend-wwebpage', 'motion_log.json')
+DEFAULT_MOTION_TRACE = os.path.join(HERE, 'frontend-wwebpage', 'motion_sensor_log.json')
+
+
+def load_command_trace(path):
+    """Return [(seconds_from_start, signal)] from a motion_log.json file"""
+    with open(path) as f:
+        entries = sorted(json.load(f), key=lambda e: e['timestamp'])
+    if not entries:
+        return []
+    start = entries[0]['timestamp']
+    return [(e['timestamp'] - start, e['signal']) for e in entries]
+
+
+def load_motion_trace(path):
+    """Return [(seconds_from_start, gpio_state)] from a motion_sensor_log.json file"""
+    with open(path) as f:
+        entries = json.load(f)
+    events = sorted(
+        (datetime.fromisoformat(e['timestamp']).timestamp(), e['gpio_state']) for e in entries
+    )
+    if not events:
+        return []
+    start = events[0][0]
+    return [(t - start, state) for t, state in events]
+
+
+def replay(events, speed, apply):
+    """Call apply(value) for each event, compressing the gaps by speed (0 = no gaps)"""
+    start = time.monotonic()
+    for offset, value in events:
+        if speed:
+            delay = start + offset / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        apply(value)
+
+
+def summarize_ms(samples):
+    """Mean / p95 (nearest rank) / max of a list of seconds, in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p95_ms": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(samples, fn):
+    """Wrap fn so every call's duration is appended to samples"""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+def run_desk(index, args, commands, motions, motion_alert, workdir, results):
+    """Replay both traces against one simulated desk"""
+    messaging = FakeMessaging()
+    controller = GPIOPubNubController(
+        coalesce_window=args.window / args.speed, local_port=None,
+        gpio=FakeGPIO(), messaging=messaging,
+        motion_log_file=os.path.join(workdir, f'motion_log_{index}.json'),
+    )
+    log_writes = []
+    controller._log_motion = timed(log_writes, controller._log_motion)
+
+    pir = FakeGPIO()
+    monitor = motion_alert.MotionAlertMonitor(
+        gpio=pir, messaging=messaging,
+        no_motion_thresholds=[t / args.speed for t in args.thresholds],
+        motion_log_file=os.path.join(workdir, f'motion_sensor_log_{index}.json'),
+    )
+    monitor.pir.debounce /= args.speed
+
+    # Edge injection times, to measure detection and alert latency
+    injected = []
+    detections = []
+    save_event = monitor.save_motion_event
+
+    def save_and_measure(event):
+        if injected:
+            detections.append(time.monotonic() - injected[-1][0])
+        save_event(event)
+    monitor.save_motion_event = save_and_measure
+
+    def inject(state):
+        injected.append((time.monotonic(), state))
+        pir.set_input(monitor.pir_pin, state)
+
+    def publish_command(value):
+        messaging.publish(CHANNEL, {"value": value})
+
+    controller.start()
+    monitor.start()
+    alerts_before = time.monotonic()
+
+    desk_thread = threading.Thread(target=replay, args=(commands, args.speed, publish_command))
+    pir_thread = threading.Thread(target=replay, args=(motions, args.speed, inject))
+    desk_thread.start()
+    pir_thread.start()
+    desk_thread.join()
+    pir_thread.join()
+    # Let the first no-motion deadline after the trace pass
+    time.sleep(2 * min(args.thresholds) / args.speed)
+    monitor.stop()
+
+    # Alert latency: publish time minus (last falling edge + threshold)
+    alert_latency = []
+    wall_to_mono = time.monotonic() - time.time()
+    for published_at, _, message in messaging.published:
+        if not (isinstance(message, dict) and message.get('alert') == 'no_motion'):
+            continue
+        at = published_at + wall_to_mono
+        falling = [t for t, state in injected if not state and t <= at]
+        base = falling[-1] if falling else alerts_before
+        alert_latency.append(max(0.0, at - (base + message['threshold'])))
+
+    timed_status = controller.get_status()
+
+    # Throughput: the command trace back to back, repeated, with coalescing off.
+    # Each command is handed over only once the previous one has been applied,
+    # so every change of value reaches the pins and the log.
+    controller.pipeline.window = 0
+
+    def publish_when_idle(value):
+        controller.pipeline.wait_idle()
+        publish_command(value)
+
+    flat_out = commands * args.repeat
+    applied_before = controller.pipeline.counters["applied"]
+    started = time.perf_counter()
+    replay(flat_out, 0, publish_when_idle)
+    controller.pipeline.wait_idle()
+    elapsed = time.perf_counter() - started
+    applied = controller.pipeline.counters["applied"] - applied_before
+    controller.stop()
+
+    results[index] = {
+        "timed": timed_status,
+        "submitted_per_s": len(flat_out) / elapsed if elapsed else 0.0,
+        "applied_per_s": applied / elapsed if elapsed else 0.0,
+        "log_writes": log_writes,
+        "detections": detections,
+        "missed_edges": len(injected) - len(detections),
+        "alert_latency": alert_latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay G6 traces against simulated desks")
+    parser.add_argument('--commands', default=DEFAULT_COMMAND_TRACE, help="motion_log.json trace")
+    parser.add_argument('--motion', default=DEFAULT_MOTION_TRACE, help="motion_sensor_log.json trace")
+    parser.add_argument('--speed', type=float, default=60.0, help="Replay speed multiplier")
+    parser.add_argument('--desks', type=int, default=1, help="Simulated desks in this process")
+    parser.add_argument('--repeat', type=int, default=20, help="Repeats of the flat-out command replay")
+    parser.add_argument('--window', type=float, default=0.1, help="Coalescing window (trace seconds)")
+    parser.add_argument('--thresholds', type=lambda s: [float(t) for t in s.split(',')],
+                        default=[10.0, 1800.0, 3600.0], help="No-motion thresholds, comma separated (trace seconds)")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    commands = load_command_trace(args.commands)
+    motions = load_motion_trace(args.motion)
+    motion_alert = load_motion_alert_module()
+    print(f"Replaying {len(commands)} commands and {len(motions)} PIR edges "
+          f"at {args.speed:g}x on {args.desks} desk(s)")
+
+    results = {}
+    # The components print every movement and event; keep the report readable
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        threads = [
+            threading.Thread(target=run_desk, args=(i, args, commands, motions, motion_alert, workdir, results))
+            for i in range(args.desks)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    counters = {}
+    for r in results.values():
+        for key, n in r["timed"]["counters"].items():
+            counters[key] = counters.get(key, 0) + n
+
+    report = {
+        "desks": args.desks,
+        "speed": args.speed,
+        "command_counters": counters,
+        "pubnub_actuation_latency": [
+            {k: v for k, v in r["timed"]["actuation_latency"]["pubnub"].items() if k != "buckets"}
+            for r in results.values()
+        ],
+        "submitted_cmds_per_s": round(sum(r["submitted_per_s"] for r in results.values()), 1),
+        "applied_cmds_per_s": round(sum(r["applied_per_s"] for r in results.values()), 1),
+        "log_write": summarize_ms([s for r in results.values() for s in r["log_writes"]]),
+        "pir_detection_latency": summarize_ms([s for r in results.values() for s in r["detections"]]),
+        "pir_missed_edges": sum(r["missed_edges"] for r in results.values()),
+        "alert_latency": summarize_ms([s for r in results.values() for s in r["alert_latency"]]),
+    }
+    print(json.dumps(report, indent=2))
+    print("Latencies are wall-clock at the replay speed; timers and windows are scaled by 1/speed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,9 @@ if [ "$LAST_DATE" != "$TODAY" ]; then
     echo "[]" > "$DATA_DIR/motion_sensor_log.json"
 
     echo "$TODAY" > "$DATE_FILE"
+
+    # Convert the newly archived day into indexed binary segments
+    python3 "$DATA_DIR/archive.py" build --archive-dir "$ARCHIVE_DIR"
 else
     echo "Same date, no need to archieve"
 fi
@@ -0,0 +1,116 @@
+"""
+Edge-triggered GPIO input with software debounce
+
+Edges are captured by GPIO.add_event_detect and stamped with
+time.monotonic() in the interrupt callback. A debounce thread only passes
+on a level once it has been stable for the debounce period, and delivers
+it through a queue stamped with the time of the original transition.
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+
+# level: 0/1, monotonic: time.monotonic() of the transition,
+# timestamp: the same instant in epoch seconds
+Edge = namedtuple('Edge', ['level', 'monotonic', 'timestamp'])
+
+
+class EdgeInput:
+    def __init__(self, gpio, pin, debounce=0.05, poll_interval=0.05):
+        """
+        :param gpio: Object with the RPi.GPIO interface
+        :param pin: Input pin to watch (must already be set up as an input)
+        :param debounce: Seconds a new level must hold before it is reported
+        :param poll_interval: Sampling period if edge detection is unavailable
+        """
+        self.gpio = gpio
+        self.pin = pin
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.edges = queue.Queue()
+        self.level = None
+        self.using_interrupts = False
+        self._raw = queue.Queue()
+        self._running = False
+        self._threads = []
+        # Wall clock anchor, so monotonic stamps can be reported as epoch time
+        self._wall_anchor = time.time()
+        self._mono_anchor = time.monotonic()
+
+    def to_wall_time(self, monotonic):
+        """Convert a time.monotonic() value to epoch seconds"""
+        return self._wall_anchor + (monotonic - self._mono_anchor)
+
+    def start(self):
+        """Begin watching the pin; the current level becomes the reference"""
+        self._running = True
+        self.level = self.gpio.input(self.pin)
+        self._threads = [threading.Thread(target=self._debounce, daemon=True)]
+        try:
+            self.gpio.add_event_detect(self.pin, self.gpio.BOTH, callback=self._on_edge)
+            self.using_interrupts = True
+        except RuntimeError as e:
+            print(f"Edge detection unavailable on GPIO{self.pin} ({e}), polling instead")
+            self._threads.append(threading.Thread(target=self._poll, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        if self.using_interrupts:
+            self.gpio.remove_event_detect(self.pin)
+            self.using_interrupts = False
+        self._raw.put(None)
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+    def is_alive(self):
+        return bool(self._threads) and all(thread.is_alive() for thread in self._threads)
+
+    def get(self, timeout=None):
+        """Return the next debounced Edge, or None on timeout"""
+        try:
+            return self.edges.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _on_edge(self, channel):
+        # Interrupt context: stamp and hand off, nothing else
+        self._raw.put((time.monotonic(), self.gpio.input(self.pin)))
+
+    def _poll(self):
+        last = self.level
+        while self._running:
+            level = self.gpio.input(self.pin)
+            if level != last:
+                self._raw.put((time.monotonic(), level))
+                last = level
+            time.sleep(self.poll_interval)
+
+    def _debounce(self):
+        candidate = None  # (monotonic of the transition, level)
+        while self._running:
+            timeout = None
+            if candidate is not None:
+                timeout = max(0.0, candidate[0] + self.debounce - time.monotonic())
+            try:
+                raw = self._raw.get(timeout=timeout)
+            except queue.Empty:
+                # The candidate level held for the whole debounce period
+                stamp, level = candidate
+                candidate = None
+                if level != self.level:
+                    self.level = level
+                    self.edges.put(Edge(level, stamp, self.to_wall_time(stamp)))
+                continue
+            if raw is None:
+                return
+            stamp, level = raw
+            if level == self.level:
+                # Bounced back to the reported level
+                candidate = None
+            elif candidate is None or candidate[1] != level:
+                candidate = (stamp, level)
@@ -1,43 +1,405 @@
-import RPi.GPIO as GPIO
-from pubnub.pnconfiguration import PNConfiguration
-from pubnub.pubnub import PubNub
-from pubnub.callbacks import SubscribeCallback
 import time
 import json
+import argparse
 import os
+import bisect
+import ipaddress
+import itertools
+import socket
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from backends import CHANNEL, PubNubMessaging, load_rpi_gpio
+
+# Web origins, besides the LAN endpoint itself (which serves remote.html),
+# whose pages may send commands to it, e.g. "http://192.168.1.20:8000".
+# Add more at runtime with --allow-origin (station.py, gpio_control.py).
+LOCAL_ALLOWED_ORIGINS = ()
+REMOTE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'remote.html')
+
+
+def metadata_error(sent_at, command_id):
+    """Describe what is wrong with a command's sent_at or id, or return None if both are usable"""
+    if sent_at is not None and (isinstance(sent_at, bool) or not isinstance(sent_at, (int, float))):
+        return "sent_at must be a number of epoch seconds"
+    if command_id is not None and not isinstance(command_id, str):
+        return "id must be a string"
+    return None
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram, values in milliseconds
+
+    Negative samples (the sender's clock ahead of the Pi's) are not
+    bucketed; they are counted and the most negative one is kept, so clock
+    skew shows up in the snapshot instead of being hidden as 0 ms.
+    """
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.negative = 0
+        self.min_negative_ms = None
+
+    def record(self, latency_ms):
+        """Add one latency sample to its bucket"""
+        if latency_ms < 0:
+            self.negative += 1
+            self.min_negative_ms = min(latency_ms, self.min_negative_ms or 0.0)
+            return
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, p):
+        """Upper bucket bound containing the p-th percentile (None if empty)"""
+        if self.count == 0:
+            return None
+        target = self.count * p / 100.0
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.max_ms
+
+    def snapshot(self):
+        """Return the histogram as a JSON-friendly dict"""
+        buckets = {f"<={b}ms": n for b, n in zip(self.BUCKETS_MS, self.counts)}
+        buckets[f">{self.BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "buckets": buckets,
+            "negative": self.negative,
+            "min_negative_ms": round(self.min_negative_ms, 2) if self.min_negative_ms is not None else None,
+        }
+
+
+class CommandPipeline:
+    """
+    Latest-wins command pipeline between the transports and the GPIO pins.
+
+    The first command after a quiet period is applied immediately. Commands
+    that arrive while the coalescing window is open replace each other and
+    only the latest one is applied when the window closes, so a burst of
+    up/stop/down messages results in at most two pin writes. A command equal
+    to the value already on the pins is dropped without touching GPIO.
+
+    Commands may carry a client-generated id. The same command delivered by
+    both the local endpoint and PubNub is only accepted once.
+    """
+
+    RECENT_ID_LIMIT = 256
+
+    def __init__(self, apply_fn, window=0.1):
+        """
+        :param apply_fn: Callable(value, seq) that drives the pins
+        :param window: Coalescing window in seconds
+        """
+        self.apply_fn = apply_fn
+        self.window = window
+        self._seq = itertools.count(1)
+        self._cond = threading.Condition()
+        self._pending = None
+        self._applying = False
+        self._window_until = 0.0
+        self._running = False
+        self._thread = None
+        self.last_value = None
+        self.last_seq = 0
+        self._recent_ids = OrderedDict()
+        self.counters = {"received": 0, "applied": 0, "coalesced": 0, "redundant": 0, "duplicate": 0}
+        self.source_counts = {}
+        # Sender timestamp -> GPIO write, per source. "pubnub" is measured from the
+        # PubNub timetoken; "local" from the client's own sent_at, so it includes
+        # the offset between the client's clock and the Pi's
+        self.actuation_latency = {"pubnub": LatencyHistogram(), "local": LatencyHistogram()}
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, value, sent_at=None, command_id=None, source="pubnub"):
+        """
+        Queue a command and return its sequence number
+
+        :param value: Movement value (0-2)
+        :param sent_at: Sender timestamp in epoch seconds, if known
+        :param command_id: Client-generated id used to drop duplicates
+        :param source: Transport the command arrived on
+        :return: Sequence number, or None if the command is a duplicate
+        :raises TypeError: If sent_at is not a number or command_id not a string
+        """
+        error = metadata_error(sent_at, command_id)
+        if error is not None:
+            raise TypeError(error)
+        received_at = time.time()
+        with self._cond:
+            if command_id is not None:
+                if command_id in self._recent_ids:
+                    self.counters["duplicate"] += 1
+                    return None
+                self._recent_ids[command_id] = received_at
+                if len(self._recent_ids) > self.RECENT_ID_LIMIT:
+                    self._recent_ids.popitem(last=False)
+            seq = next(self._seq)
+            self.counters["received"] += 1
+            self.source_counts[source] = self.source_counts.get(source, 0) + 1
+            if self._pending is not None:
+                self.counters["coalesced"] += 1
+            self._pending = (seq, value, sent_at, source)
+            self._cond.notify_all()  # The worker, and any wait_idle() callers
+        return seq
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                # Keep collecting while the window from the last write is open
+                remaining = self._window_until - time.monotonic()
+                while self._running and remaining > 0:
+                    self._cond.wait(remaining)
+                    remaining = self._window_until - time.monotonic()
+                seq, value, sent_at, source = self._pending
+                self._pending = None
+                if value == self.last_value:
+                    self.counters["redundant"] += 1
+                    self._cond.notify_all()
+                    continue
+                self._applying = True
+
+            # Pin writes happen outside the lock so that submitters never wait on GPIO
+            try:
+                self.apply_fn(value, seq)
+            except Exception as e:
+                print(f"Error applying command {seq}: {e}")
+                with self._cond:
+                    self._applying = False
+                    self._cond.notify_all()
+                continue
+
+            applied_at = time.time()
+            with self._cond:
+                self._applying = False
+                self._cond.notify_all()
+                self._window_until = time.monotonic() + self.window
+                self.last_value = value
+                self.last_seq = seq
+                self.counters["applied"] += 1
+                if sent_at is not None:
+                    histogram = self.actuation_latency.setdefault(source, LatencyHistogram())
+                    histogram.record((applied_at - sent_at) * 1000)
+
+    def wait_idle(self, timeout=None):
+        """
+        Block until no command is waiting or being applied
+
+        :param timeout: Seconds to wait at most (None waits forever)
+        :return: True if the pipeline is idle, False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._applying, timeout)
+
+    def status(self):
+        """Return counters and latency histograms"""
+        with self._cond:
+            return {
+                "window_s": self.window,
+                "last_value": self.last_value,
+                "last_seq": self.last_seq,
+                "counters": dict(self.counters),
+                "sources": dict(self.source_counts),
+                "actuation_latency": {source: h.snapshot() for source, h in self.actuation_latency.items()},
+            }
+
+
+class LocalCommandHandler(BaseHTTPRequestHandler):
+    """
+    LAN endpoint for desk commands
+
+    POST /command {"value": 0-2, "id": "...", "sent_at": epoch_seconds}
+    GET  /status
+    GET  /remote.html (also /)
+
+    This endpoint moves the desk motor, so browsers may only reach it from the
+    pages it serves itself or from the origins in the controller's
+    allowed_origins. A plain-text POST is sent without a CORS preflight, so the
+    Origin header is checked on every request. Requests without an Origin
+    header (curl, scripts on the LAN) are accepted.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def _own_origin(self):
+        """
+        Origin of the pages this endpoint serves, as the browser reached it
+
+        Only an IP address or this Pi's own host name counts: a page on some
+        other domain that resolves to the Pi (DNS rebinding) must not match.
+        """
+        host = self.headers.get('Host', '')
+        name = host.rsplit(':', 1)[0] if not host.endswith(']') else host
+        name = name.strip('[]').lower()
+        try:
+            ipaddress.ip_address(name)
+        except ValueError:
+            if name.removesuffix('.local') != socket.gethostname().lower():
+                return None
+        return f"http://{host}"
+
+    def _origin_allowed(self):
+        origin = self.headers.get('Origin')
+        return (origin is None or origin in self.server.controller.allowed_origins
+                or origin == self._own_origin())
+
+    def _send_cors_headers(self):
+        origin = self.headers.get('Origin')
+        if origin is not None and origin in self.server.controller.allowed_origins:
+            self.send_header('Access-Control-Allow-Origin', origin)
+            self.send_header('Vary', 'Origin')
+            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+
+    def _send_json(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self._send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_page(self, path):
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            self._send_json(404, {"status": "error", "message": "Resource not found"})
+            return
+        self.send_response(200)
+        self.send_header('Content-type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self._origin_allowed():
+            self._send_json(403, {"status": "error", "message": "Origin not allowed"})
+        elif self.path == '/status':
+            self._send_json(200, self.server.controller.get_status())
+        elif self.path in ('/', '/remote.html'):
+            self._send_page(REMOTE_PAGE)
+        else:
+            self._send_json(404, {"status": "error", "message": "Resource not found"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length)
+        except ValueError:
+            self._send_json(400, {"status": "error", "message": "Invalid Content-Length"})
+            return
+        if not self._origin_allowed():
+            self._send_json(403, {"status": "error", "message": "Origin not allowed"})
+            return
+        if self.path != '/command':
+            self._send_json(404, {"status": "error", "message": "Resource not found"})
+            return
+        try:
+            data = json.loads(body.decode())
+            value = data.get("value")
+        except (ValueError, AttributeError):
+            self._send_json(400, {"status": "error", "message": "Invalid JSON data"})
+            return
+
+        sent_at, command_id = data.get("sent_at"), data.get("id")
+        error = metadata_error(sent_at, command_id)
+        if error is not None:
+            self._send_json(400, {"status": "error", "message": error})
+            return
+        if not self.server.controller.is_valid_command(value):
+            self._send_json(400, {"status": "error", "message": "Value must be between 0-2"})
+            return
+
+        seq = self.server.controller.submit_command(value, sent_at, command_id, source="local")
+        self._send_json(200, {"status": "success", "seq": seq, "duplicate": seq is None})
+
+    def do_OPTIONS(self):
+        self.send_response(204 if self._origin_allowed() else 403)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Keep the console for movement output
+        pass
 
 
 class GPIOPubNubController:
-    def __init__(self, output_pins=(17, 27)):
+    def __init__(self, output_pins=(17, 27), coalesce_window=0.1, local_port=5600,
+                 gpio=None, messaging=None, channel=CHANNEL, motion_log_file='motion_log.json',
+                 allowed_origins=LOCAL_ALLOWED_ORIGINS):
         """
         Initialize GPIO setup and PubNub configuration
         
         :param output_pins: Tuple of two GPIO pin numbers (default: 17, 27)
+        :param coalesce_window: Seconds during which bursts of commands are merged
+        :param local_port: Port of the LAN command endpoint (None to disable)
+        :param gpio: Object with the RPi.GPIO interface (default: RPi.GPIO)
+        :param messaging: Publish/subscribe backend (default: PubNub)
+        :param channel: Channel carrying movement commands
+        :param motion_log_file: JSON file that records applied commands
+        :param allowed_origins: Web origins, besides the endpoint's own pages, allowed
+                                to use the LAN endpoint from a browser
         """
         self.output_pins = output_pins
+        self.local_port = local_port
+        self.allowed_origins = frozenset(allowed_origins)
+        self.local_server = None
+        self._server_thread = None
+        self.gpio = gpio if gpio is not None else load_rpi_gpio()
+        self.messaging = messaging if messaging is not None else PubNubMessaging()
+        self.channel = channel
         
         # Setup GPIO
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
         
         # Set both pins as outputs
         for pin in self.output_pins:
-            GPIO.setup(pin, GPIO.OUT)
-            
-        # PubNub Configuration
-        pnconfig = PNConfiguration()
-        pnconfig.publish_key = 'pub-c-85ba3694-4855-4861-a14b-fdfcb90cf839'
-        pnconfig.subscribe_key = 'sub-c-7c1de1d9-ea5b-451f-bb88-35ae502a81c4'
-        pnconfig.uuid = 'userId'
-        self.channel = 'chenweisong728'
-        self.pubnub = PubNub(pnconfig)
-        
-        # Add message listener with self reference
-        self.pubnub.add_listener(self.MySubscribeCallback(self))
+            self.gpio.setup(pin, self.gpio.OUT)
         
         # Initialize motion log file
-        self.motion_log_file = 'motion_log.json'
+        self.motion_log_file = motion_log_file
         self._initialize_motion_log()
+
+        # Commands from all transports go through the coalescing pipeline
+        self.pipeline = CommandPipeline(self.set_output, window=coalesce_window)
         
     def _initialize_motion_log(self):
         """Initialize the motion log file if it doesn't exist"""
@@ -45,7 +407,7 @@ class GPIOPubNubController:
             with open(self.motion_log_file, 'w') as f:
                 json.dump([], f)
                 
-    def _log_motion(self, signal):
+    def _log_motion(self, signal, seq=None):
         """Log motion signal to the JSON file"""
         try:
             # Read existing logs
@@ -53,10 +415,13 @@ class GPIOPubNubController:
                 logs = json.load(f)
             
             # Add new log entry
-            logs.append({
+            entry = {
                 "timestamp": time.time(),
                 "signal": signal
-            })
+            }
+            if seq is not None:
+                entry["seq"] = seq
+            logs.append(entry)
             
             # Write back to file
             with open(self.motion_log_file, 'w') as f:
@@ -64,7 +429,46 @@ class GPIOPubNubController:
         except Exception as e:
             print(f"Error logging motion: {e}")
         
-    def set_output(self, value):
+    @staticmethod
+    def is_valid_command(value):
+        """Check that a movement value is an integer between 0-2"""
+        return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 2
+
+    def submit_command(self, value, sent_at=None, command_id=None, source="pubnub"):
+        """
+        Validate a movement command and hand it to the pipeline
+
+        :param value: Integer between 0-2 representing movement direction
+        :param sent_at: Sender timestamp in epoch seconds, if known
+        :param command_id: Client-generated id shared by all transports
+        :param source: Transport the command arrived on ("pubnub" or "local")
+        :return: Sequence number of the command, or None if rejected or duplicate
+        """
+        if not self.is_valid_command(value):
+            print(f"Invalid input: {value}. Must be between 0-2.")
+            return None
+        error = metadata_error(sent_at, command_id)
+        if error is not None:
+            print(f"Invalid command from {source}: {error}")
+            return None
+        return self.pipeline.submit(value, sent_at, command_id, source)
+
+    def start_local_server(self):
+        """Serve the LAN command endpoint on a background thread"""
+        if self.local_port is None:
+            return
+        self.local_server = ThreadingHTTPServer(('0.0.0.0', self.local_port), LocalCommandHandler)
+        self.local_server.daemon_threads = True
+        self.local_server.controller = self
+        self._server_thread = threading.Thread(target=self.local_server.serve_forever, daemon=True)
+        self._server_thread.start()
+        print(f"Local command endpoint on port {self.local_port}")
+
+    def get_status(self):
+        """Return pipeline counters and latency histograms"""
+        return self.pipeline.status()
+
+    def set_output(self, value, seq=None):
         """
         Set 2-bit output based on input value
         Value mapping:
@@ -73,38 +477,60 @@ class GPIOPubNubController:
         - 2 (10) = down
         
         :param value: Integer between 0-2 representing movement direction
+        :param seq: Sequence number assigned by the command pipeline
         """
         if value < 0 or value > 2:
             print(f"Invalid input: {value}. Must be between 0-2.")
             return
         
         # Convert value to binary and set pins
-        GPIO.output(self.output_pins[0], value & 1)  # Least significant bit
-        GPIO.output(
+        self.gpio.output(self.output_pins[0], value & 1)  # Least significant bit
+        self.gpio.output(
             self.output_pins[1], 
             (value >> 1) & 1
         )  # Most significant bit
         
         # Log the motion signal
-        self._log_motion(value)
+        self._log_motion(value, seq)
         
         # Print status with movement direction
         direction = "Stop" if value == 0 else "Up" if value == 1 else "Down"
-        print(f"Movement: {direction} (Binary: {value:02b})")
+        print(f"Movement: {direction} (Binary: {value:02b}) [seq {seq}]")
         print(f"Pin {self.output_pins[1]}: {(value >> 1) & 1}")
         print(f"Pin {self.output_pins[0]}: {value & 1}")
 
-    class MySubscribeCallback(SubscribeCallback):
-        def __init__(self, controller):
-            self.controller = controller
-            
-        def message(self, pubnub, message):
-            try:
-                value = message.message.get("value")
-                if value is not None:
-                    self.controller.set_output(value)
-            except Exception as e:
-                print(f"Error processing message: {e}")
+    def _on_message(self, message, timetoken):
+        """Handle a movement command from the messaging backend"""
+        value = message.get("value") if isinstance(message, dict) else None
+        if value is not None:
+            # Timetoken is in units of 100 ns since the epoch
+            sent_at = timetoken / 1e7 if timetoken else None
+            self.submit_command(value, sent_at, message.get("id"), source="pubnub")
+
+    def start(self):
+        """Start the command pipeline, the LAN endpoint and the subscription"""
+        self.pipeline.start()
+        self.start_local_server()
+        self.messaging.subscribe(self.channel, self._on_message)
+
+    def stop(self):
+        """Stop accepting commands and release this controller's pins only"""
+        self.messaging.unsubscribe(self.channel, self._on_message)
+        if self.local_server is not None:
+            self.local_server.shutdown()
+            self.local_server.server_close()
+            self.local_server = None
+        self.pipeline.stop()
+        print(f"Command pipeline status: {json.dumps(self.get_status())}")
+        self.gpio.cleanup(list(self.output_pins))
+
+    def healthy(self):
+        """True while the command pipeline and the LAN endpoint are running"""
+        if not self.pipeline.is_alive():
+            return False
+        if self.local_port is not None:
+            return self._server_thread is not None and self._server_thread.is_alive()
+        return True
 
     def run(self):
         """Main control loop for PubNub subscription"""
@@ -114,7 +540,7 @@ class GPIOPubNubController:
             print("0 = Stop (00)")
             print("1 = Down (01)")
             print("2 = Up (10)")
-            self.pubnub.subscribe().channels(self.channel).execute()
+            self.start()
             
             while True:
                 time.sleep(1)
@@ -123,13 +549,19 @@ class GPIOPubNubController:
             print("\nProgram terminated by user")
         finally:
             # Clean up GPIO and unsubscribe
-            GPIO.cleanup()
-            self.pubnub.unsubscribe_all()
+            self.stop()
+            self.messaging.close()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Desk control over PubNub and the LAN")
+    parser.add_argument('--allow-origin', action='append', default=[], metavar='ORIGIN',
+                        help="Web origin allowed to use the LAN endpoint, besides its own "
+                             "remote.html (repeatable), e.g. http://192.168.1.20:8000")
+    args = parser.parse_args()
+
     # Create controller with default pins 17 and 27
-    controller = GPIOPubNubController()
+    controller = GPIOPubNubController(allowed_origins=LOCAL_ALLOWED_ORIGINS + tuple(args.allow_origin))
     controller.run()
 
 
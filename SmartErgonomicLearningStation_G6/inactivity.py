@@ -0,0 +1,77 @@
+"""
+Event-driven inactivity deadlines with escalation
+
+InactivityTimer holds a single threading.Timer for the next pending
+threshold. A falling PIR edge (motion stopped) starts the inactivity
+period and arms the first threshold; when it fires, the next one is armed
+relative to the same start. A rising edge cancels everything. Nothing
+wakes up while a person is present or between deadlines.
+"""
+
+import threading
+import time
+
+
+class InactivityTimer:
+    def __init__(self, thresholds, on_alert):
+        """
+        :param thresholds: Seconds of inactivity at which to alert, e.g. (10, 1800, 3600)
+        :param on_alert: Callable(level, threshold, seconds_inactive), level counting from 1
+        """
+        self.thresholds = sorted(thresholds)
+        self.on_alert = on_alert
+        self.inactive_since = None  # time.monotonic() of the last falling edge
+        self._next_level = 0
+        self._timer = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def motion_started(self):
+        """Someone is moving: drop all pending deadlines"""
+        with self._lock:
+            self._cancel_locked()
+            self.inactive_since = None
+
+    def motion_stopped(self, at=None):
+        """
+        Start an inactivity period
+
+        :param at: time.monotonic() of the edge (default: now)
+        """
+        with self._lock:
+            self._cancel_locked()
+            self.inactive_since = time.monotonic() if at is None else at
+            self._next_level = 0
+            self._arm_locked()
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self):
+        # A timer that already started running sees the new generation and exits
+        self._generation += 1
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _arm_locked(self):
+        if self._next_level >= len(self.thresholds):
+            return
+        deadline = self.inactive_since + self.thresholds[self._next_level]
+        self._timer = threading.Timer(
+            max(0.0, deadline - time.monotonic()), self._fire, args=(self._generation,)
+        )
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            level = self._next_level + 1
+            threshold = self.thresholds[self._next_level]
+            seconds_inactive = time.monotonic() - self.inactive_since
+            self._next_level += 1
+            self._arm_locked()
+        self.on_alert(level, threshold, seconds_inactive)
@@ -1,118 +1,149 @@
 # Importing required libraries
-from pubnub.pubnub import PubNub
-from pubnub.pnconfiguration import PNConfiguration
-import RPi.GPIO as GPIO
 import time
 import threading
 import json
 from datetime import datetime
 
-# PubNub Configuration
-pnconf = PNConfiguration()
-pnconf.publish_key = 'pub-c-85ba3694-4855-4861-a14b-fdfcb90cf839'
-pnconf.subscribe_key = 'sub-c-7c1de1d9-ea5b-451f-bb88-35ae502a81c4'
-pnconf.uuid = 'userId'
-pubnub = PubNub(pnconf)
-channel = 'chenweisong728'
-
-# GPIO Setup for motion sensor
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-pir_pin = 19  # Motion sensor on GPIO pin 26
-GPIO.setup(pir_pin, GPIO.IN)
-
-# Global variables
-last_motion_time = time.time()
-no_motion_threshold = 10  # seconds before sending alert
-alert_sent = False  # Flag to track if alert has been sent
-last_motion_state = False  # Track the last motion state
-motion_log_file = 'motion_sensor_log.json'  # File to store motion events
-
-def load_motion_log():
-    """Load existing motion log or create new one"""
-    try:
-        with open(motion_log_file, 'r') as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
+from backends import CHANNEL, PubNubMessaging, RetryingPublisher, load_rpi_gpio
+from edge_input import EdgeInput
+from inactivity import InactivityTimer
+
+
+class MotionAlertMonitor:
+    def __init__(self, gpio=None, messaging=None, pir_pin=19, no_motion_thresholds=(10, 1800, 3600),
+                 motion_log_file='motion_sensor_log.json', channel=CHANNEL, debounce=0.05):
+        """
+        Initialize the PIR input and the alert channel
+
+        :param gpio: Object with the RPi.GPIO interface (default: RPi.GPIO)
+        :param messaging: Publish/subscribe backend (default: PubNub)
+        :param pir_pin: GPIO pin of the motion sensor
+        :param no_motion_thresholds: Seconds without motion at which escalating alerts are sent
+        :param motion_log_file: JSON file that stores motion events
+        :param channel: Channel the alerts are published on
+        :param debounce: Seconds the PIR level must hold before an edge counts
+        """
+        self.gpio = gpio if gpio is not None else load_rpi_gpio()
+        self.messaging = messaging if messaging is not None else PubNubMessaging()
+        self.pir_pin = pir_pin
+        self.motion_log_file = motion_log_file  # File to store motion events
+        self.channel = channel
+
+        # GPIO Setup for motion sensor
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
+        self.gpio.setup(self.pir_pin, self.gpio.IN)
+        self.pir = EdgeInput(self.gpio, self.pir_pin, debounce=debounce)
+
+        # Alerts are armed by motion edges and published off the timer thread
+        self.inactivity = InactivityTimer(no_motion_thresholds, self.send_alert)
+        self.publisher = RetryingPublisher(self.messaging)
+
+        self.last_motion_state = False  # Track the last motion state
+        self._running = False
+        self._threads = []
+
+    def load_motion_log(self):
+        """Load existing motion log or create new one"""
+        try:
+            with open(self.motion_log_file, 'r') as f:
+                data = json.load(f)
+                if isinstance(data, list):
+                    return data
+                return []
+        except (FileNotFoundError, json.JSONDecodeError):
             return []
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def save_motion_event(event):
-    """Save motion event to JSON file"""
-    log_data = load_motion_log()
-    log_data.append(event)
-    with open(motion_log_file, 'w') as f:
-        json.dump(log_data, f, indent=4)
-
-def check_motion():
-    """Thread function to continuously check for motion"""
-    global last_motion_time, alert_sent, last_motion_state
-    
-    while True:
-        current_motion = GPIO.input(pir_pin)
-        
-        # Check if motion state has changed
-        if current_motion != last_motion_state:
+
+    def save_motion_event(self, event):
+        """Save motion event to JSON file"""
+        log_data = self.load_motion_log()
+        log_data.append(event)
+        with open(self.motion_log_file, 'w') as f:
+            json.dump(log_data, f, indent=4)
+
+    def check_motion(self):
+        """Thread function that handles debounced PIR edges as they arrive"""
+        while self._running:
+            edge = self.pir.get(timeout=0.5)
+            if edge is None:
+                continue
+            current_motion = edge.level
+
+            # Stamp the event with the time of the edge, not of its handling
             event = {
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': datetime.fromtimestamp(edge.timestamp).isoformat(),
                 'status': 'motion_detected' if current_motion else 'no_motion',
                 'gpio_state': current_motion
             }
-            save_motion_event(event)
-            last_motion_state = current_motion
-            
+            self.save_motion_event(event)
+            self.last_motion_state = current_motion
+
             if current_motion:
                 print("Motion detected!")
-                last_motion_time = time.time()
-                alert_sent = False
+                self.inactivity.motion_started()
             else:
                 print("Motion stopped")
-        
-        time.sleep(0.5)  # Small delay to avoid multiple detections
-
-def monitor_no_motion():
-    """Thread function to monitor for lack of motion and send alerts"""
-    global last_motion_time, alert_sent
-    
-    while True:
-        current_time = time.time()
-        time_since_last_motion = current_time - last_motion_time
-        
-        # Check if no motion for threshold period and alert hasn't been sent
-        if (time_since_last_motion >= no_motion_threshold and 
-                not alert_sent):
-            print(f"ALERT: No motion detected for {no_motion_threshold} seconds!")
-            
-            # Send alert to PubNub
-            try:
-                pubnub.publish().channel(channel).message({
-                    'alert': 'no_motion',
-                    'seconds_inactive': time_since_last_motion,
-                    'timestamp': current_time,
-                    'device_id': pnconf.uuid
-                }).sync()
-                print("Alert sent to PubNub")
-                alert_sent = True  # Mark alert as sent
-                
-            except Exception as e:
-                print(f"Failed to send alert: {e}")
-        
-        time.sleep(1)  # Check every second
-
-# Start the threads
-motion_thread = threading.Thread(target=check_motion, daemon=True)
-alert_thread = threading.Thread(target=monitor_no_motion, daemon=True)
-
-print("Starting motion detection system...")
-motion_thread.start()
-alert_thread.start()
-
-try:
-    # Keep the main thread alive
-    while True:
-        time.sleep(1)
-except KeyboardInterrupt:
-    print("Exiting program")
-    GPIO.cleanup()  # Clean up GPIO on exit
+                self.inactivity.motion_stopped(edge.monotonic)
+
+    def send_alert(self, level, threshold, seconds_inactive):
+        """Inactivity deadline reached: queue the alert for publishing"""
+        print(f"ALERT: No motion detected for {threshold} seconds! (level {level})")
+        message = {
+            'alert': 'no_motion',
+            'level': level,
+            'threshold': threshold,
+            'seconds_inactive': seconds_inactive,
+            'timestamp': time.time(),
+            'device_id': self.messaging.uuid
+        }
+
+        def done(ok):
+            print("Alert sent to PubNub" if ok else "Failed to send alert")
+
+        self.publisher.publish(self.channel, message, done)
+
+    def start(self):
+        """Start edge handling; the inactivity period starts now if nobody is moving"""
+        self._running = True
+        self.publisher.start()
+        self.pir.start()
+        self.last_motion_state = self.pir.level
+        if not self.last_motion_state:
+            self.inactivity.motion_stopped()
+        self._threads = [threading.Thread(target=self.check_motion, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop edge handling, pending alerts and release the PIR pin"""
+        self._running = False
+        self.inactivity.cancel()
+        self.pir.stop()
+        self.publisher.stop()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self.gpio.cleanup(self.pir_pin)
+
+    def healthy(self):
+        """True while edge handling, debouncing and alert publishing are running"""
+        return (self._running and self.pir.is_alive() and self.publisher.is_alive()
+                and all(thread.is_alive() for thread in self._threads))
+
+
+def main():
+    monitor = MotionAlertMonitor()
+
+    print("Starting motion detection system...")
+    monitor.start()
+
+    try:
+        # Keep the main thread alive
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Exiting program")
+        monitor.stop()  # Clean up GPIO on exit
+
+
+if __name__ == "__main__":
+    main()
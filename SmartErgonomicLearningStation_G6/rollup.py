@@ -0,0 +1,245 @@
+"""
+Incremental per-minute and per-hour presence/elevation rollups
+
+The dashboard (frontend-wwebpage/409-4.html) used to download both raw
+logs and rebuild a minute-by-minute timeline in the browser. PresenceRollup
+keeps that timeline up to date as events arrive and writes a compact
+summary.json the page can render directly:
+
+    presence   one character per minute, P = present, A = absent
+    elevation  one character per minute, U = up, D = down, S = steady
+    hours      per-hour minutes present/up/down and standing/sitting seconds
+    totals     the same figures for the whole day
+
+A minute is present if the PIR output was high at any time during it. Its
+elevation is the last direction the desk was sent by the end of the minute
+(signal 2 = up, 1 = down, 0 = stop keeps the previous direction).
+Standing and sitting are present minutes with the desk up or down.
+
+Events can be fed live (add_motion / add_elevation) or picked up from the
+JSON logs with update_from_logs(), which only reads events past the cursor
+stored in the summary. The cursor is kept per log day (last_log_date.txt),
+like upload_logs.py's checkpoint, so a rotation is never mistaken for
+events still to come.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from upload_logs import read_log_date
+
+
+SUMMARY_NAME = "summary.json"
+PRESENT, ABSENT = "P", "A"
+UP, DOWN, STEADY = "U", "D", "S"
+SIGNAL_DIRECTION = {2: UP, 1: DOWN}
+
+
+def _zero_counts():
+    return {"present_min": 0, "up_min": 0, "down_min": 0, "standing_s": 0, "sitting_s": 0}
+
+
+def _minute_counts(presence, elevation):
+    """Contribution of one minute to an hour or day rollup"""
+    present = presence == PRESENT
+    return {
+        "present_min": int(present),
+        "up_min": int(elevation == UP),
+        "down_min": int(elevation == DOWN),
+        "standing_s": 60 if present and elevation == UP else 0,
+        "sitting_s": 60 if present and elevation == DOWN else 0,
+    }
+
+
+def _read_log(path):
+    """Load a JSON array log, or None if it is missing or mid-write"""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return data if isinstance(data, list) else None
+
+
+def _local_day(timestamp):
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+class PresenceRollup:
+    def __init__(self, summary_path=SUMMARY_NAME):
+        """
+        :param summary_path: File the summary is written to and resumed from
+                             (None for a purely in-memory rollup)
+        """
+        self.summary_path = summary_path
+        self.cursor = {}  # per log file: {"day": log day, "offset": events consumed}, survives day changes
+        self._reset(None)
+        if summary_path is not None:
+            self._load()
+
+    def _reset(self, day):
+        self.day = day
+        self.start_minute = None  # epoch minute of presence[0] / elevation[0]
+        self.presence = []
+        self.elevation = []
+        self.hours = {}  # epoch hour -> counts
+        self.totals = _zero_counts()
+        self.pir_level = 0
+        self.direction = STEADY
+
+    def _load(self):
+        try:
+            with open(self.summary_path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.day = data["day"]
+        self.start_minute = data["start"] // 60 if data.get("start") is not None else None
+        self.presence = list(data["presence"])
+        self.elevation = list(data["elevation"])
+        self.hours = {h["start"] // 3600: {k: v for k, v in h.items() if k != "start"} for h in data["hours"]}
+        self.totals = data["totals"]
+        self.pir_level = data["state"]["pir_level"]
+        self.direction = data["state"]["direction"]
+        self.cursor = data.get("cursor", {})
+
+    # ----- minute bookkeeping -----
+
+    def _set_minute(self, index, presence, elevation):
+        """Change one minute and apply the difference to its hour and the totals"""
+        old = _minute_counts(self.presence[index], self.elevation[index])
+        new = _minute_counts(presence, elevation)
+        hour = self.hours.setdefault((self.start_minute + index) // 60, _zero_counts())
+        for key in new:
+            delta = new[key] - old[key]
+            hour[key] += delta
+            self.totals[key] += delta
+        self.presence[index] = presence
+        self.elevation[index] = elevation
+
+    def _extend_to(self, minute):
+        """Append minutes up to and including minute, carrying the current state"""
+        carried = PRESENT if self.pir_level else ABSENT
+        while self.start_minute + len(self.presence) <= minute:
+            self.presence.append(ABSENT)
+            self.elevation.append(STEADY)
+            self._set_minute(len(self.presence) - 1, carried, self.direction)
+
+    def _minute_index(self, timestamp):
+        """Index of the minute holding timestamp, starting a new day if needed"""
+        day = _local_day(timestamp)
+        if self.day is not None and day > self.day:
+            pir_level, direction = self.pir_level, self.direction
+            self._reset(day)
+            self.pir_level, self.direction = pir_level, direction
+        elif self.day is None:
+            self.day = day
+        minute = int(timestamp // 60)
+        if self.start_minute is None:
+            self.start_minute = minute
+        if minute < self.start_minute:
+            return None
+        self._extend_to(minute)
+        return minute - self.start_minute
+
+    # ----- event input -----
+
+    def add_motion(self, timestamp, gpio_state):
+        """Record a PIR edge (gpio_state 1 = motion)"""
+        index = self._minute_index(timestamp)
+        if index is None:
+            return
+        self.pir_level = 1 if gpio_state else 0
+        if self.pir_level:
+            self._set_minute(index, PRESENT, self.elevation[index])
+
+    def add_elevation(self, timestamp, signal):
+        """Record a desk command (2 = up, 1 = down, 0 = stop)"""
+        index = self._minute_index(timestamp)
+        if index is None:
+            return
+        self.direction = SIGNAL_DIRECTION.get(signal, self.direction)
+        if index == len(self.elevation) - 1:
+            self._set_minute(index, self.presence[index], self.direction)
+
+    def advance(self, now=None):
+        """Fill the minutes up to now with the current state"""
+        if self.start_minute is not None:
+            self._minute_index(time.time() if now is None else now)
+
+    def update_from_logs(self, data_dir):
+        """Feed the events appended to the JSON logs since the last call"""
+        log_day = read_log_date(data_dir)  # Archive name of the current logs once they are rotated
+        pending = []
+        for name, parse in (("motion_sensor_log", self._parse_motion), ("motion_log", self._parse_elevation)):
+            state = self.cursor.get(name)
+            if not isinstance(state, dict):
+                # Summary written before the cursor recorded the log day
+                state = {"day": log_day, "offset": state or 0}
+            if state["day"] != log_day:
+                # Rotated since the last call: pick up the rest of the old day first
+                archived = _read_log(os.path.join(data_dir, "ArchieveLog", f"{name}_{state['day']}.json"))
+                pending.extend(parse(e) for e in (archived or [])[state["offset"]:])
+                state = {"day": log_day, "offset": 0}
+            self.cursor[name] = state
+
+            events = _read_log(os.path.join(data_dir, f"{name}.json"))
+            if events is None:
+                continue
+            if len(events) < state["offset"]:
+                # The file was reset by something other than the rotation script
+                state["offset"] = 0
+            pending.extend(parse(e) for e in events[state["offset"]:])
+            state["offset"] = len(events)
+
+        # Replay both logs in time order
+        for timestamp, apply, value in sorted(pending, key=lambda p: p[0]):
+            apply(timestamp, value)
+
+    def _parse_motion(self, event):
+        return datetime.fromisoformat(event["timestamp"]).timestamp(), self.add_motion, event["gpio_state"]
+
+    def _parse_elevation(self, event):
+        return event["timestamp"], self.add_elevation, event["signal"]
+
+    # ----- output -----
+
+    def summary(self):
+        """The compact summary the dashboard renders"""
+        return {
+            "day": self.day,
+            "start": self.start_minute * 60 if self.start_minute is not None else None,
+            "presence": "".join(self.presence),
+            "elevation": "".join(self.elevation),
+            "hours": [dict(start=hour * 3600, **counts) for hour, counts in sorted(self.hours.items())],
+            "totals": self.totals,
+            "state": {"pir_level": self.pir_level, "direction": self.direction},
+            "cursor": self.cursor,
+            "updated": time.time(),
+        }
+
+    def write(self):
+        """Write summary.json atomically"""
+        tmp_path = self.summary_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.summary(), f, separators=(",", ":"))
+        os.replace(tmp_path, self.summary_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the G6 dashboard summary from the motion logs")
+    parser.add_argument("--data-dir", default=".")
+    args = parser.parse_args()
+
+    rollup = PresenceRollup(os.path.join(args.data_dir, SUMMARY_NAME))
+    rollup.update_from_logs(args.data_dir)
+    rollup.advance()
+    rollup.write()
+    print(f"{rollup.day}: {len(rollup.presence)} minute(s) summarized")
+
+
+if __name__ == "__main__":
+    main()
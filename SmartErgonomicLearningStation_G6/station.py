@@ -0,0 +1,174 @@
+"""
+Single-process supervisor for the G6 station
+
+Hosts the desk controller (gpio_control.py) and the motion monitor
+(motion-alert-pubnub.py) in one interpreter. Both share one PubNub
+connection and one GPIO owner: each component only releases its own pins
+when it stops, and the supervisor does the final GPIO.cleanup().
+Every few seconds each component's health is checked, and a component
+that has died is rebuilt and restarted with backoff, without touching
+the other one.
+
+Usage:
+    python station.py            # desk control and motion alerts
+    python station.py --no-motion
+    python station.py --allow-origin http://192.168.1.20:8000
+"""
+
+import argparse
+import importlib.util
+import os
+import time
+
+from backends import PubNubMessaging, load_rpi_gpio
+from gpio_control import LOCAL_ALLOWED_ORIGINS, GPIOPubNubController
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_motion_alert_module():
+    """Import motion-alert-pubnub.py, whose file name is not a module name"""
+    spec = importlib.util.spec_from_file_location(
+        'motion_alert_pubnub', os.path.join(HERE, 'motion-alert-pubnub.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Component:
+    """A restartable component built by a factory"""
+
+    def __init__(self, name, factory):
+        """
+        :param name: Name used in logs and status
+        :param factory: Callable returning an object with start/stop/healthy
+        """
+        self.name = name
+        self.factory = factory
+        self.instance = None
+        self.restarts = 0
+        self.last_error = None
+        self.next_attempt = 0.0
+        self.backoff = 1.0
+
+    def start(self):
+        self.instance = self.factory()
+        self.instance.start()
+
+    def stop(self):
+        if self.instance is None:
+            return
+        try:
+            self.instance.stop()
+        except Exception as e:
+            print(f"[{self.name}] Error while stopping: {e}")
+        self.instance = None
+
+    def healthy(self):
+        if self.instance is None:
+            return False
+        try:
+            return self.instance.healthy()
+        except Exception:
+            return False
+
+
+class Supervisor:
+    def __init__(self, gpio, messaging, check_interval=5.0, max_backoff=60.0):
+        """
+        :param gpio: Shared object with the RPi.GPIO interface
+        :param messaging: Shared publish/subscribe backend
+        :param check_interval: Seconds between health checks
+        :param max_backoff: Longest wait between restart attempts of one component
+        """
+        self.gpio = gpio
+        self.messaging = messaging
+        self.check_interval = check_interval
+        self.max_backoff = max_backoff
+        self.components = []
+
+    def add(self, name, factory):
+        self.components.append(Component(name, factory))
+
+    def _try_start(self, component):
+        try:
+            component.start()
+            component.last_error = None
+            component.backoff = 1.0
+            print(f"[{component.name}] started")
+        except Exception as e:
+            component.last_error = str(e)
+            component.stop()
+            component.next_attempt = time.monotonic() + component.backoff
+            component.backoff = min(component.backoff * 2, self.max_backoff)
+            print(f"[{component.name}] failed to start: {e}")
+
+    def start(self):
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
+        for component in self.components:
+            self._try_start(component)
+
+    def check(self):
+        """Restart any component that is no longer healthy"""
+        for component in self.components:
+            if component.healthy() or time.monotonic() < component.next_attempt:
+                continue
+            if component.instance is not None:
+                print(f"[{component.name}] unhealthy, restarting")
+                component.stop()
+            component.restarts += 1
+            self._try_start(component)
+
+    def stop(self):
+        for component in reversed(self.components):
+            component.stop()
+        self.gpio.cleanup()
+        self.messaging.close()
+
+    def status(self):
+        return {
+            component.name: {
+                "healthy": component.healthy(),
+                "restarts": component.restarts,
+                "last_error": component.last_error,
+            }
+            for component in self.components
+        }
+
+    def run(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(self.check_interval)
+                self.check()
+        except KeyboardInterrupt:
+            print("\nProgram terminated by user")
+        finally:
+            self.stop()
+            print("All components stopped, GPIO cleaned up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the G6 station in one process")
+    parser.add_argument('--no-motion', action='store_true', help="Only run desk control")
+    parser.add_argument('--allow-origin', action='append', default=[], metavar='ORIGIN',
+                        help="Web origin allowed to use the LAN command endpoint, besides its "
+                             "own remote.html (repeatable)")
+    args = parser.parse_args()
+    allowed_origins = LOCAL_ALLOWED_ORIGINS + tuple(args.allow_origin)
+
+    gpio = load_rpi_gpio()
+    messaging = PubNubMessaging()
+    supervisor = Supervisor(gpio, messaging)
+    supervisor.add('desk', lambda: GPIOPubNubController(gpio=gpio, messaging=messaging,
+                                                            allowed_origins=allowed_origins))
+    if not args.no_motion:
+        motion_alert = load_motion_alert_module()
+        supervisor.add('motion', lambda: motion_alert.MotionAlertMonitor(gpio=gpio, messaging=messaging))
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Incremental upload of the G6 motion logs to S3
+
+Instead of copying motion_log.json and motion_sensor_log.json in full on
+every run, only the events appended since the last run are uploaded, as a
+gzip-compressed segment object:
+
+    pilogs/<log name>/<day>/<segment>.json.gz
+
+A checkpoint file next to the logs records, per log, the day and how many
+events have been uploaded. Segment keys are derived from the checkpoint, so
+a run that fails after the upload but before saving the checkpoint simply
+rewrites the same object. pilogs/manifest.json lists the segments of the
+last few days for the dashboard, and summary.json (see rollup.py) is
+uploaded next to the page whenever it has changed.
+
+When check_and_rotate_json.sh has moved a day's logs into ArchieveLog/,
+the events of that day that were not uploaded yet are read from the
+archived file first.
+
+The S3 client is created with a connection pool and keep-alive and can be
+pointed at MinIO (--endpoint-url) or replaced by a moto-backed client.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+
+
+DATA_DIR = "/home/pi/Desktop/G6Final"
+BUCKET = "my-frontend-bucket-claire"
+PREFIX = "pilogs"
+LOG_NAMES = ("motion_log", "motion_sensor_log")
+SUMMARY_NAME = "summary.json"
+CHECKPOINT_NAME = "upload_checkpoint.json"
+MANIFEST_DAYS = 7
+
+
+def make_s3_client(endpoint_url=None, max_pool_connections=4):
+    """Create one pooled, keep-alive S3 client for all uploads of a run"""
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        retries={"max_attempts": 5, "mode": "standard"},
+    )
+    return boto3.client("s3", endpoint_url=endpoint_url, config=config)
+
+
+def read_events(path):
+    """
+    Load a JSON array log
+
+    :return: List of events ([] if the file is missing), or None if the file
+             is being rewritten and cannot be parsed right now
+    """
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, list) else []
+
+
+def read_log_date(data_dir):
+    """Day of the current logs, as maintained by check_and_rotate_json.sh"""
+    try:
+        with open(os.path.join(data_dir, "last_log_date.txt"), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return time.strftime("%Y-%m-%d")
+
+
+class DeltaUploader:
+    def __init__(self, s3, bucket=BUCKET, data_dir=DATA_DIR, prefix=PREFIX, checkpoint_path=None):
+        """
+        :param s3: boto3 S3 client (or anything with put_object)
+        :param bucket: Destination bucket
+        :param data_dir: Directory holding the logs and last_log_date.txt
+        :param prefix: Key prefix of segments and manifest
+        :param checkpoint_path: Checkpoint file (default: <data_dir>/upload_checkpoint.json)
+        """
+        self.s3 = s3
+        self.bucket = bucket
+        self.data_dir = data_dir
+        self.prefix = prefix
+        self.checkpoint_path = checkpoint_path or os.path.join(data_dir, CHECKPOINT_NAME)
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            checkpoint = {}
+        checkpoint.setdefault("logs", {})
+        checkpoint.setdefault("manifest", {})
+        return checkpoint
+
+    def _save_checkpoint(self):
+        # Write then rename, so a crash never leaves a truncated checkpoint
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _upload_tail(self, name, state, events):
+        """Upload events[offset:] as the next segment of this log/day"""
+        new_events = events[state["offset"]:]
+        if not new_events:
+            return 0
+
+        key = f"{self.prefix}/{name}/{state['day']}/{state['segment']:05d}.json.gz"
+        body = gzip.compress(json.dumps(new_events, separators=(",", ":")).encode())
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=body,
+            ContentType="application/json",
+            ContentEncoding="gzip",
+        )
+
+        segments = self.checkpoint["manifest"].setdefault(name, {}).setdefault(state["day"], [])
+        segments[:] = [s for s in segments if s["key"] != key]
+        segments.append({
+            "key": key,
+            "count": len(new_events),
+            "first": new_events[0].get("timestamp"),
+            "last": new_events[-1].get("timestamp"),
+            "bytes": len(body),
+        })
+        state["offset"] += len(new_events)
+        state["segment"] += 1
+        self._save_checkpoint()
+        return len(new_events)
+
+    def upload_log(self, name, day):
+        """Upload what is new in one log; returns the number of events sent"""
+        logs = self.checkpoint["logs"]
+        state = logs.get(name) or {"day": day, "offset": 0, "segment": 0}
+        sent = 0
+
+        if state["day"] != day:
+            # The logs were rotated since the last run: finish the old day first
+            archived = os.path.join(self.data_dir, "ArchieveLog", f"{name}_{state['day']}.json")
+            sent += self._upload_tail(name, state, read_events(archived) or [])
+            state = {"day": day, "offset": 0, "segment": 0}
+        logs[name] = state
+
+        events = read_events(os.path.join(self.data_dir, f"{name}.json"))
+        if events is None:
+            print(f"{name}.json is being written, trying again next run")
+            self._save_checkpoint()
+            return sent
+        if len(events) < state["offset"]:
+            # The file was reset by something other than the rotation script
+            print(f"{name}.json shrank below the checkpoint, uploading it from the start")
+            state["offset"] = 0
+        sent += self._upload_tail(name, state, events)
+        return sent
+
+    def write_manifest(self):
+        """Trim the manifest to the last days and publish it"""
+        manifest = self.checkpoint["manifest"]
+        for name, days in manifest.items():
+            for day in sorted(days)[:-MANIFEST_DAYS]:
+                del days[day]
+        self._save_checkpoint()
+
+        body = json.dumps({"updated": time.time(), "logs": manifest}, separators=(",", ":"))
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}/manifest.json",
+            Body=body.encode(),
+            ContentType="application/json",
+            CacheControl="no-cache",
+        )
+
+    def upload_summary(self):
+        """Upload the dashboard rollup if it changed since the last upload"""
+        path = os.path.join(self.data_dir, SUMMARY_NAME)
+        try:
+            mtime = os.path.getmtime(path)
+        except FileNotFoundError:
+            return False
+        if self.checkpoint.get("summary_mtime") == mtime:
+            return False
+        with open(path, "rb") as f:
+            body = f.read()
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=SUMMARY_NAME,
+            Body=gzip.compress(body),
+            ContentType="application/json",
+            ContentEncoding="gzip",
+            CacheControl="no-cache",
+        )
+        self.checkpoint["summary_mtime"] = mtime
+        self._save_checkpoint()
+        return True
+
+    def run(self):
+        """Upload all logs, the manifest and the summary; returns events sent per log"""
+        day = read_log_date(self.data_dir)
+        sent = {name: self.upload_log(name, day) for name in LOG_NAMES}
+        if any(sent.values()):
+            self.write_manifest()
+        self.upload_summary()
+        return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload new G6 motion log events to S3")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--bucket", default=BUCKET)
+    parser.add_argument("--prefix", default=PREFIX)
+    parser.add_argument("--endpoint-url", default=None, help="S3-compatible endpoint, e.g. MinIO")
+    args = parser.parse_args()
+
+    uploader = DeltaUploader(
+        make_s3_client(args.endpoint_url), args.bucket, args.data_dir, args.prefix
+    )
+    for name, count in uploader.run().items():
+        print(f"{name}: {count} new event(s) uploaded")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,10 @@
 
 DATA_DIR="/home/pi/Desktop/G6Final"
 BUCKET="my-frontend-bucket-claire"
-DATE=$(date +'%Y-%m-%d_%H-%M-%S')
 
-# 上传 motion_log.json
-aws s3 cp "$DATA_DIR/motion_log.json" "s3://$BUCKET/pilogs/motion_log_$DATE.json"
-aws s3 cp "$DATA_DIR/motion_log.json" "s3://$BUCKET/motion_log.json"
+# 更新仪表盘用的分钟/小时汇总 summary.json，见 rollup.py
+python3 "$DATA_DIR/rollup.py" --data-dir "$DATA_DIR"
 
-# 上传 motion_sensor_log.json
-aws s3 cp "$DATA_DIR/motion_sensor_log.json" "s3://$BUCKET/pilogs/motion_sensor_log_$DATE.json" 
-aws s3 cp "$DATA_DIR/motion_sensor_log.json" "s3://$BUCKET/motion_sensor_log.json" 
+# 只上传上次之后新增的事件（gzip 分段 + manifest），见 upload_logs.py
+python3 "$DATA_DIR/upload_logs.py" --data-dir "$DATA_DIR" --bucket "$BUCKET"
 
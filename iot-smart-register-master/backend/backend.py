@@ -14,19 +14,25 @@ Author: Integrated from original separate files
 Date: 2025-04-09 (Modified)
 '''
 
-from config import publish_key, subscribe_key, uuid, channel
-import RPi.GPIO as GPIO
 import time
-import dht11
 import socket
 import json
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import signal
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
-from pubnub.pnconfiguration import PNConfiguration
-from pubnub.pubnub import PubNub
-from pubnub.exceptions import PubNubException
+from lcd import LCDDisplay
+from gas_alarm import GasAlarm
+from hardware import GPIO, DHT11, PNConfiguration, PubNub, PubNubException
+from hardware import publish_key, subscribe_key, uuid, channel
+from history import HistoryStore
+from metrics import MetricsRegistry
+from publisher import CloudPublisher
+from sensors import Reading, Sampler, SensorReadError, SensorState
+from servo import ServoActuator, PRIORITY_AUTO, PRIORITY_MANUAL
+from state import StatusCache
+from vent_control import decide_vent_position, VENT_CHANGE_INTERVAL
 
 # ===== PUBNUB CONFIGURATION =====
 # Use Pubnub to send and receive the data and message
@@ -60,8 +66,42 @@ MQ2_PIN = 16   # GPIO16
 LED_PIN = 20   # GPIO20 for alarm LED indicator
 BUZZER_PIN = 21  # GPIO21 for buzzer
 
+# Sensor sampling
+DHT_INTERVAL = 2.0      # Seconds between DHT11 reads (the sensor allows at most one per second)
+DHT_RETRY_INTERVAL = 1.0  # Seconds before the first retry of a failed DHT11 read
+DHT_MAX_BACKOFF = 10.0    # Longest wait between DHT11 retries
+PIR_INTERVAL = 0.1      # Seconds between PIR samples
+GAS_INTERVAL = 0.25     # Seconds between MQ-2 polls (backup for missed edge events)
+GAS_DEBOUNCE = 0.02     # Seconds gas must be reported steadily before the alarm starts
+GAS_CLEAR_TIME = 5      # Seconds without gas before the alarm ends
+DHT_MAX_AGE = 60        # Seconds a DHT11 reading stays valid for vent decisions
+PIR_WARMUP = 2          # Seconds the PIR output needs to settle after power-up
+MQ2_WARMUP = 10         # Seconds the MQ-2 heater needs before its output is meaningful
+SENSOR_ERROR_LIMIT = 5  # Consecutive DHT11 failures before the LCD shows an error
+NO_READING = Reading(None, None, 0)
+
+# PubNub publishing
+PUBNUB_BATCH_INTERVAL = 5       # Seconds between batched publishes
+PUBNUB_HEARTBEAT_INTERVAL = 60  # Seconds between full-state messages
+PUBNUB_BUFFER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pubnub_buffer.jsonl")
+
+# Local history
+HISTORY_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db")
+HISTORY_FLUSH_INTERVAL = 10  # Seconds between batched writes to SQLite
+HISTORY_DEFAULT_SPAN = 86400  # Seconds covered by /api/history without from=
+
+# Main loop
+LOOP_INTERVAL = 1.0  # Seconds per control loop cycle (the loop deadline)
+WELCOME_TIME = 2     # Seconds the welcome message stays on the LCD
+
+# Subsystems whose readiness /api/system_status reports, in start order
+SUBSYSTEMS = ("web", "lcd", "servo", "publisher", "history", "dht", "pir", "gas")
+
 # Web server port for remote control
 WEB_PORT = 5500
+HTTP_IDLE_TIMEOUT = 30  # Seconds an idle keep-alive connection is held open
+SSE_PING_INTERVAL = 15  # Seconds between keep-alive comments on idle event streams
+MAX_SSE_CLIENTS = 32    # Concurrent /api/events subscribers
 
 # ===== LCD DISPLAY CONSTANTS =====
 LCD_WIDTH = 16    # LCD character width
@@ -69,10 +109,7 @@ LCD_LINE_1 = 0x80 # LCD RAM address for 1st line
 LCD_LINE_2 = 0xC0 # LCD RAM address for 2nd line
 LCD_LINE_3 = 0x94 # LCD RAM address for 3rd line (if available)
 LCD_LINE_4 = 0xD4 # LCD RAM address for 4th line (if available)
-LCD_CHR = True    # Send data
-LCD_CMD = False   # Send command
-E_PULSE = 0.0005  # E pulse width
-E_DELAY = 0.0005  # E delay
+LCD_LINES = (LCD_LINE_1, LCD_LINE_2, LCD_LINE_3, LCD_LINE_4)
 
 # ===== SERVO MOTOR CONSTANTS =====
 # Modified for SG90 servo (0-180 degrees)
@@ -80,11 +117,34 @@ MIN_PULSE_WIDTH = 500   # Corresponds to 0 degrees
 MAX_PULSE_WIDTH = 2400  # Corresponds to 180 degrees
 MID_PULSE_WIDTH = 1450  # Corresponds to 90 degrees
 
+# Preset positions for API control - Modified for SG90 range
+PRESET_ANGLES = {
+    'far_left': 0,     # Changed from -100 to 0
+    'left': 45,        # Changed from 0 to 45
+    'center': 90,
+    'right': 135,      # Changed from 180 to 135
+    'far_right': 180,  # Changed from 270 to 180
+}
+
 # Global variables
-current_angle = 90  # Current servo angle
 gas_detected = False  # Gas detection status
 gas_detected_last_state = False  # Last gas detection state
-pwm = None  # Global PWM object for servo
+servo = None  # Servo actuator, the only user of the servo PWM
+gas_alarm = None  # MQ-2 alarm thread (LED, buzzer, vent)
+lcd = None  # LCD framebuffer driver
+dht_sensor = None  # DHT11 driver
+sensor_state = SensorState()  # Latest reading of every sensor
+samplers = []  # One sampling thread per sensor
+cloud_publisher = None  # Background PubNub publisher
+history = None  # Local time-series store
+subsystems = dict.fromkeys(SUBSYSTEMS, "starting")  # Name -> starting, warming_up, ready or failed
+subsystems_lock = threading.Lock()
+shutdown_requested = threading.Event()  # Ends the main loop (set by a signal handler or a harness)
+boot_time = time.monotonic()  # Reference for the startup times printed by set_subsystem()
+status_cache = StatusCache(angle=90, gas_detected=gas_detected,
+                           motion_detected=False, vent_reason="Initial state",
+                           temperature=None, humidity=None,
+                           ready=False, subsystems=dict(subsystems))
 last_motion_time = 0  # Last time motion was detected
 current_reason = "Initial state"  # Current reason for vent position
 display_toggle_time = 0  # Last display toggle time
@@ -93,118 +153,80 @@ last_detected_motion = False  # Last motion state
 last_vent_change_time = 0  # Last time vent position was changed
 motion_count = 0  # Motion detection counter
 
+# ===== METRICS =====
+# Served at /metrics in the Prometheus text format
+metrics = MetricsRegistry(prefix="smart_register_")
+LOOP_CYCLE = metrics.histogram("loop_cycle_seconds", "Main loop work per cycle, excluding the sleep")
+LOOP_PHASES = {
+    phase: metrics.histogram("loop_phase_seconds", "Main loop work per cycle by phase", phase=phase)
+    for phase in ("control", "display", "record")
+}
+LOOP_DEADLINE_MISSED = metrics.counter("loop_deadline_missed_total",
+                                       "Cycles whose work took longer than the loop interval")
+LOOP_LAST_CYCLE = metrics.gauge("loop_last_cycle_seconds", "Work time of the most recent cycle")
+LCD_WRITE = metrics.histogram("lcd_write_seconds", "Time spent in lcd_string by the caller")
+LCD_REFRESH = metrics.histogram("lcd_refresh_seconds", "Time the LCD thread spends sending one refresh")
+SERVO_LATENCY = metrics.histogram("servo_command_latency_seconds",
+                                  "Time from a servo command being submitted to its first movement")
+SERVO_DURATION = metrics.histogram("servo_command_duration_seconds", "Time a servo command ran",
+                                   buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+GAS_ALARM_LATENCY = metrics.histogram("gas_alarm_latency_seconds",
+                                     "Time from an MQ-2 edge to the alarm outputs, vent command and publish")
+PUBNUB_PUBLISH = metrics.histogram("pubnub_publish_seconds", "PubNub publish calls, including failed ones")
+HTTP_ROUTES = ('/api/get_angle', '/api/system_status', '/api/history', '/api/jobs',
+               '/api/set_angle', '/api/preset', '/api/sweep', '/metrics')
+
 # ===== LCD DISPLAY FUNCTIONS =====
 def lcd_init():
-    '''Initialize LCD display'''
+    '''Initialize LCD display and start its refresh thread'''
+    global lcd
     # Set GPIO
     GPIO.setwarnings(False)
     GPIO.setmode(GPIO.BCM)
-    GPIO.setup(LCD_E, GPIO.OUT)
-    GPIO.setup(LCD_RS, GPIO.OUT)
-    GPIO.setup(LCD_D4, GPIO.OUT)
-    GPIO.setup(LCD_D5, GPIO.OUT)
-    GPIO.setup(LCD_D6, GPIO.OUT)
-    GPIO.setup(LCD_D7, GPIO.OUT)
-
-    # Initialize display
-    lcd_byte(0x33, LCD_CMD) # 110011 Initialize
-    lcd_byte(0x32, LCD_CMD) # 110010 Initialize
-    lcd_byte(0x06, LCD_CMD) # 000110 Cursor move direction
-    lcd_byte(0x0C, LCD_CMD) # 001100 Display On, Cursor Off
-    lcd_byte(0x28, LCD_CMD) # 101000 Data length, number of lines, font size
-    lcd_byte(0x01, LCD_CMD) # 000001 Clear display
-    time.sleep(E_DELAY)
-
-def lcd_byte(bits, mode):
-    '''Send byte to LCD'''
-    # Set RS pin
-    GPIO.output(LCD_RS, mode)
-
-    # Send high 4 bits
-    GPIO.output(LCD_D4, False)
-    GPIO.output(LCD_D5, False)
-    GPIO.output(LCD_D6, False)
-    GPIO.output(LCD_D7, False)
-    if bits & 0x10 == 0x10:
-        GPIO.output(LCD_D4, True)
-    if bits & 0x20 == 0x20:
-        GPIO.output(LCD_D5, True)
-    if bits & 0x40 == 0x40:
-        GPIO.output(LCD_D6, True)
-    if bits & 0x80 == 0x80:
-        GPIO.output(LCD_D7, True)
-
-    # Enable pulse
-    lcd_toggle_enable()
-
-    # Send low 4 bits
-    GPIO.output(LCD_D4, False)
-    GPIO.output(LCD_D5, False)
-    GPIO.output(LCD_D6, False)
-    GPIO.output(LCD_D7, False)
-    if bits & 0x01 == 0x01:
-        GPIO.output(LCD_D4, True)
-    if bits & 0x02 == 0x02:
-        GPIO.output(LCD_D5, True)
-    if bits & 0x04 == 0x04:
-        GPIO.output(LCD_D6, True)
-    if bits & 0x08 == 0x08:
-        GPIO.output(LCD_D7, True)
-
-    # Enable pulse
-    lcd_toggle_enable()
-
-def lcd_toggle_enable():
-    '''Toggle enable pulse'''
-    time.sleep(E_DELAY)
-    GPIO.output(LCD_E, True)
-    time.sleep(E_PULSE)
-    GPIO.output(LCD_E, False)
-    time.sleep(E_DELAY)
+    lcd = LCDDisplay(GPIO, LCD_RS, LCD_E, (LCD_D4, LCD_D5, LCD_D6, LCD_D7), width=LCD_WIDTH,
+                     on_refresh=LCD_REFRESH.observe)
+    lcd.start()
+    metrics.counter("lcd_bytes_total", "Bytes sent to the LCD controller", fn=lambda: lcd.bytes_sent)
 
 def lcd_string(message, line):
-    '''Send string to LCD'''
-    message = message.ljust(LCD_WIDTH, " ")
-    lcd_byte(line, LCD_CMD)
-
-    for i in range(LCD_WIDTH):
-        lcd_byte(ord(message[i]), LCD_CHR)
+    '''Show string on one LCD line (only changed characters are sent, on the LCD thread)'''
+    with LCD_WRITE.time():
+        lcd.write(message, LCD_LINES.index(line))
 
 def lcd_clear():
     '''Clear LCD display'''
-    lcd_byte(0x01, LCD_CMD)
-    time.sleep(E_DELAY)
+    lcd.clear()
 
 # ===== SERVO CONTROL FUNCTIONS =====
 def servo_init():
-    '''Initialize servo motor'''
-    global pwm
-    GPIO.setup(SERVO_PIN, GPIO.OUT)
-    pwm = GPIO.PWM(SERVO_PIN, 50)  # 50Hz frequency
-    pwm.start(0)
+    '''Initialize servo motor and start its actuator thread'''
+    global servo
+    servo = ServoActuator(
+        GPIO, SERVO_PIN, frequency=50,  # 50Hz frequency
+        min_pulse=MIN_PULSE_WIDTH, max_pulse=MAX_PULSE_WIDTH,
+        initial_angle=servo_position, on_change=lambda angle: update_status(),
+        on_command=on_servo_command
+    )
+    servo.start()
+    for result in ("completed", "superseded", "overridden"):
+        metrics.counter("servo_commands_total", "Servo commands by outcome", result=result,
+                        fn=lambda result=result: servo.status()[result])
     print("Servo initialized")
 
-def pulse_width_to_duty_cycle(pulse_width):
-    '''Convert pulse width to duty cycle'''
-    return pulse_width / 20000 * 100
+def on_servo_command(kind, latency, duration, state):
+    '''Servo actuator callback: record how long the command waited and ran'''
+    SERVO_LATENCY.observe(latency)
+    SERVO_DURATION.observe(duration)
 
-def angle_to_duty_cycle(angle):
-    '''Convert angle to duty cycle - Modified for SG90 range (0 to 180 degrees)'''
-    # Limit to 0 to 180 degrees range for SG90
-    if angle < 0:
-        angle = 0
-    elif angle > 180:
-        angle = 180
-    
-    # Map angle to pulse width
-    pulse_width = MIN_PULSE_WIDTH + (angle / 180) * (MAX_PULSE_WIDTH - MIN_PULSE_WIDTH)
-    
-    # Convert pulse width to duty cycle
-    duty_cycle = pulse_width_to_duty_cycle(pulse_width)
-    return duty_cycle
+def validate_angle(angle):
+    '''Return angle as int; raises ValueError outside the SG90 range'''
+    angle = int(angle)
+    if angle < 0 or angle > 180:
+        raise ValueError("Angle must be between 0 and 180 degrees for SG90 servo")
+    return angle
 
-def set_angle(angle):
-    '''Set servo angle - for automatic vent control'''
+def set_angle(angle, priority=PRIORITY_AUTO, hold=False):
+    '''Set servo angle - for automatic vent control (returns immediately with the job)'''
     global servo_position
     
     # Limit to SG90 range (0-180)
@@ -213,49 +235,27 @@ def set_angle(angle):
     elif angle > 180:
         angle = 180
         
-    duty = angle_to_duty_cycle(angle)
-    GPIO.output(SERVO_PIN, True)
-    pwm.ChangeDutyCycle(duty)
-    time.sleep(0.3)  # Give servo time to move
-    GPIO.output(SERVO_PIN, False)
-    pwm.ChangeDutyCycle(0)  # Stop pulse to prevent jitter
-    
-    servo_position = angle
+    job = servo.move(angle, priority, source="auto", hold=hold)
+    if job["state"] != "overridden":  # The gas alarm's hold keeps the vent where it is
+        servo_position = angle
+    return job
 
 def set_servo_angle(angle):
-    '''Set servo angle - for API control'''
-    global current_angle
+    '''Set servo angle - for API control (returns immediately with a job id)'''
     try:
-        angle = int(angle)
-        # Validate angle is within SG90 range
-        if angle < 0 or angle > 180:
-            return {"status": "error", "message": "Angle must be between 0 and 180 degrees for SG90 servo"}
-        
-        duty_cycle = angle_to_duty_cycle(angle)
-        pwm.ChangeDutyCycle(duty_cycle)
-        current_angle = angle
-        time.sleep(0.5)  # Wait for servo to move to position
-        pwm.ChangeDutyCycle(0)  # Stop PWM signal to prevent jitter
-        
-        return {"status": "success", "angle": angle}
-    except Exception as e:
+        angle = validate_angle(angle)
+        job = servo.move(angle, PRIORITY_MANUAL, source="api")
+        if job["state"] == "overridden":
+            return {"status": "error", "message": "Vent is held open by the gas alarm", "job_id": job["id"]}
+        return {"status": "success", "angle": angle, "job_id": job["id"], "job_state": job["state"]}
+    except (TypeError, ValueError) as e:
         return {"status": "error", "message": str(e)}
 
 def set_preset_position(position):
     '''Set preset position for API control'''
-    # Modified for SG90 range
-    if position == 'far_left':
-        angle = 0  # Changed from -100 to 0
-    elif position == 'left':
-        angle = 45  # Changed from 0 to 45
-    elif position == 'center':
-        angle = 90
-    elif position == 'right':
-        angle = 135  # Changed from 180 to 135
-    elif position == 'far_right':
-        angle = 180  # Changed from 270 to 180
-    else:
+    if position not in PRESET_ANGLES:
         return {"status": "error", "message": "Invalid preset position"}
+    angle = PRESET_ANGLES[position]
     
     result = set_servo_angle(angle)
     if result["status"] == "success":
@@ -264,36 +264,22 @@ def set_preset_position(position):
     return result
 
 def sweep_servo(start_angle, end_angle, step, delay):
-    '''Execute sweep motion for API control'''
-    global current_angle
+    '''Start a sweep for API control; it moves at step degrees per delay seconds'''
     try:
-        start_angle = int(start_angle)
-        end_angle = int(end_angle)
+        start_angle = validate_angle(start_angle)
+        end_angle = validate_angle(end_angle)
         step = int(step)
         delay = float(delay)
+        if step <= 0 or delay < 0:
+            return {"status": "error", "message": "Step must be positive and delay must not be negative"}
         
-        # Validate angles are within SG90 range
-        if start_angle < 0 or start_angle > 180 or end_angle < 0 or end_angle > 180:
-            return {"status": "error", "message": "Angle must be between 0 and 180 degrees for SG90 servo"}
-        
-        # Determine step direction
-        if start_angle <= end_angle:
-            angle_range = range(start_angle, end_angle + 1, step)
-        else:
-            angle_range = range(start_angle, end_angle - 1, -step)
-        
-        # Execute sweep
-        for angle in angle_range:
-            duty_cycle = angle_to_duty_cycle(angle)
-            pwm.ChangeDutyCycle(duty_cycle)
-            current_angle = angle
-            time.sleep(delay)
-        
-        # Stop PWM signal to prevent jitter
-        pwm.ChangeDutyCycle(0)
-        
-        return {"status": "success", "start": start_angle, "end": end_angle}
-    except Exception as e:
+        speed = step / delay if delay > 0 else float('inf')
+        job = servo.sweep(start_angle, end_angle, speed, PRIORITY_MANUAL, source="api")
+        if job["state"] == "overridden":
+            return {"status": "error", "message": "Vent is held open by the gas alarm", "job_id": job["id"]}
+        return {"status": "success", "start": start_angle, "end": end_angle,
+                "job_id": job["id"], "job_state": job["state"]}
+    except (TypeError, ValueError) as e:
         return {"status": "error", "message": str(e)}
 
 # ===== PIR MOTION SENSOR FUNCTIONS =====
@@ -304,13 +290,29 @@ def pir_init():
     
     # Wait for PIR sensor to initialize
     print("Waiting for PIR sensor to stabilize...")
-    time.sleep(2)
+    time.sleep(PIR_WARMUP)
     print("PIR sensor ready")
 
+def motion_init():
+    '''Warm up the PIR sensor, then start sampling it'''
+    pir_init()
+    start_sampler(Sampler("motion", check_motion, PIR_INTERVAL, sensor_state, on_change=on_motion_sample))
+
 def check_motion():
     '''Check if motion is detected'''
     return GPIO.input(PIR_PIN)
 
+def on_motion_sample(name, reading):
+    '''PIR sampler callback: count new motion as soon as it is seen'''
+    global last_motion_time, motion_count, last_detected_motion
+    if reading.value and not last_detected_motion:
+        if reading.timestamp - last_motion_time > 1:  # Avoid consecutive triggers
+            motion_count += 1
+            print(f"[{time.strftime('%H:%M:%S')}] Motion detected! Total: {motion_count}")
+            last_motion_time = reading.timestamp
+    last_detected_motion = reading.value
+    update_status()
+
 # ===== MQ-2 GAS SENSOR FUNCTIONS =====
 def mq2_init():
     '''Initialize MQ-2 gas sensor'''
@@ -322,92 +324,129 @@ def mq2_init():
     
     print(f"MQ-2 gas sensor initialized on GPIO{MQ2_PIN}")
     print("Waiting for gas sensor to stabilize...")
-    time.sleep(10)  # Give the sensor time to warm up
+    time.sleep(MQ2_WARMUP)  # Give the sensor time to warm up
     print("Gas sensor ready")
 
-def check_gas():
-    '''Check if gas/smoke is detected'''
-    return not GPIO.input(MQ2_PIN)  # Invert the signal based on sensor type
-
-def callback_gas_detected(channel):
-    '''Callback function for gas detection events'''
-    global gas_detected
-    if GPIO.input(MQ2_PIN):  # High means no gas (depends on your sensor)
-        gas_detected = False
-        print("No gas/smoke detected")
-        # Turn off LED and buzzer
-        GPIO.output(LED_PIN, GPIO.LOW)
-        GPIO.output(BUZZER_PIN, GPIO.LOW)
-    else:  # Low means gas detected
-        gas_detected = True
-        print("Gas/Smoke detected!")
-        # Turn on LED and buzzer
-        GPIO.output(LED_PIN, GPIO.HIGH)
-        GPIO.output(BUZZER_PIN, GPIO.HIGH)
+def publish_gas_alarm(detected):
+    '''Gas alarm callback: publish the change now instead of with the next batch'''
+    if cloud_publisher is not None:
+        cloud_publisher.submit({"gas": detected}, urgent=True)
+
+def on_gas_change(detected, latency):
+    '''Gas alarm callback, run after the LED, buzzer and vent have been switched'''
+    global gas_detected, servo_position, current_reason, last_vent_change_time
+    gas_detected = detected
+    if detected:
+        GAS_ALARM_LATENCY.observe(latency)
+        servo_position = 180
+        current_reason = "Gas/smoke detected!"
+    else:
+        last_vent_change_time = 0  # Let the main loop choose the vent position on its next cycle
+    update_status()
+
+def gas_alarm_init():
+    '''Start the gas alarm thread; it switches the LED, buzzer and vent on its own'''
+    global gas_alarm
+    gas_alarm = GasAlarm(GPIO, MQ2_PIN, LED_PIN, BUZZER_PIN, servo=servo,
+                         publish=publish_gas_alarm, on_change=on_gas_change,
+                         debounce=GAS_DEBOUNCE, clear_time=GAS_CLEAR_TIME, poll_interval=GAS_INTERVAL)
+    gas_alarm.start()
+    metrics.counter("gas_alarms_total", "Gas alarms raised", fn=lambda: gas_alarm.alarms)
+
+def gas_init():
+    '''Warm up the MQ-2 sensor, then start the gas alarm'''
+    mq2_init()
+    gas_alarm_init()
+
+# ===== DHT11 SENSOR FUNCTIONS =====
+def read_dht():
+    '''Read DHT11 once; raises SensorReadError on invalid data'''
+    result = dht_sensor.read()
+    if not result.is_valid():
+        raise SensorReadError("invalid DHT11 data")
+    return result.temperature, result.humidity
+
+def on_dht_sample(name, reading):
+    '''DHT11 sampler callback: the sensor is ready once it has given a good reading'''
+    if subsystems["dht"] != "ready":
+        set_subsystem("dht", "ready")
+
+def dht_init():
+    '''Initialize DHT11 and start sampling it'''
+    global dht_sensor
+    dht_sensor = DHT11(pin=DHT_PIN)
+    print("DHT11 temperature/humidity sensor initialized")
+    start_sampler(Sampler("dht", read_dht, DHT_INTERVAL, sensor_state, retry_interval=DHT_RETRY_INTERVAL, max_backoff=DHT_MAX_BACKOFF,
+                          on_change=on_dht_sample))
+
+# ===== STARTUP =====
+def start_sampler(sampler):
+    '''Start a sensor sampling thread, with its reads timed and counted in /metrics'''
+    sampler.read = metrics.histogram("sensor_read_seconds", "Sensor read calls, including failed ones",
+                                     sensor=sampler.name).timed(sampler.read)
+    metrics.counter("sensor_reads_total", "Sensor read attempts", sensor=sampler.name,
+                    fn=lambda: sampler.reads)
+    metrics.counter("sensor_read_failures_total", "Failed sensor reads", sensor=sampler.name,
+                    fn=lambda: sampler.failures)
+    samplers.append(sampler)
+    sampler.start()
+
+def set_subsystem(name, state):
+    '''Record the readiness of one subsystem for /api/system_status'''
+    with subsystems_lock:
+        subsystems[name] = state
+        status_cache.update(subsystems=dict(subsystems),
+                            ready=all(value == "ready" for value in subsystems.values()))
+    print(f"[Startup] {name}: {state} ({time.monotonic() - boot_time:.2f}s)")
+
+def start_subsystem(name, init):
+    '''Run init (a sensor warm-up, for example) on its own thread; the subsystem is ready when it returns'''
+    def run():
+        try:
+            init()
+        except Exception as e:
+            print(f"[Startup] {name} failed: {e}")
+            set_subsystem(name, "failed")
+        else:
+            set_subsystem(name, "ready")
+    set_subsystem(name, "warming_up")
+    threading.Thread(target=run, name=f"init-{name}", daemon=True).start()
 
 # ===== PUBNUB FUNCTIONS =====
-def publish_to_pubnub(temp, humidity, motion, gas):
-    '''Publish sensor data to PubNub'''
-    try:
-        message = {
-            "temperature": temp,
-            "humidity": humidity,
-            "motion": motion,
-            "gas": gas,
-            # "vent_angle": servo_position
-        }
-        
+def send_to_pubnub(message):
+    '''Publish one message to PubNub; raises on failure (called by the publisher thread)'''
+    with PUBNUB_PUBLISH.time():
         envelope = pubnub.publish().channel(CHANNEL).message(message).sync()
-        if envelope.status.is_error():
-            print(f"[PubNub] Error: {envelope.status.error}")
-        else:
-            print(f"[PubNub] Message published successfully")
-    except PubNubException as e:
-        print(f"[PubNub] Exception: {e}")
-    except Exception as e:
-        print(f"[PubNub] Unexpected error: {e}")
-
-# ===== SMART CONTROL LOGIC =====
-def decide_vent_position(temp, humidity, motion_detected, last_motion_time, current_time, gas_detected):
-    '''Decide vent position based on sensor data - Modified for SG90 range'''
-    # Configuration parameters
-    TEMP_HIGH = 26  # High temperature threshold (Celsius)
-    TEMP_LOW = 18   # Low temperature threshold (Celsius)
-    HUMIDITY_HIGH = 70  # High humidity threshold (percentage)
-    NO_MOTION_TIME = 600  # Time without motion to consider room empty (10 minutes = 600 seconds)
-    
-    # Default position: half open (90 degrees)
-    position = 90
-    reason = "Normal ventilation"
-    
-    # Gas detection takes highest priority - fully open if gas detected
-    if gas_detected:
-        position = 180  # Gas detected, fully open
-        reason = "Gas/smoke detected!"
-        return position, reason
-    
-    # Adjust based on temperature
-    if temp > TEMP_HIGH:
-        position = 180  # High temp, fully open
-        reason = f"High temp ({temp}C)"
-    elif temp < TEMP_LOW:
-        position = 0  # Low temp, closed
-        reason = f"Low temp ({temp}C)"
-    
-    # Adjust based on humidity (only when temperature is in normal range)
-    if TEMP_LOW <= temp <= TEMP_HIGH and humidity > HUMIDITY_HIGH:
-        position = 180  # High humidity, fully open
-        reason = f"High humidity ({humidity}%)"
-    
-    # Adjust based on motion detection
-    no_motion_time = current_time - last_motion_time
-    if not motion_detected and no_motion_time > NO_MOTION_TIME:
-        # Long time no motion - room is likely empty, open vent to refresh air
-        position = 180  # Fully open for ventilation
-        reason = f"No motion ({int(no_motion_time//60)}min) - ventilating"
-    
-    return position, reason
-  
+    if envelope.status.is_error():
+        raise PubNubException(envelope.status.error_data)
+
+def publish_to_pubnub(temp, humidity, motion, gas, angle):
+    '''
+    Queue sensor data for PubNub; only changed values are sent, in the background
+
+    temp and humidity are None while there is no fresh DHT11 reading.
+    '''
+    message = {
+        "temperature": temp,
+        "humidity": humidity,
+        "motion": motion,
+        "gas": gas,
+        "vent_angle": angle,
+    }
+    cloud_publisher.submit(message)
+
+def publisher_metrics():
+    '''Expose the publisher's own counters (read when /metrics is scraped)'''
+    for key, kind, help_text in (
+        ("failures", "counter", "Failed PubNub batch publishes"),
+        ("dropped", "counter", "Messages dropped because the publish queue was full"),
+        ("queued", "gauge", "Messages waiting in memory"),
+        ("buffered", "gauge", "Messages waiting in the disk buffer"),
+    ):
+        name = f"pubnub_{key}_total" if kind == "counter" else f"pubnub_{key}"
+        register = metrics.counter if kind == "counter" else metrics.gauge
+        register(name, help_text, fn=lambda key=key: cloud_publisher.status()[key])
+
 # ===== WEB SERVER FUNCTIONS =====
 def get_ip_address():
     '''Get Raspberry Pi IP address'''
@@ -422,52 +461,136 @@ def get_ip_address():
         s.close()
     return IP
 
+def update_status(**readings):
+    '''Refresh the cached status served by /api/system_status and /api/events'''
+    status_cache.update(
+        **readings,
+        angle=round(servo.position) if servo is not None else servo_position,
+        gas_detected=gas_detected,
+        motion_detected=last_detected_motion,
+        vent_reason=current_reason
+    )
+
 # HTTP request handler
 class ServoRequestHandler(BaseHTTPRequestHandler):
-    def _set_headers(self, content_type='application/json'):
-        self.send_response(200)
+    # HTTP/1.1 keeps connections open between polls; every response sets Content-Length
+    protocol_version = 'HTTP/1.1'
+    timeout = HTTP_IDLE_TIMEOUT
+    # Headers and body are written separately; without this, Nagle's algorithm
+    # delays the body by a delayed-ACK round trip on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def parse_request(self):
+        self._started = time.perf_counter()
+        return super().parse_request()
+
+    def _route(self):
+        '''Metric label for the request path (a fixed set, so job ids do not create new series)'''
+        path = urlparse(self.path).path
+        if path.startswith('/api/jobs/'):
+            return '/api/jobs'
+        return path if path in HTTP_ROUTES else 'other'
+
+    def _send_body(self, body, status=200, content_type='application/json'):
+        self.send_response(status)
         self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')  # Allow cross-origin requests
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
-    
-    def _set_error_headers(self, error_code=400):
-        self.send_response(error_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-    
+        self.wfile.write(body)
+        metrics.histogram("http_request_seconds", "HTTP request handling time by route and status",
+                          route=self._route(), method=self.command, code=str(status)
+                          ).observe(time.perf_counter() - self._started)
+
+    def _send_json(self, response, status=200):
+        self._send_body(json.dumps(response).encode(), status)
+
+    def _unavailable(self, name):
+        '''Answer 503 if a subsystem the request needs is not ready yet'''
+        if subsystems[name] == "ready":
+            return False
+        self._send_json({"status": "error", "message": f"{name} is {subsystems[name]}"}, 503)
+        return True
+
     def do_GET(self):
-        global current_angle, gas_detected
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
         if path == '/api/get_angle':
-            self._set_headers('application/json')
-            response = json.dumps({"angle": current_angle})
-            self.wfile.write(response.encode())
+            self._send_json({"angle": status_cache.get("angle")})
         
         elif path == '/api/system_status':
-            self._set_headers('application/json')
-            # Get the latest system status
-            response = json.dumps({
-                "angle": current_angle,
-                "gas_detected": gas_detected,
-                "motion_detected": last_detected_motion,
-                "vent_reason": current_reason
-            })
-            self.wfile.write(response.encode())
+            # Latest system status, serialized when it last changed
+            self._send_body(status_cache.json_bytes())
+
+        elif path == '/api/history':
+            if not self._unavailable("history"):
+                self._send_history(parse_qs(parsed_path.query))
+
+        elif path == '/api/events':
+            self._stream_events()
+
+        elif path == '/metrics':
+            self._send_body(metrics.render().encode(), content_type='text/plain; version=0.0.4')
+
+        elif path.startswith('/api/jobs/'):
+            if self._unavailable("servo"):
+                return
+            try:
+                job = servo.jobs.get(int(path[len('/api/jobs/'):]))
+            except ValueError:
+                job = None
+            if job is None:
+                self._send_json({"status": "error", "message": "Unknown job"}, 404)
+            else:
+                self._send_json(job)
             
         else:
-            self._set_error_headers(404)
-            response = json.dumps({"status": "error", "message": "Resource not found"})
-            self.wfile.write(response.encode())
+            self._send_json({"status": "error", "message": "Resource not found"}, 404)
+    
+    def _send_history(self, query):
+        '''/api/history?from=&to=&resolution= (epoch seconds; raw, 1m, 1h or auto)'''
+        try:
+            end = float(query.get('to', [time.time()])[0])
+            start = float(query.get('from', [end - HISTORY_DEFAULT_SPAN])[0])
+            resolution, points = history.query(start, end, query.get('resolution', ['auto'])[0])
+        except ValueError as e:
+            self._send_json({"status": "error", "message": str(e)}, 400)
+            return
+        self._send_json({"status": "success", "from": start, "to": end,
+                         "resolution": resolution, "points": points})
+
+    def _stream_events(self):
+        '''Server-Sent Events: the full status now, then again on every change'''
+        if not status_cache.add_subscriber(MAX_SSE_CLIENTS):
+            self._send_json({"status": "error", "message": "Too many event subscribers"}, 503)
+            return
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        # No Content-Length: the stream ends when either side closes the connection
+        self.close_connection = True
+        
+        try:
+            version, body = status_cache.version, status_cache.json_bytes()
+            while True:
+                self.wfile.write(b'id: %d\nevent: status\ndata: %s\n\n' % (version, body))
+                new_version, body = status_cache.wait_for_change(version, SSE_PING_INTERVAL)
+                while new_version == version:
+                    self.wfile.write(b': ping\n\n')  # Detects closed connections
+                    new_version, body = status_cache.wait_for_change(version, SSE_PING_INTERVAL)
+                version = new_version
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            status_cache.remove_subscriber()
     
     def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
+        content_length = int(self.headers.get('Content-Length', 0))
         post_data = self.rfile.read(content_length)
         parsed_path = urlparse(self.path)
         path = parsed_path.path
@@ -475,6 +598,11 @@ class ServoRequestHandler(BaseHTTPRequestHandler):
         try:
             data = json.loads(post_data.decode())
             
+            # Movements are queued on the servo actuator, so the response
+            # never waits for the servo; the job id tracks their progress
+            if path in ('/api/set_angle', '/api/preset', '/api/sweep') and self._unavailable("servo"):
+                return
+            
             if path == '/api/set_angle':
                 angle = data.get('angle', 90)
                 response = set_servo_angle(angle)
@@ -491,24 +619,24 @@ class ServoRequestHandler(BaseHTTPRequestHandler):
                 response = sweep_servo(start_angle, end_angle, step, delay)
                 
             else:
-                self._set_error_headers(404)
-                response = {"status": "error", "message": "Unknown API endpoint"}
+                self._send_json({"status": "error", "message": "Unknown API endpoint"}, 404)
+                return
                 
-            self._set_headers('application/json')
-            self.wfile.write(json.dumps(response).encode())
+            self._send_json(response, 200 if response["status"] == "success" else 400)
             
         except json.JSONDecodeError:
-            self._set_error_headers(400)
-            self.wfile.write(json.dumps({"status": "error", "message": "Invalid JSON data"}).encode())
+            self._send_json({"status": "error", "message": "Invalid JSON data"}, 400)
     
     def do_OPTIONS(self):
         # Handle preflight requests, important for cross-origin requests
-        self._set_headers()
+        self._send_body(b'')
 
 def start_web_server():
     '''Start web server in a separate thread'''
     server_address = ('0.0.0.0', WEB_PORT) 
-    httpd = HTTPServer(server_address, ServoRequestHandler)
+    # One thread per connection, so slow clients do not hold up the others
+    httpd = ThreadingHTTPServer(server_address, ServoRequestHandler)
+    set_subsystem("web", "ready")
     ip_address = get_ip_address()
     print(f"Servo motor API server started!")
     print(f"API address: http://{ip_address}:{WEB_PORT}")
@@ -524,7 +652,7 @@ def start_web_server():
 def main():
     global last_motion_time, current_reason, gas_detected, gas_detected_last_state
     global display_toggle_time, servo_position, last_detected_motion
-    global last_vent_change_time, motion_count
+    global last_vent_change_time, motion_count, dht_sensor, cloud_publisher, history
 
     try:
         # Set GPIO mode
@@ -532,181 +660,170 @@ def main():
         GPIO.setmode(GPIO.BCM)
         GPIO.cleanup()  # Clean up previous settings
         
-        # Initialize LCD
-        lcd_init()
-        print("LCD screen initialized")
-        
-        # Initialize DHT11
-        dht_sensor = dht11.DHT11(pin=DHT_PIN)
-        print("DHT11 temperature/humidity sensor initialized")
-        
-        # Initialize servo
-        servo_init()
-        
-        # Initialize PIR sensor
-        pir_init()
-        
-        # Initialize MQ-2 gas sensor
-        mq2_init()
-        
-        gas_detected = check_gas()
-        gas_detected_last_state = gas_detected
-        
-        try:
-            GPIO.add_event_detect(MQ2_PIN, GPIO.BOTH, callback=callback_gas_detected)
-            print("MQ2 gas detection event set up successfully with BOTH edge detection")
-        except RuntimeError as e:
-            print(f"Failed to set up MQ2 event detection with BOTH edge: {e}")
-            try:
-                # 尝试RISING
-                GPIO.add_event_detect(MQ2_PIN, GPIO.RISING, callback=callback_gas_detected)
-                print("MQ2 gas detection event set up with RISING edge detection")
-            except RuntimeError as e:
-                print(f"Failed to set up MQ2 event detection with RISING edge: {e}")
-                try:
-                    # 尝试FALLING
-                    GPIO.add_event_detect(MQ2_PIN, GPIO.FALLING, callback=callback_gas_detected)
-                    print("MQ2 gas detection event set up with FALLING edge detection")
-                except RuntimeError as e:
-                    print(f"Failed to set up MQ2 event detection: {e}")
-                    print("Will use polling for gas detection instead")
+        # Stage 1 (milliseconds): the API, the display and the servo. Requests
+        # for subsystems that are not ready yet get a 503
+        web_server_thread = threading.Thread(target=start_web_server, daemon=True)
+        web_server_thread.start()
         
-        # Display welcome message
+        lcd_init()
+        set_subsystem("lcd", "ready")
         lcd_string("Smart Air System", LCD_LINE_1)
         lcd_string("Initializing...", LCD_LINE_2)
-        time.sleep(2)
+        welcome_until = time.time() + WELCOME_TIME  # The loop leaves the message up until then
         
         # Initial values
         motion_count = 0
         last_motion_time = time.time()  # Initialize to current time
         servo_position = 90  # Initial servo position (half open)
-        set_angle(servo_position)  # Set initial position
         last_detected_motion = False  # Last motion state
         display_toggle_time = time.time()  # Last display toggle time
         last_vent_change_time = 0  # Last vent position change time
         current_reason = "Initial state"  # Current reason for vent position
-        last_pubnub_time = 0  # Last time data was published to PubNub
-        last_gas_check_time = 0  # 上次检查气体的时间
         
-        # Start web server in a separate thread
-        web_server_thread = threading.Thread(target=start_web_server, daemon=True)
-        web_server_thread.start()
+        servo_init()
+        set_angle(servo_position)  # Set initial position
+        set_subsystem("servo", "ready")
+        
+        # Publish to PubNub from a background thread
+        cloud_publisher = CloudPublisher(send_to_pubnub, PUBNUB_BUFFER_FILE,
+                                         batch_interval=PUBNUB_BATCH_INTERVAL,
+                                         heartbeat_interval=PUBNUB_HEARTBEAT_INTERVAL)
+        cloud_publisher.start()
+        publisher_metrics()
+        set_subsystem("publisher", "ready")
+        
+        # Keep a local history of the readings
+        history = HistoryStore(HISTORY_DB_FILE, flush_interval=HISTORY_FLUSH_INTERVAL)
+        history.start()
+        set_subsystem("history", "ready")
+        
+        # Stage 2 (seconds, in the background): the sensors warm up in parallel
+        # while the loop already runs; DHT11 is ready with its first good reading
+        set_subsystem("dht", "warming_up")
+        dht_init()
+        start_subsystem("pir", motion_init)
+        start_subsystem("gas", gas_init)
         
         print("System startup complete, monitoring...")
         
-        while True:
+        while not shutdown_requested.is_set():
+            cycle_start = time.perf_counter()
             current_time = time.time()
             time_str = time.strftime("%H:%M:%S")
             
-            # 定期检查气体状态（作为事件检测的备份）
-            if current_time - last_gas_check_time > 0.5:  # 每0.5秒检查一次
-                # 只有在未使用事件检测时才采用轮询方式
-                if not GPIO.event_detected(MQ2_PIN):
-                    current_gas = check_gas()
-                    if current_gas != gas_detected:
-                        gas_detected = current_gas
-                        if gas_detected:
-                            print("Gas/Smoke detected! (polling)")
-                            GPIO.output(LED_PIN, GPIO.HIGH)
-                            GPIO.output(BUZZER_PIN, GPIO.HIGH)
-                        else:
-                            print("No gas/smoke detected (polling)")
-                            GPIO.output(LED_PIN, GPIO.LOW)
-                            GPIO.output(BUZZER_PIN, GPIO.LOW)
-                
-                last_gas_check_time = current_time
-            
-            # 1. Read DHT11 temperature/humidity data
-            result = dht_sensor.read()
+            # 1. Take one consistent view of the latest sensor readings
+            readings = sensor_state.snapshot
+            dht = readings.get("dht", NO_READING)
+            current_motion = bool(readings.get("motion", NO_READING).value)
+            if dht.value is not None and current_time - dht.timestamp <= DHT_MAX_AGE:
+                temp, humidity = dht.value
+            else:
+                temp, humidity = None, None
             current_second = int(time.strftime("%S"))
             # Cycle display mode every 5 seconds (0=temp/humidity, 1=PIR data, 2=vent status, 3=gas status)
             display_mode = (current_second // 5) % 4  
             
-            if result.is_valid():
-                temp = result.temperature
-                humidity = result.humidity
-                
-                # Detect current motion state
-                current_motion = check_motion()
-                if current_motion and not last_detected_motion:
-                    if current_time - last_motion_time > 1:  # Avoid consecutive triggers
-                        motion_count += 1
-                        print(f"[{time_str}] Motion detected! Total: {motion_count}")
-                        last_motion_time = current_time
+            # Decide vent position (gas opens the vent on the gas alarm thread; this keeps
+            # the loop's view of it, and without a recent DHT11 reading nothing else moves it)
+            if (temp is not None or gas_detected) and current_time - last_vent_change_time > VENT_CHANGE_INTERVAL:  # Adjust vent position at most once every 10 seconds
+                new_position, reason = decide_vent_position(
+                    temp, humidity, current_motion, last_motion_time, current_time, gas_detected
+                )
                 
-                # Update motion state
-                last_detected_motion = current_motion
-                
-                # Decide vent position
-                if current_time - last_vent_change_time > 10:  # Adjust vent position at most once every 10 seconds
-                    new_position, reason = decide_vent_position(
-                        temp, humidity, current_motion, last_motion_time, current_time, gas_detected
-                    )
-                    
-                    # If position needs to change, control servo
-                    if new_position != servo_position:
-                        print(f"[{time_str}] Adjusting vent: {servo_position}° -> {new_position}° (Reason: {reason})")
-                        servo_position = new_position
-                        set_angle(servo_position)
+                # If position needs to change, control servo (while the gas alarm
+                # holds the vent open, these commands are overridden)
+                if new_position != servo_position:
+                    print(f"[{time_str}] Adjusting vent: {servo_position}° -> {new_position}° (Reason: {reason})")
+                    if set_angle(new_position)["state"] != "overridden":
                         current_reason = reason
-                        last_vent_change_time = current_time
+                    last_vent_change_time = current_time  # Also spaces out retries while overridden
+            
+            control_done = time.perf_counter()
+            
+            # Decide what to display based on display mode
+            if current_time < welcome_until:
+                pass  # Welcome message
+            elif dht.errors > SENSOR_ERROR_LIMIT:
+                lcd_string("Sensor Error!", LCD_LINE_1)
+                lcd_string("Check Connection", LCD_LINE_2)
+            elif display_mode == 0:  # Display temperature/humidity
+                temp_str = f"Temp: {temp}C" if temp is not None else "Temp: --"
+                hum_str = f"Hum: {humidity}% {time_str[-5:]}" if humidity is not None else f"Hum: -- {time_str[-5:]}"
                 
-                # Decide what to display based on display mode
-                if display_mode == 0:  # Display temperature/humidity
-                    temp_str = f"Temp: {temp}C"
-                    hum_str = f"Hum: {humidity}% {time_str[-5:]}"
-                    
-                    lcd_string(temp_str, LCD_LINE_1)
-                    lcd_string(hum_str, LCD_LINE_2)
-                elif display_mode == 1:  # Display PIR data
-                    lcd_string("Motion Detector", LCD_LINE_1)
-                    status = "ACTIVE" if current_motion else "Inactive"
-                    lcd_string(f"Status: {status}", LCD_LINE_2)
-                elif display_mode == 2:  # Display vent status
-                    vent_status = "Off" if servo_position == 0 else "On"
-                    if 0 < servo_position < 180:
-                        vent_status = f"{int(servo_position/180*100)}%"
-                    
-                    lcd_string(f"Vent: {vent_status}", LCD_LINE_1)
-                    lcd_string(f"Reason: {current_reason[:16]}", LCD_LINE_2)  # Limit to 16 characters
-                else:  # Display gas sensor status
-                    lcd_string("Gas Detector", LCD_LINE_1)
-                    gas_status = "DANGER!" if gas_detected else "Normal"
-                    lcd_string(f"Status: {gas_status}", LCD_LINE_2)
+                lcd_string(temp_str, LCD_LINE_1)
+                lcd_string(hum_str, LCD_LINE_2)
+            elif display_mode == 1:  # Display PIR data
+                lcd_string("Motion Detector", LCD_LINE_1)
+                status = "ACTIVE" if current_motion else "Inactive"
+                if subsystems["pir"] != "ready":
+                    status = "Warming"
+                lcd_string(f"Status: {status}", LCD_LINE_2)
+            elif display_mode == 2:  # Display vent status
+                vent_status = "Off" if servo_position == 0 else "On"
+                if 0 < servo_position < 180:
+                    vent_status = f"{int(servo_position/180*100)}%"
                 
+                lcd_string(f"Vent: {vent_status}", LCD_LINE_1)
+                lcd_string(f"Reason: {current_reason[:16]}", LCD_LINE_2)  # Limit to 16 characters
+            else:  # Display gas sensor status
+                lcd_string("Gas Detector", LCD_LINE_1)
+                gas_status = "DANGER!" if gas_detected else "Normal"
+                if subsystems["gas"] != "ready":
+                    gas_status = "Warming"
+                lcd_string(f"Status: {gas_status}", LCD_LINE_2)
+            display_done = time.perf_counter()
+            
+            # Motion, gas and the vent are recorded every cycle; temperature and
+            # humidity are None while there is no fresh DHT11 reading
+            history.record(current_time, temp, humidity, current_motion, gas_detected, servo_position)
+            if temp is not None:
                 print(f"[{time_str}] Temp: {temp}°C, Humidity: {humidity}%, Vent: {servo_position}°, Gas: {gas_detected}")
-                
-                # Publish data to PubNub every 5 seconds
-                if current_time - last_pubnub_time > 5:
-                    publish_to_pubnub(temp, humidity, current_motion, gas_detected)
-                    last_pubnub_time = current_time
-                    
-            else:
-                error_count = 0
-                error_count += 1
-                print(f"[{time_str}] Sensor read failed, attempt: {error_count}")
-                
-                if error_count > 5:
-                    lcd_string("Sensor Error!", LCD_LINE_1)
-                    lcd_string("Check Connection", LCD_LINE_2)
+                update_status(temperature=temp, humidity=humidity)
             
-            # Pause to reduce CPU usage
-            time.sleep(1)
+            # Queue changes for PubNub (sent in batches every 5 seconds); like the
+            # history, this does not wait for the DHT11
+            publish_to_pubnub(temp, humidity, current_motion, gas_detected, servo_position)
+            
+            update_status()
+            
+            cycle_end = time.perf_counter()
+            LOOP_PHASES["control"].observe(control_done - cycle_start)
+            LOOP_PHASES["display"].observe(display_done - control_done)
+            LOOP_PHASES["record"].observe(cycle_end - display_done)
+            LOOP_CYCLE.observe(cycle_end - cycle_start)
+            LOOP_LAST_CYCLE.set(cycle_end - cycle_start)
+            if cycle_end - cycle_start > LOOP_INTERVAL:
+                LOOP_DEADLINE_MISSED.inc()
+            
+            # Keep a 1 second cycle; the sensors are sampled on their own threads
+            shutdown_requested.wait(max(0.0, LOOP_INTERVAL - (time.time() - current_time)))
             
     except KeyboardInterrupt:
         print("\nProgram exited")
     finally:
-        lcd_string("System Shutdown", LCD_LINE_1)
-        lcd_string("Goodbye!", LCD_LINE_2)
-        time.sleep(1)
+        if lcd is not None:  # None if setup failed before the LCD was initialised
+            lcd_string("System Shutdown", LCD_LINE_1)
+            lcd_string("Goodbye!", LCD_LINE_2)
+            lcd.stop()  # Waits until the message is on the display
+            time.sleep(1)
         
         # Clean up and close
-        if 'pwm' in globals():
-            pwm.stop()
+        for sampler in samplers:
+            sampler.stop()
+        if gas_alarm is not None:
+            gas_alarm.stop()
+        if cloud_publisher is not None:
+            cloud_publisher.stop()  # Unsent data is kept on disk for the next start
+        if history is not None:
+            history.stop()  # Writes the samples still in memory
+        if servo is not None:
+            servo.stop()
         GPIO.cleanup()
         print("System shut down, GPIO cleaned up")
 
 if __name__ == "__main__":
     # 初始化保存气体状态的变量
     gas_detected_last_state = False
+    # Let `systemctl stop` shut the system down as cleanly as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown_requested.set())
     main()
\ No newline at end of file
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Whole-system benchmark of backend.py on simulated hardware
+
+Runs backend.main() against sim.py (GPIO, PWM, DHT11, PIR, MQ-2 and
+PubNub) with every interval of the backend divided by --speed, so that
+the scenario below, which covers about half an hour of simulated time,
+plays in well under a minute:
+
+  boot       main() to the API answering, and to every subsystem ready
+  idle       main loop work per cycle with nobody using the API
+  load       --clients keep-alive clients polling /api/system_status
+             (and every tenth request a POST /api/set_angle): requests
+             per second, response times and the loop cycle under load
+  api        POST /api/set_angle to the first PWM update towards the angle
+  gas        MQ-2 edge to the first PWM update opening the vent, and to
+             the alarm being published
+  climate    temperature step to the first PWM update opening the vent,
+             in simulated seconds (it includes the DHT11 interval and the
+             vent rate limit by design)
+
+The gas debounce and the servo speed are physical and are not scaled.
+--save writes the results to a JSON file; --compare checks them against
+one and exits with status 1 if any got worse by more than --tolerance.
+
+Usage:
+    python bench_backend.py --speed 60 --clients 8
+    python bench_backend.py --save baseline.json
+    python bench_backend.py --compare baseline.json --tolerance 0.5
+'''
+
+import argparse
+import contextlib
+import functools
+import http.client
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["SMART_REGISTER_SIM"] = "1"  # Before backend imports hardware.py
+
+import backend  # noqa: E402
+from sim import world, constant, pulses  # noqa: E402
+from vent_control import NO_MOTION_TIME  # noqa: E402
+
+# Backend constants that are durations in simulated time
+SCALED = ("LOOP_INTERVAL", "WELCOME_TIME", "VENT_CHANGE_INTERVAL",
+          "DHT_INTERVAL", "DHT_RETRY_INTERVAL", "DHT_MAX_BACKOFF", "DHT_MAX_AGE",
+          "PIR_INTERVAL", "PIR_WARMUP", "GAS_INTERVAL", "GAS_CLEAR_TIME", "MQ2_WARMUP",
+          "PUBNUB_BATCH_INTERVAL", "PUBNUB_HEARTBEAT_INTERVAL", "HISTORY_FLUSH_INTERVAL")
+
+# Result name -> True if higher is better
+RESULTS = {
+    "boot_api_ms": False, "boot_ready_ms": False,
+    "loop_idle_p50_ms": False, "loop_idle_p99_ms": False,
+    "loop_load_p50_ms": False, "loop_load_p99_ms": False,
+    "api_requests_per_s": True, "api_p50_ms": False, "api_p99_ms": False,
+    "actuation_api_p50_ms": False, "actuation_api_max_ms": False,
+    "actuation_gas_ms": False, "gas_publish_ms": False,
+    "actuation_climate_sim_s": False,
+}
+ABSOLUTE_SLACK = {"_ms": 1.0, "_s": 1.0, "_per_s": 0.0}  # Differences too small to call a regression
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Bench:
+    def __init__(self, speed, port):
+        self.speed = speed
+        self.port = port
+        self.cycles = []      # Loop work per cycle, in seconds
+        self.pwm_updates = []  # (time.monotonic(), servo target) of every PWM update
+        self.tmp = tempfile.mkdtemp(prefix="bench_backend_")
+
+        world.start(speed)
+        world.temperature = constant(22)
+        world.humidity = constant(45)
+        world.gpio.drive(backend.PIR_PIN, pulses(period=60, width=10))  # Someone in the room
+        world.gpio.drive(backend.MQ2_PIN, constant(False), active_low=True)
+
+        for name in SCALED:
+            setattr(backend, name, getattr(backend, name) / speed)
+        backend.decide_vent_position = functools.partial(backend.decide_vent_position,
+                                                         no_motion_time=NO_MOTION_TIME / speed)
+        backend.WEB_PORT = port
+        backend.HISTORY_DB_FILE = os.path.join(self.tmp, "history.db")
+        backend.PUBNUB_BUFFER_FILE = os.path.join(self.tmp, "pubnub_buffer.jsonl")
+
+        observe = backend.LOOP_CYCLE.observe
+
+        def record_cycle(seconds):
+            self.cycles.append(seconds)
+            observe(seconds)
+        backend.LOOP_CYCLE.observe = record_cycle
+
+    # ===== HELPERS =====
+    def wait_until(self, condition, timeout):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def request(self, conn, method, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def status(self):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=2)
+            code, body = self.request(conn, "GET", "/api/system_status")
+            conn.close()
+            return json.loads(body) if code == 200 else None
+        except (OSError, ValueError):
+            return None
+
+    def first_pwm(self, since, target):
+        return next((t for t, heading in list(self.pwm_updates) if t >= since and heading == target), None)
+
+    def track_pwm(self):
+        '''Tag every PWM update with the angle the servo is heading for'''
+        servo = backend.servo
+        change_duty_cycle = servo.pwm.ChangeDutyCycle
+
+        def record(duty_cycle):
+            self.pwm_updates.append((time.monotonic(), servo.target))
+            change_duty_cycle(duty_cycle)
+        servo.pwm.ChangeDutyCycle = record
+
+    def settle(self, angle=90):
+        '''Park the servo at angle and let the loop take over again'''
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        self.request(conn, "POST", "/api/set_angle", {"angle": angle})
+        conn.close()
+        self.wait_until(lambda: backend.servo.target == angle and backend.servo._pending is None
+                        and abs(backend.servo.position - angle) < 0.5, timeout=5)
+
+    # ===== PHASES =====
+    def boot(self):
+        started = time.monotonic()
+        self.main_thread = threading.Thread(target=backend.main, name="backend-main", daemon=True)
+        self.main_thread.start()
+        api = ready = None
+        deadline = started + 30
+        while time.monotonic() < deadline and ready is None:
+            status = self.status()
+            now = time.monotonic()
+            if status is not None and api is None:
+                api = now
+            if status is not None and status.get("ready"):
+                ready = now
+            time.sleep(0.002)
+        if ready is None:
+            raise RuntimeError("backend did not become ready within 30 s")
+        self.track_pwm()
+        return {"boot_api_ms": (api - started) * 1000, "boot_ready_ms": (ready - started) * 1000}
+
+    def idle(self, duration):
+        start = len(self.cycles)
+        time.sleep(duration)
+        cycles = self.cycles[start:]
+        return {"loop_idle_p50_ms": statistics.median(cycles) * 1000,
+                "loop_idle_p99_ms": percentile(cycles, 0.99) * 1000}
+
+    def load(self, clients, duration):
+        start = len(self.cycles)
+        stop = threading.Event()
+        latencies = [[] for _ in range(clients)]
+        errors = []
+
+        def client(index):
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+            n = 0
+            while not stop.is_set():
+                n += 1
+                began = time.perf_counter()
+                try:
+                    if n % 10 == 0:
+                        code, _ = self.request(conn, "POST", "/api/set_angle", {"angle": (n * 7 + index) % 181})
+                    else:
+                        code, _ = self.request(conn, "GET", "/api/system_status")
+                except (OSError, http.client.HTTPException) as e:
+                    errors.append(str(e))
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+                    continue
+                latencies[index].append(time.perf_counter() - began)
+                if code != 200:
+                    errors.append(f"HTTP {code}")
+            conn.close()
+
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+        began = time.monotonic()
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - began
+        cycles = self.cycles[start:]
+        latencies = [value for values in latencies for value in values]
+        if errors:
+            print(f"  {len(errors)} failed requests, first: {errors[0]}")
+        return {"api_requests_per_s": len(latencies) / elapsed,
+                "api_p50_ms": statistics.median(latencies) * 1000,
+                "api_p99_ms": percentile(latencies, 0.99) * 1000,
+                "loop_load_p50_ms": statistics.median(cycles) * 1000,
+                "loop_load_p99_ms": percentile(cycles, 0.99) * 1000}
+
+    def api_actuation(self, trials):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        latencies = []
+        for trial in range(trials):
+            angle = 45 if trial % 2 == 0 else 135
+            sent = time.monotonic()
+            self.request(conn, "POST", "/api/set_angle", {"angle": angle})
+            if self.wait_until(lambda: self.first_pwm(sent, angle) is not None, timeout=2):
+                latencies.append(self.first_pwm(sent, angle) - sent)
+            else:
+                latencies.append(float('inf'))
+            self.wait_until(lambda: abs(backend.servo.position - angle) < 0.5, timeout=2)
+        conn.close()
+        return {"actuation_api_p50_ms": statistics.median(latencies) * 1000,
+                "actuation_api_max_ms": max(latencies) * 1000}
+
+    def gas(self):
+        self.settle()
+        published = len(world.published)
+        world.gpio.drive(backend.MQ2_PIN, constant(True), active_low=True)
+        self.wait_until(lambda: world.gpio.levels.get(backend.MQ2_PIN) == 0, timeout=1)
+        edge = world.gpio.changed_at[backend.MQ2_PIN]
+
+        def publish_time():
+            return next((t for t, channel, message in world.published[published:]
+                         if any(m.get("gas") is True for m in message.get("batch", []))), None)
+
+        self.wait_until(lambda: self.first_pwm(edge, 180) is not None and publish_time() is not None, timeout=5)
+        vent, publish = self.first_pwm(edge, 180), publish_time()
+        world.gpio.drive(backend.MQ2_PIN, constant(False), active_low=True)
+        self.wait_until(lambda: not backend.gas_alarm.detected, timeout=backend.GAS_CLEAR_TIME + 5)
+        return {"actuation_gas_ms": (vent - edge) * 1000 if vent else float('inf'),
+                "gas_publish_ms": (publish - edge) * 1000 if publish else float('inf')}
+
+    def climate(self):
+        self.settle()
+        # Let the loop put the vent back where it wants it, then step the temperature
+        self.wait_until(lambda: backend.servo_position == 90 and backend.servo.target == 90,
+                        timeout=backend.VENT_CHANGE_INTERVAL * 3 + 1)
+        step = time.monotonic()
+        world.temperature = constant(29)
+        opened = self.wait_until(lambda: self.first_pwm(step, 180) is not None,
+                                 timeout=(backend.VENT_CHANGE_INTERVAL + backend.DHT_INTERVAL) * 5 + 1)
+        world.temperature = constant(22)
+        sim_seconds = (self.first_pwm(step, 180) - step) * self.speed if opened else float('inf')
+        return {"actuation_climate_sim_s": sim_seconds}
+
+
+def compare(results, baseline, tolerance):
+    '''Results that got worse than the baseline by more than tolerance (a fraction)'''
+    regressions = []
+    for name, higher_is_better in RESULTS.items():
+        if name not in baseline or name not in results:
+            continue
+        old, new = baseline[name], results[name]
+        slack = next(value for suffix, value in ABSOLUTE_SLACK.items() if name.endswith(suffix))
+        if higher_is_better:
+            worse = new < old * (1 - tolerance) - slack
+        else:
+            worse = new > old * (1 + tolerance) + slack
+        if worse:
+            regressions.append(f"{name}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend.py on simulated hardware")
+    parser.add_argument('--speed', type=float, default=60, help="Simulated seconds per wall second")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent API clients")
+    parser.add_argument('--duration', type=float, default=5, help="Wall seconds of the idle and load phases")
+    parser.add_argument('--trials', type=int, default=20, help="API actuation trials")
+    parser.add_argument('--port', type=int, default=None, help="API port (default: a free one)")
+    parser.add_argument('--log', default=os.devnull, help="File for the backend's own output and request log")
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to check the results against")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    port = args.port
+    if port is None:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+    out = sys.stdout
+    bench = Bench(args.speed, port)
+    results = {}
+    with open(args.log, "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            for phase, run in (("boot", bench.boot),
+                               ("idle", lambda: bench.idle(args.duration)),
+                               ("load", lambda: bench.load(args.clients, args.duration)),
+                               ("api", lambda: bench.api_actuation(args.trials)),
+                               ("gas", bench.gas),
+                               ("climate", bench.climate)):
+                print(f"{phase}...", file=out, flush=True)
+                results.update(run())
+        finally:
+            backend.shutdown_requested.set()
+            bench.main_thread.join(timeout=10)  # main() stops the threads and writes the history
+
+    print(f"speed x{args.speed:g}, {args.clients} clients, {args.duration:g} s phases", file=out)
+    for name in RESULTS:
+        print(f"  {name:<26} {results[name]:>10.2f}", file=out)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"speed": args.speed, "clients": args.clients, **results}, f, indent=2)
+        print(f"Saved to {args.save}", file=out)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"FAIL: worse than {args.compare} by more than {args.tolerance:.0%}:", file=out)
+            for regression in regressions:
+                print("  " + regression, file=out)
+            sys.exit(1)
+        print(f"PASS: within {args.tolerance:.0%} of {args.compare}", file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Gas alarm latency harness against a fake GPIO
+
+Wires gas_alarm.GasAlarm to a ServoActuator and a CloudPublisher the way
+backend.py does, drives the MQ-2 pin of a FakeGPIO and measures, from
+the falling edge, the time until:
+
+  led / buzzer   the output pin goes high
+  vent           the first PWM update of the movement to the open angle
+  publish        the send call of the batch carrying gas=True
+
+Each trial starts with the servo idle, in a slow manual sweep, or in an
+automatic move, and runs while --busy-threads threads keep the
+interpreter busy (standing in for the main loop and HTTP handlers).
+It also checks that glitches shorter than the debounce are ignored, that
+manual commands are overridden while the alarm holds the vent, and that
+the alarm clears. Exits with status 1 if any latency exceeds --bound.
+
+Usage:
+    python bench_gas_alarm.py --trials 20 --bound 0.1
+'''
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from fake_gpio import FakeGPIO
+from gas_alarm import GasAlarm
+from publisher import CloudPublisher
+from servo import ServoActuator, PRIORITY_AUTO, PRIORITY_MANUAL
+
+MQ2_PIN, LED_PIN, BUZZER_PIN, SERVO_PIN = 16, 20, 21, 18
+OPEN_ANGLE = 180
+
+
+class Harness:
+    def __init__(self, debounce, clear_time):
+        self.gpio = FakeGPIO()
+        self.gpio.setmode(FakeGPIO.BCM)
+        self.gpio.setup(MQ2_PIN, FakeGPIO.IN)
+        self.gpio.set_input(MQ2_PIN, 1)  # Active low: high means no gas
+
+        self.sends = []  # (time, message) of every send call
+        self.buffer_path = os.path.join(tempfile.mkdtemp(), "pubnub_buffer.jsonl")
+        self.publisher = CloudPublisher(self._send, self.buffer_path, batch_interval=5, heartbeat_interval=3600)
+
+        self.servo = ServoActuator(self.gpio, SERVO_PIN)
+        self.servo.start()
+        # Tag every PWM update with the angle the servo was heading for
+        self.pwm_updates = []
+        change_duty_cycle = self.servo.pwm.ChangeDutyCycle
+
+        def record(duty_cycle):
+            self.pwm_updates.append((time.monotonic(), self.servo.target))
+            change_duty_cycle(duty_cycle)
+        self.servo.pwm.ChangeDutyCycle = record
+
+        self.alarm = GasAlarm(self.gpio, MQ2_PIN, LED_PIN, BUZZER_PIN, servo=self.servo,
+                              publish=lambda detected: self.publisher.submit({"gas": detected}, urgent=True),
+                              debounce=debounce, clear_time=clear_time)
+        self.publisher.start()
+        self.alarm.start()
+
+    def _send(self, message):
+        self.sends.append((time.monotonic(), message))
+
+    def stop(self):
+        self.alarm.stop()
+        self.publisher.stop()
+        self.servo.stop()
+
+    def wait_until(self, condition, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def trial(self, mode):
+        '''Raise the alarm once from a servo in the given mode; returns the latency of each output'''
+        if mode == "sweep":
+            self.servo.sweep(180, 0, 20, PRIORITY_MANUAL, source="bench")
+            self.wait_until(lambda: self.servo.target == 0)
+        elif mode == "auto":
+            self.servo.move(0, PRIORITY_AUTO, source="bench")
+            self.wait_until(lambda: self.servo.target == 0)
+        time.sleep(random.uniform(0, 0.05))  # Land anywhere in a PWM step
+
+        edge = time.monotonic()
+        self.gpio.set_input(MQ2_PIN, 0)
+
+        def vent_time():
+            return next((t for t, target in self.pwm_updates if t >= edge and target == OPEN_ANGLE), None)
+
+        def publish_time():
+            return next((t for t, message in self.sends
+                         if t >= edge and any(m.get("gas") is True for m in message["batch"])), None)
+
+        done = self.wait_until(lambda: self.gpio.levels.get(BUZZER_PIN) == 1
+                               and vent_time() is not None and publish_time() is not None)
+        latencies = {
+            "led": self.gpio.changed_at.get(LED_PIN, edge) - edge if done else float('inf'),
+            "buzzer": self.gpio.changed_at.get(BUZZER_PIN, edge) - edge if done else float('inf'),
+            "vent": vent_time() - edge if done else float('inf'),
+            "publish": publish_time() - edge if done else float('inf'),
+        }
+
+        # While the alarm holds the vent, manual commands are rejected
+        job = self.servo.move(0, PRIORITY_MANUAL, source="bench")
+        held = job["state"] == "overridden"
+
+        # Clear the gas, wait for the alarm to end and park the servo
+        self.gpio.set_input(MQ2_PIN, 1)
+        cleared = self.wait_until(lambda: not self.alarm.detected and self.gpio.levels.get(LED_PIN) == 0,
+                                  timeout=self.alarm.clear_time + 1)
+        self.servo.move(90, PRIORITY_MANUAL, source="bench")
+        self.wait_until(lambda: abs(self.servo.position - 90) < 0.5)
+        return latencies, held, cleared
+
+    def glitch(self, width):
+        '''
+        A low pulse shorter than the debounce must not raise the alarm
+
+        :return: (alarm ignored the pulse, measured pulse width)
+        '''
+        self.gpio.set_input(MQ2_PIN, 0)
+        start = self.gpio.changed_at[MQ2_PIN]
+        time.sleep(width)
+        self.gpio.set_input(MQ2_PIN, 1)
+        width = self.gpio.changed_at[MQ2_PIN] - start
+        time.sleep(self.alarm.debounce * 3)
+        ignored = not self.alarm.detected and self.gpio.levels.get(LED_PIN, 0) == 0
+        self.wait_until(lambda: not self.alarm.detected, timeout=self.alarm.clear_time + 1)
+        return ignored, width
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and check the gas alarm edge-to-actuation latency")
+    parser.add_argument('--trials', type=int, default=20, help="Alarms raised")
+    parser.add_argument('--bound', type=float, default=0.1, help="Largest acceptable latency in seconds")
+    parser.add_argument('--debounce', type=float, default=0.02)
+    parser.add_argument('--clear-time', type=float, default=0.3)
+    parser.add_argument('--busy-threads', type=int, default=2, help="Threads competing for the interpreter")
+    args = parser.parse_args()
+
+    harness = Harness(args.debounce, args.clear_time)
+    harness.wait_until(lambda: harness.servo.jobs.get(1)["state"] == "done")
+    stop = threading.Event()
+    failures = []
+    results = {"led": [], "buzzer": [], "vent": [], "publish": []}
+    try:
+        # Glitches first, while sleep() in this thread is still precise
+        for width in (0.002, args.debounce / 2):
+            ignored, width = harness.glitch(width)
+            if not ignored and width < args.debounce:
+                failures.append(f"a {width * 1000:.1f} ms glitch raised the alarm")
+
+        for _ in range(args.busy_threads):
+            threading.Thread(target=busy, args=(stop,), daemon=True).start()
+        for trial in range(args.trials):
+            mode = ("idle", "sweep", "auto")[trial % 3]
+            latencies, held, cleared = harness.trial(mode)
+            for output, latency in latencies.items():
+                results[output].append(latency)
+                if latency > args.bound:
+                    failures.append(f"trial {trial} ({mode}): {output} after {latency * 1000:.1f} ms")
+            if not held:
+                failures.append(f"trial {trial} ({mode}): manual command not overridden during the alarm")
+            if not cleared:
+                failures.append(f"trial {trial} ({mode}): alarm did not clear")
+    finally:
+        stop.set()
+        harness.stop()
+
+    print(f"{args.trials} alarms, debounce {args.debounce * 1000:.0f} ms, {args.busy_threads} busy threads")
+    print(f"{'output':<8} {'median':>8} {'p90':>8} {'max':>8}   (ms from the MQ-2 edge)")
+    for output, values in results.items():
+        print(f"{output:<8} {statistics.median(values) * 1000:>8.1f} {percentile(values, 0.9) * 1000:>8.1f} "
+              f"{max(values) * 1000:>8.1f}")
+    if failures:
+        print(f"FAIL (bound {args.bound * 1000:.0f} ms):")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print(f"PASS: every output within {args.bound * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
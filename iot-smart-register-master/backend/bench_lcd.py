@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+LCD timing benchmark against a fake GPIO
+
+Replays the screens main() shows over a number of loop iterations (the
+four display modes, with the clock changing every second) and compares:
+
+  legacy   the original lcd_string(): every cell of both lines rewritten,
+           8 data writes per byte, inside the calling loop
+  driver   lcd.LCDDisplay: framebuffer diff on a refresh thread
+
+For each it reports how long the caller is blocked per iteration, the
+bytes and GPIO writes sent to the display, and the total time until
+the display showed every screen.
+
+Usage:
+    python bench_lcd.py --iterations 60
+'''
+
+import argparse
+import time
+
+from fake_gpio import FakeGPIO
+from lcd import LCDDisplay, E_DELAY, E_PULSE, LCD_CHR, LCD_CMD
+
+LCD_RS, LCD_E, LCD_DATA = 26, 19, (13, 6, 5, 11)
+LCD_WIDTH = 16
+LCD_LINE_1 = 0x80
+LCD_LINE_2 = 0xC0
+
+
+def screens(iterations):
+    '''Line pairs in the order main() displays them, one pair per second'''
+    start = time.mktime((2025, 4, 9, 12, 0, 0, 0, 0, -1))
+    for i in range(iterations):
+        time_str = time.strftime("%H:%M:%S", time.localtime(start + i))
+        display_mode = (int(time_str[-2:]) // 5) % 4
+        if display_mode == 0:
+            yield "Temp: 23.0C", f"Hum: 41.0% {time_str[-5:]}"
+        elif display_mode == 1:
+            yield "Motion Detector", "Status: " + ("ACTIVE" if i % 7 < 3 else "Inactive")
+        elif display_mode == 2:
+            yield "Vent: 50%", "Reason: Normal ventil"[:16]
+        else:
+            yield "Gas Detector", "Status: Normal"
+
+
+class LegacyLCD:
+    '''The lcd_byte()/lcd_string() functions from backend.py'''
+
+    def __init__(self, gpio, e_pulse, e_delay):
+        self.gpio = gpio
+        self.e_pulse = e_pulse
+        self.e_delay = e_delay
+        self.bytes_sent = 0
+
+    def lcd_byte(self, bits, mode):
+        GPIO = self.gpio
+        GPIO.output(LCD_RS, mode)
+        for nibble in (bits >> 4, bits):
+            for pin in LCD_DATA:
+                GPIO.output(pin, False)
+            for i, pin in enumerate(LCD_DATA):
+                if nibble & (1 << i):
+                    GPIO.output(pin, True)
+            time.sleep(self.e_delay)
+            GPIO.output(LCD_E, True)
+            time.sleep(self.e_pulse)
+            GPIO.output(LCD_E, False)
+            time.sleep(self.e_delay)
+        self.bytes_sent += 1
+
+    def lcd_string(self, message, line):
+        message = message.ljust(LCD_WIDTH, " ")
+        self.lcd_byte(line, LCD_CMD)
+        for i in range(LCD_WIDTH):
+            self.lcd_byte(ord(message[i]), LCD_CHR)
+
+
+def run_legacy(frames, e_pulse, e_delay):
+    gpio = FakeGPIO()
+    lcd = LegacyLCD(gpio, e_pulse, e_delay)
+    blocked = []
+    for line_1, line_2 in frames:
+        t0 = time.perf_counter()
+        lcd.lcd_string(line_1, LCD_LINE_1)
+        lcd.lcd_string(line_2, LCD_LINE_2)
+        blocked.append(time.perf_counter() - t0)
+    return blocked, sum(blocked), lcd.bytes_sent, gpio.write_count
+
+
+def run_driver(frames, e_pulse, e_delay):
+    gpio = FakeGPIO()
+    lcd = LCDDisplay(gpio, LCD_RS, LCD_E, LCD_DATA, e_pulse=e_pulse, e_delay=e_delay)
+    lcd.start()
+    lcd.flush()
+    base_bytes, base_writes = lcd.bytes_sent, gpio.write_count
+    blocked = []
+    bus_time = 0.0
+    for line_1, line_2 in frames:
+        t0 = time.perf_counter()
+        lcd.write(line_1, 0)
+        lcd.write(line_2, 1)
+        blocked.append(time.perf_counter() - t0)
+        # Let the refresh finish before the next "second", as on the device
+        lcd.flush(timeout=5)
+        bus_time += time.perf_counter() - t0
+    lcd.stop()
+    return blocked, bus_time, lcd.bytes_sent - base_bytes, gpio.write_count - base_writes
+
+
+def report(name, result, iterations):
+    blocked, bus_time, bytes_sent, writes = result
+    blocked = sorted(blocked)
+    print(f"{name:<7} blocked/iter: mean {sum(blocked) / len(blocked) * 1000:8.3f} ms, "
+          f"max {blocked[-1] * 1000:8.3f} ms | bytes/iter {bytes_sent / iterations:6.1f} | "
+          f"gpio writes/iter {writes / iterations:7.1f} | until shown {bus_time:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LCD redraw cost against a fake GPIO")
+    parser.add_argument('--iterations', type=int, default=60, help="Main loop iterations (seconds) to replay")
+    parser.add_argument('--e-pulse', type=float, default=E_PULSE)
+    parser.add_argument('--e-delay', type=float, default=E_DELAY)
+    args = parser.parse_args()
+
+    frames = list(screens(args.iterations))
+    print(f"{args.iterations} iterations, E pulse {args.e_pulse * 1e6:.0f} us, E delay {args.e_delay * 1e6:.0f} us")
+    report("legacy", run_legacy(frames, args.e_pulse, args.e_delay), args.iterations)
+    report("driver", run_driver(frames, args.e_pulse, args.e_delay), args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+In-memory stand-in for the RPi.GPIO module
+
+Records pin levels, the time of each pin's last level change and the
+number of output writes, so drivers written against the RPi.GPIO
+interface can be run and timed on any machine.
+'''
+
+import threading
+import time
+
+
+class FakePWM:
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = None
+        self.changes = []  # (time.monotonic(), duty cycle)
+
+    def start(self, duty_cycle):
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.changes.append((self.gpio.clock(), duty_cycle))
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.duty_cycle = None
+
+
+class FakeGPIO:
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, clock=None):
+        '''
+        :param clock: Time source for recorded events (default: time.monotonic)
+        '''
+        self.clock = clock or time.monotonic
+        self.mode = None
+        self.pins = {}
+        self.levels = {}
+        self.changed_at = {}  # pin -> clock() of its last level change
+        self.write_count = 0
+        self.pwms = {}
+        self._callbacks = {}
+        self._events = set()
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        with self._lock:
+            self.pins[pin] = direction
+            if initial is not None:
+                self.levels[pin] = int(initial)
+            else:
+                self.levels.setdefault(pin, 0)
+
+    def output(self, pin, value):
+        with self._lock:
+            value = int(bool(value))
+            if self.levels.get(pin) != value:
+                self.changed_at[pin] = self.clock()
+            self.levels[pin] = value
+            self.write_count += 1
+
+    def input(self, pin):
+        return self.levels.get(pin, 0)
+
+    def cleanup(self, pins=None):
+        with self._lock:
+            if pins is None:
+                pins = list(self.pins)
+            elif isinstance(pins, int):
+                pins = [pins]
+            for pin in pins:
+                self.pins.pop(pin, None)
+                self.levels.pop(pin, None)
+                self._callbacks.pop(pin, None)
+
+    def PWM(self, pin, frequency):
+        pwm = FakePWM(self, pin, frequency)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            if pin in self._callbacks:
+                raise RuntimeError(f"Conflicting edge detection already enabled for GPIO{pin}")
+            self._callbacks[pin] = (edge, [callback] if callback else [])
+
+    def add_event_callback(self, pin, callback):
+        with self._lock:
+            self._callbacks[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._callbacks.pop(pin, None)
+
+    def event_detected(self, pin):
+        with self._lock:
+            if pin in self._events:
+                self._events.discard(pin)
+                return True
+            return False
+
+    def set_input(self, pin, value):
+        '''Drive an input pin from a test or simulator and fire edge callbacks'''
+        value = int(bool(value))
+        with self._lock:
+            previous = self.levels.get(pin, 0)
+            if previous != value:
+                self.changed_at[pin] = self.clock()
+            self.levels[pin] = value
+            edge, callbacks = self._callbacks.get(pin, (None, []))
+            if previous != value and edge is not None:
+                self._events.add(pin)
+        if previous == value or edge is None:
+            return
+        rising = value == 1
+        if edge == self.BOTH or (edge == self.RISING) == rising:
+            for callback in list(callbacks):
+                callback(pin)
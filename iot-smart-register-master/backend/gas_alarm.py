@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Gas alarm fast path for the MQ-2 sensor
+
+An MQ-2 edge wakes the alarm thread, which confirms the new level after
+a short debounce and then, in this order: switches the LED and buzzer,
+commands the vent fully open at alarm priority with a hold, and asks for
+an immediate publish. Nothing on this path waits for the main loop, a
+DHT11 reading or the vent rate limit, so the edge-to-actuation latency
+is bounded by the debounce plus a few milliseconds of thread wake-ups.
+
+Gas is confirmed after `debounce` seconds of a stable level; the alarm
+clears only after `clear_time` seconds without gas, so a sensor hovering
+around its threshold does not make the vent flap. The pin is also polled
+every `poll_interval` seconds in case an edge is missed.
+'''
+
+import threading
+import time
+from collections import deque
+
+from servo import PRIORITY_ALARM
+
+
+class GasAlarm:
+    def __init__(self, gpio, pin, led_pin, buzzer_pin, servo=None, publish=None, on_change=None,
+                 active_low=True, debounce=0.02, clear_time=5.0, poll_interval=0.25, open_angle=180):
+        '''
+        :param gpio: Object with the RPi.GPIO interface
+        :param pin: MQ-2 digital output pin
+        :param led_pin: Alarm LED pin
+        :param buzzer_pin: Buzzer pin
+        :param servo: ServoActuator opened (and held open) during an alarm
+        :param publish: Callable(detected) that publishes the change without waiting for the next batch
+        :param on_change: Callable(detected, latency) run after the actuations, with the seconds since the edge
+        :param active_low: The sensor pulls the pin low when gas is detected
+        :param debounce: Seconds the gas level must be stable before the alarm starts
+        :param clear_time: Seconds without gas before the alarm ends
+        :param poll_interval: Seconds between pin reads when no edge arrives
+        :param open_angle: Vent angle during an alarm
+        '''
+        self.gpio = gpio
+        self.pin = pin
+        self.led_pin = led_pin
+        self.buzzer_pin = buzzer_pin
+        self.servo = servo
+        self.publish = publish
+        self.on_change = on_change
+        self.active_low = active_low
+        self.debounce = debounce
+        self.clear_time = clear_time
+        self.poll_interval = poll_interval
+        self.open_angle = open_angle
+
+        self.detected = False
+        self._candidate = None  # (level, time first seen) of an unconfirmed change
+        self._edge_time = None  # Time of the first edge not yet acted on
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+        # Statistics
+        self.edges = 0
+        self.alarms = 0
+        self.latencies = deque(maxlen=100)  # Edge to actuation of recent changes, in seconds
+        self.max_latency = 0.0
+
+    # ===== LIFECYCLE =====
+    def start(self):
+        '''Set up the pins and edge detection and start the alarm thread'''
+        self.gpio.setup(self.pin, self.gpio.IN)
+        self.gpio.setup(self.led_pin, self.gpio.OUT)
+        self.gpio.setup(self.buzzer_pin, self.gpio.OUT)
+        for edge, name in ((self.gpio.BOTH, "BOTH"), (self.gpio.RISING, "RISING"), (self.gpio.FALLING, "FALLING")):
+            try:
+                self.gpio.add_event_detect(self.pin, edge, callback=self._on_edge)
+                print(f"MQ2 gas detection event set up with {name} edge detection")
+                break
+            except RuntimeError as e:
+                print(f"Failed to set up MQ2 event detection with {name} edge: {e}")
+        else:
+            print(f"Will poll the gas sensor every {self.poll_interval}s instead")
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="gas-alarm", daemon=True)
+        self._thread.start()
+        self._wake.set()  # Act on the current level straight away
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        try:
+            self.gpio.remove_event_detect(self.pin)
+        except RuntimeError:
+            pass
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        return {
+            "detected": self.detected,
+            "edges": self.edges,
+            "alarms": self.alarms,
+            "last_latency": self.latencies[-1] if self.latencies else None,
+            "max_latency": self.max_latency,
+        }
+
+    # ===== ALARM THREAD =====
+    def _on_edge(self, channel):
+        '''GPIO callback: only wakes the alarm thread'''
+        self.edges += 1
+        if self._edge_time is None:
+            self._edge_time = time.monotonic()
+        self._wake.set()
+
+    def _read(self):
+        level = self.gpio.input(self.pin)
+        return not level if self.active_low else bool(level)
+
+    def _run(self):
+        while self._running:
+            timeout = self.poll_interval
+            if self._candidate is not None:
+                level, since = self._candidate
+                hold = self.debounce if level else self.clear_time
+                timeout = min(timeout, max(0.0, since + hold - time.monotonic()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._running:
+                self._check()
+
+    def _check(self):
+        now = time.monotonic()
+        level = self._read()
+        if level == self.detected:
+            # A glitch shorter than the debounce, or nothing new
+            self._candidate = None
+            self._edge_time = None
+            return
+        if self._candidate is None or self._candidate[0] != level:
+            self._candidate = (level, self._edge_time or now)
+        since = self._candidate[1]
+        if now - since < (self.debounce if level else self.clear_time):
+            return  # Confirmed (or dropped) on the next wake-up
+        self._candidate = None
+        self._edge_time = None
+        self._apply(level, since)
+
+    def _apply(self, detected, since):
+        self.detected = detected
+        out = self.gpio.HIGH if detected else self.gpio.LOW
+        self.gpio.output(self.led_pin, out)
+        self.gpio.output(self.buzzer_pin, out)
+        if self.servo is not None:
+            if detected:
+                self.servo.move(self.open_angle, PRIORITY_ALARM, source="gas", hold=True)
+            else:
+                self.servo.release(PRIORITY_ALARM)
+        if self.publish is not None:
+            self.publish(detected)
+
+        latency = time.monotonic() - since
+        if detected:
+            self.alarms += 1
+            self.latencies.append(latency)
+            self.max_latency = max(self.max_latency, latency)
+        print(f"[{time.strftime('%H:%M:%S')}] " + (f"Gas/Smoke detected! Vent opening ({latency * 1000:.1f} ms)"
+                                                     if detected else "No gas/smoke detected"))
+        if self.on_change is not None:
+            self.on_change(detected, latency)
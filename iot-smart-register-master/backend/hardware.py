@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Hardware layer of backend.py
+
+On the Raspberry Pi this exports RPi.GPIO, the DHT11 driver, the PubNub
+SDK and the credentials from config.py. With SMART_REGISTER_SIM=1 in the
+environment it exports the simulated versions from sim.py instead, so
+the whole backend runs (and can be benchmarked) on any machine:
+
+    SMART_REGISTER_SIM=1 python backend.py
+'''
+
+import os
+
+SIMULATED = os.environ.get("SMART_REGISTER_SIM") == "1"
+
+if SIMULATED:
+    from sim import GPIO, DHT11, PNConfiguration, PubNub, PubNubException
+    from sim import publish_key, subscribe_key, uuid, channel
+else:
+    import RPi.GPIO as GPIO
+    from dht11 import DHT11
+    from config import publish_key, subscribe_key, uuid, channel
+    from pubnub.pnconfiguration import PNConfiguration
+    from pubnub.pubnub import PubNub
+    from pubnub.exceptions import PubNubException
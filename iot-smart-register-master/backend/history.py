@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+On-device time-series history of the sensor readings
+
+record() only appends to an in-memory ring buffer. A flush thread writes
+the buffered samples to SQLite (WAL mode) in one transaction and, in the
+same transaction, folds them into per-minute and per-hour rollup rows
+with upserts, so the rollups are maintained incrementally and never
+recomputed from raw samples.
+
+query() picks the table that matches the requested resolution, so a
+week-long chart reads ~170 hourly rows instead of ~600k raw samples.
+Raw samples are kept for a week and minute rollups for 90 days; hourly
+rollups are kept forever.
+
+Temperature and humidity are NULL in samples taken without a fresh DHT11
+reading. The rollups leave those out of the sums, minimums and maximums
+and count the readings separately (temp_n, hum_n), so motion and gas keep
+being recorded while the DHT11 fails.
+'''
+
+import sqlite3
+import threading
+import time
+from collections import deque
+
+RESOLUTIONS = {"1m": 60, "1h": 3600}
+RETENTION = {"samples": 7 * 86400, "rollup_1m": 90 * 86400}
+MAX_POINTS = 2000  # "auto" picks the finest resolution that stays under this
+MAX_SPAN_POINTS = 20000  # Longest span an explicit resolution may cover, in points
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    temperature REAL,
+    humidity REAL,
+    motion INTEGER,
+    gas INTEGER,
+    angle REAL
+);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+'''
+
+ROLLUP_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket INTEGER PRIMARY KEY,
+    n INTEGER NOT NULL,
+    temp_sum REAL, temp_min REAL, temp_max REAL,
+    hum_sum REAL, hum_min REAL, hum_max REAL,
+    motion_sum INTEGER, gas_max INTEGER, angle_sum REAL,
+    temp_n INTEGER NOT NULL DEFAULT 0, hum_n INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+ROLLUP_COLUMNS = ("bucket, n, temp_sum, temp_min, temp_max, hum_sum, hum_min, hum_max, "
+                  "motion_sum, gas_max, angle_sum, temp_n, hum_n")
+
+# Sums, minimums and maximums of buckets without a reading are NULL
+ROLLUP_UPSERT = '''
+INSERT INTO {table} (%s) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(bucket) DO UPDATE SET
+    n = n + excluded.n,
+    temp_sum = coalesce(temp_sum + excluded.temp_sum, temp_sum, excluded.temp_sum),
+    temp_min = coalesce(min(temp_min, excluded.temp_min), temp_min, excluded.temp_min),
+    temp_max = coalesce(max(temp_max, excluded.temp_max), temp_max, excluded.temp_max),
+    hum_sum = coalesce(hum_sum + excluded.hum_sum, hum_sum, excluded.hum_sum),
+    hum_min = coalesce(min(hum_min, excluded.hum_min), hum_min, excluded.hum_min),
+    hum_max = coalesce(max(hum_max, excluded.hum_max), hum_max, excluded.hum_max),
+    motion_sum = motion_sum + excluded.motion_sum,
+    gas_max = max(gas_max, excluded.gas_max),
+    angle_sum = angle_sum + excluded.angle_sum,
+    temp_n = temp_n + excluded.temp_n,
+    hum_n = hum_n + excluded.hum_n
+''' % ROLLUP_COLUMNS
+
+
+def _fold(row, i, value):
+    '''Add value to the sum, min and max at row[i:i + 3] (None values are skipped)'''
+    if value is None:
+        return 0
+    if row[i] is None:
+        row[i:i + 3] = value, value, value
+    else:
+        row[i] += value
+        row[i + 1] = min(row[i + 1], value)
+        row[i + 2] = max(row[i + 2], value)
+    return 1
+
+
+def _rollup_rows(samples, width):
+    '''Aggregate samples into {bucket: row} for one resolution'''
+    rows = {}
+    for ts, temperature, humidity, motion, gas, angle in samples:
+        bucket = int(ts // width * width)
+        row = rows.get(bucket)
+        if row is None:
+            row = rows[bucket] = [bucket, 0, None, None, None, None, None, None, 0, gas, 0.0, 0, 0]
+        row[1] += 1
+        row[11] += _fold(row, 2, temperature)
+        row[12] += _fold(row, 5, humidity)
+        row[8] += motion
+        row[9] = max(row[9], gas)
+        row[10] += angle
+    return rows.values()
+
+
+class HistoryStore:
+    def __init__(self, db_path, flush_interval=10.0, ring_size=3600):
+        '''
+        :param db_path: SQLite database file
+        :param flush_interval: Seconds between writes to the database
+        :param ring_size: Samples held in memory; the oldest are dropped if flushing stalls
+        '''
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._ring = deque(maxlen=ring_size)
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_prune = 0.0
+        self.flushed = 0
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        for resolution in RESOLUTIONS:
+            table = f"rollup_{resolution}"
+            conn.executescript(ROLLUP_SCHEMA.format(table=table))
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if "temp_n" not in columns:
+                # Written before samples could lack a reading: every sample had one
+                with conn:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN temp_n INTEGER NOT NULL DEFAULT 0")
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN hum_n INTEGER NOT NULL DEFAULT 0")
+                    conn.execute(f"UPDATE {table} SET temp_n = n, hum_n = n")
+
+    def _connection(self):
+        '''One connection per thread; WAL lets readers run alongside the flush'''
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ===== WRITING =====
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def record(self, ts, temperature, humidity, motion, gas, angle):
+        '''Buffer one sample (never touches the database); temperature and humidity may be None'''
+        self._ring.append((ts, None if temperature is None else float(temperature),
+                           None if humidity is None else float(humidity), int(bool(motion)),
+                           int(bool(gas)), float(angle)))
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[History] Flush failed: {e}")
+
+    def flush(self):
+        '''Write buffered samples and update the rollups in one transaction'''
+        with self._flush_lock:
+            samples = []
+            while self._ring:
+                samples.append(self._ring.popleft())
+            if not samples:
+                return 0
+            conn = self._connection()
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)", samples)
+                    for resolution, width in RESOLUTIONS.items():
+                        table = f"rollup_{resolution}"
+                        conn.executemany(ROLLUP_UPSERT.format(table=table), _rollup_rows(samples, width))
+            except sqlite3.Error:
+                # Put the samples back (oldest first) for the next attempt
+                self._ring.extendleft(reversed(samples))
+                raise
+            self.flushed += len(samples)
+            if time.time() - self._last_prune > 3600:
+                self._prune(conn)
+            return len(samples)
+
+    def _prune(self, conn):
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM samples WHERE ts < ?", (now - RETENTION["samples"],))
+            conn.execute("DELETE FROM rollup_1m WHERE bucket < ?", (now - RETENTION["rollup_1m"],))
+        self._last_prune = now
+
+    # ===== QUERIES =====
+    def pick_resolution(self, start, end):
+        '''Finest resolution whose point count for the span stays under MAX_POINTS'''
+        for resolution, width in (("raw", 1), ("1m", 60), ("1h", 3600)):
+            if (end - start) / width <= MAX_POINTS:
+                return resolution
+        return "1h"
+
+    def query(self, start, end, resolution="auto"):
+        '''
+        Points between start and end (epoch seconds)
+
+        :param resolution: "raw", "1m", "1h" or "auto"
+        :return: (resolution used, list of point dicts)
+        '''
+        if resolution == "auto":
+            # Anything longer than the hourly limit is cut to its most recent part
+            start = max(start, end - MAX_SPAN_POINTS * RESOLUTIONS["1h"])
+            resolution = self.pick_resolution(start, end)
+        if resolution != "raw" and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        if (end - start) / RESOLUTIONS.get(resolution, 1) > MAX_SPAN_POINTS:
+            raise ValueError(f"Span too long for resolution {resolution}; use a coarser one")
+        conn = self._connection()
+        if resolution == "raw":
+            rows = conn.execute(
+                "SELECT ts, temperature, humidity, motion, gas, angle FROM samples "
+                "WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end)
+            ).fetchall()
+            points = [
+                {"ts": ts, "temperature": temperature, "humidity": humidity,
+                 "motion": motion, "gas": gas, "angle": angle}
+                for ts, temperature, humidity, motion, gas, angle in rows
+            ]
+            return resolution, points
+
+        width = RESOLUTIONS[resolution]
+        rows = conn.execute(
+            f"SELECT {ROLLUP_COLUMNS} FROM rollup_{resolution} WHERE bucket >= ? AND bucket < ? ORDER BY bucket",
+            (int(start // width * width), end)
+        ).fetchall()
+        points = [
+            {"ts": bucket, "samples": n,
+             "temperature": round(temp_sum / temp_n, 2) if temp_n else None,
+             "temperature_min": temp_min, "temperature_max": temp_max,
+             "humidity": round(hum_sum / hum_n, 2) if hum_n else None, "humidity_min": hum_min, "humidity_max": hum_max,
+             "motion": round(motion_sum / n, 3), "gas": gas_max, "angle": round(angle_sum / n, 1)}
+            for (bucket, n, temp_sum, temp_min, temp_max, hum_sum, hum_min, hum_max,
+                 motion_sum, gas_max, angle_sum, temp_n, hum_n) in rows
+        ]
+        return resolution, points
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Job records for asynchronous actuation requests
+
+The HTTP handler hands a request to a worker (the servo actuator), gets
+a job id back straight away and returns it to the client; the worker
+updates the record as the job runs. Finished jobs stay queryable until
+they are pushed out of the bounded history.
+
+States: queued -> running -> done | error, or queued/running ->
+superseded (replaced by a newer command) and overridden (rejected in
+favour of a higher priority command).
+'''
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+FINAL_STATES = ("done", "error", "superseded", "overridden")
+
+
+class JobRegistry:
+    def __init__(self, history=100):
+        '''
+        :param history: Number of jobs kept for status queries
+        '''
+        self.history = history
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, kind, **fields):
+        '''
+        Record a new queued job
+
+        :return: Copy of the new job record
+        '''
+        with self._lock:
+            job = {
+                "id": next(self._ids),
+                "kind": kind,
+                "state": "queued",
+                "submitted": time.time(),
+                "finished": None,
+                "result": None,
+            }
+            job.update(fields)
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+            return dict(job)
+
+    def update(self, job_id, state, result=None):
+        '''Move a job to a new state (unknown or expired ids are ignored)'''
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["state"] = state
+            if result is not None:
+                job["result"] = result
+            if state in FINAL_STATES:
+                job["finished"] = time.time()
+
+    def get(self, job_id):
+        '''Copy of a job record, or None if unknown'''
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
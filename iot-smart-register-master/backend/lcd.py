@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Framebuffer driver for the LCD 1602A (HD44780, 4-bit mode)
+
+Callers only write text into an in-memory framebuffer, which returns
+immediately. A refresh thread compares the framebuffer with what the
+display currently shows and sends only the cells that changed, moving
+the cursor with a DDRAM address command only where the changed cells are
+not contiguous. Data lines are only written when their level changes.
+
+Characters chr(0) to chr(7) in the text refer to the custom glyphs
+defined with create_char().
+'''
+
+import threading
+import time
+
+# ===== HD44780 CONSTANTS =====
+LCD_CHR = True    # Send data
+LCD_CMD = False   # Send command
+LINE_ADDRESSES = (0x00, 0x40, 0x14, 0x54)  # DDRAM address of each line
+SET_DDRAM = 0x80
+SET_CGRAM = 0x40
+E_PULSE = 0.0005  # E pulse width
+E_DELAY = 0.0005  # E delay
+
+
+class LCDDisplay:
+    def __init__(self, gpio, rs, e, data_pins, width=16, lines=2,
+                 e_pulse=E_PULSE, e_delay=E_DELAY, refresh_interval=0.05, on_refresh=None):
+        '''
+        :param gpio: Object with the RPi.GPIO interface
+        :param rs: Register select pin
+        :param e: Enable pin
+        :param data_pins: (D4, D5, D6, D7) pins
+        :param width: Characters per line
+        :param lines: Number of lines
+        :param e_pulse: Enable pulse width in seconds
+        :param e_delay: Settle time around each enable pulse in seconds
+        :param refresh_interval: Shortest time between two refreshes
+        :param on_refresh: Callable(seconds) run after each refresh with the time it took
+        '''
+        self.gpio = gpio
+        self.rs = rs
+        self.e = e
+        self.data_pins = tuple(data_pins)
+        self.width = width
+        self.lines = lines
+        self.e_pulse = e_pulse
+        self.e_delay = e_delay
+        self.refresh_interval = refresh_interval
+        self.on_refresh = on_refresh
+
+        self._frame = [[' '] * width for _ in range(lines)]
+        self._shown = [[None] * width for _ in range(lines)]  # None: unknown
+        self._glyphs = {}           # slot -> pending 8-row pattern
+        self._cursor = None         # DDRAM address the next data byte goes to
+        self._pin_levels = {}       # last level written to each pin
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._running = False
+        self._thread = None
+
+        # Statistics
+        self.bytes_sent = 0
+        self.refreshes = 0
+
+    # ===== PUBLIC API =====
+    def start(self):
+        '''Set up the pins, initialize the controller and start the refresh thread'''
+        for pin in (self.rs, self.e) + self.data_pins:
+            self.gpio.setup(pin, self.gpio.OUT)
+        self._send(0x33, LCD_CMD)  # 110011 Initialize
+        self._send(0x32, LCD_CMD)  # 110010 Initialize
+        self._send(0x06, LCD_CMD)  # 000110 Cursor move direction
+        self._send(0x0C, LCD_CMD)  # 001100 Display On, Cursor Off
+        self._send(0x28, LCD_CMD)  # 101000 Data length, number of lines, font size
+        self._send(0x01, LCD_CMD)  # 000001 Clear display
+        time.sleep(self.e_delay)
+        with self._lock:
+            self._shown = [[' '] * self.width for _ in range(self.lines)]
+            self._cursor = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._thread.start()
+        self._dirty.set()
+
+    def stop(self, timeout=1.0):
+        '''Show the pending framebuffer, then stop the refresh thread'''
+        self.flush(timeout)
+        self._running = False
+        self._dirty.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def write(self, text, line):
+        '''Replace one line of the framebuffer (padded or cut to the display width)'''
+        text = text[:self.width].ljust(self.width, ' ')
+        with self._lock:
+            row = self._frame[line]
+            if row == list(text):
+                return
+            row[:] = text
+            self._idle.clear()
+        self._dirty.set()
+
+    def clear(self):
+        '''Blank the framebuffer'''
+        for line in range(self.lines):
+            self.write('', line)
+
+    def create_char(self, slot, pattern):
+        '''
+        Define a custom glyph, shown wherever chr(slot) appears in the text
+
+        :param slot: CGRAM slot 0-7
+        :param pattern: Eight row bitmaps, five bits each
+        '''
+        if not 0 <= slot < 8 or len(pattern) != 8:
+            raise ValueError("Custom characters need a slot 0-7 and 8 rows")
+        with self._lock:
+            self._glyphs[slot] = [row & 0x1F for row in pattern]
+            self._idle.clear()
+        self._dirty.set()
+
+    def flush(self, timeout=1.0):
+        '''Wait until the display shows the current framebuffer'''
+        if not self.is_alive():
+            return self._idle.is_set()
+        return self._idle.wait(timeout)
+
+    def text(self, line):
+        '''Current framebuffer contents of one line'''
+        with self._lock:
+            return ''.join(self._frame[line])
+
+    # ===== REFRESH THREAD =====
+    def _refresh_loop(self):
+        while self._running:
+            self._dirty.wait()
+            self._dirty.clear()
+            self._refresh()
+            # Updates arriving during the interval are merged into one refresh
+            time.sleep(self.refresh_interval)
+
+    def _refresh(self):
+        started = time.perf_counter()
+        with self._lock:
+            glyphs, self._glyphs = self._glyphs, {}
+            frame = [row[:] for row in self._frame]
+
+        for slot, pattern in sorted(glyphs.items()):
+            self._send(SET_CGRAM | (slot << 3), LCD_CMD)
+            for row in pattern:
+                self._send(row, LCD_CHR)
+            self._cursor = None  # The address counter now points into CGRAM
+
+        for line, row in enumerate(frame):
+            base = LINE_ADDRESSES[line]
+            shown = self._shown[line]
+            for column, char in enumerate(row):
+                if shown[column] == char:
+                    continue
+                address = base + column
+                if self._cursor != address:
+                    self._send(SET_DDRAM | address, LCD_CMD)
+                self._send(ord(char) & 0xFF, LCD_CHR)
+                self._cursor = address + 1
+                shown[column] = char
+
+        self.refreshes += 1
+        if self.on_refresh is not None:
+            self.on_refresh(time.perf_counter() - started)
+        with self._lock:
+            if not self._glyphs and self._frame == self._shown:
+                self._idle.set()
+            else:
+                self._dirty.set()
+
+    # ===== BUS =====
+    def _output(self, pin, level):
+        if self._pin_levels.get(pin) != level:
+            self.gpio.output(pin, level)
+            self._pin_levels[pin] = level
+
+    def _send(self, bits, mode):
+        '''Send one byte as two nibbles'''
+        self._output(self.rs, mode)
+        for nibble in (bits >> 4, bits):
+            for i, pin in enumerate(self.data_pins):
+                self._output(pin, bool(nibble & (1 << i)))
+            self._toggle_enable()
+        self.bytes_sent += 1
+
+    def _toggle_enable(self):
+        time.sleep(self.e_delay)
+        self.gpio.output(self.e, True)
+        time.sleep(self.e_pulse)
+        self.gpio.output(self.e, False)
+        time.sleep(self.e_delay)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Minimal metrics registry served in the Prometheus text format
+
+Counters and histograms are updated in place on the hot paths: an
+observation is one bisect over the bucket bounds and three additions
+under a lock, and a timer is two perf_counter() calls. Values that
+other objects already count (sampler reads, publisher failures, ...)
+are registered as callbacks instead and only read when /metrics is
+scraped, so they cost nothing in between.
+
+    LOOP_CYCLE = metrics.histogram("loop_cycle_seconds", "Main loop work per cycle")
+    with LOOP_CYCLE.time():
+        ...
+    metrics.counter("sensor_reads_total", "Sensor reads", sensor="dht", fn=lambda: sampler.reads)
+'''
+
+import bisect
+import threading
+import time
+
+# Bucket upper bounds in seconds, from a fast GPIO call to a missed 1 s deadline
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Callback:
+    '''A counter or gauge read from fn() at scrape time; None means no sample'''
+    def __init__(self, fn):
+        self.fn = fn
+
+    def samples(self, name, labels):
+        value = self.fn()
+        if value is not None:
+            yield name, labels, value
+
+
+class Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot: above every bound
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self):
+        '''Context manager that observes the seconds spent in its block'''
+        return Timer(self)
+
+    def timed(self, fn):
+        '''Wrap fn so that every call is observed, including calls that raise'''
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - started)
+        return wrapper
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            yield name + "_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+        yield name + "_sum", labels, total
+        yield name + "_count", labels, count
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=""):
+        '''
+        :param prefix: Prepended to every metric name
+        '''
+        self.prefix = prefix
+        self._families = {}  # name -> (type, help, {labels: metric})
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        name = self.prefix + name
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = (kind, help_text, {})
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def counter(self, name, help_text, fn=None, **labels):
+        '''Counter with these labels (the same object on every call); fn makes it a callback'''
+        return self._get("counter", name, help_text, labels,
+                         Counter if fn is None else lambda: Callback(fn))
+
+    def gauge(self, name, help_text, fn=None, **labels):
+        return self._get("gauge", name, help_text, labels,
+                         Gauge if fn is None else lambda: Callback(fn))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def render(self):
+        '''All metrics in the Prometheus text exposition format (version 0.0.4)'''
+        with self._lock:
+            families = [(name, kind, help_text, list(metrics.items()))
+                        for name, (kind, help_text, metrics) in sorted(self._families.items())]
+        lines = []
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                for sample_name, sample_labels, value in metric.samples(name, labels):
+                    lines.append(f"{sample_name}{_format_labels(sample_labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
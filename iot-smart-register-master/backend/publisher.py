@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Background publisher for sensor data
+
+submit() is called from the control loop with the full current state and
+never touches the network. Only the fields that changed since the last
+submit are queued, as a delta message; a full-state heartbeat goes out
+periodically so a dashboard that joins late (or missed a delta) catches
+up. A worker thread sends the queued messages in batches:
+
+    {"batch": [{"seq": 12, "ts": 1712650000.1, "temperature": 24}, ...]}
+
+Each message keeps the flat field layout of the original PubNub
+messages, plus "seq", "ts" (epoch seconds) and "full" on heartbeats.
+
+If sending fails, batches are appended to a JSON-lines file on disk and
+retried with backoff; once the cloud is reachable again the file is
+replayed in order before anything newer is sent.
+
+submit(..., urgent=True) (the gas alarm) wakes the worker at once
+instead of waiting for the next batch, and skips any retry backoff. An
+urgent cycle sends the new messages before replaying the disk buffer, so
+the alarm never waits behind a backlog. The replayed messages then arrive
+after newer ones: consumers must not let a message overwrite a field set
+by one with a higher "seq" (web1.js keeps the newest seq per field).
+'''
+
+import json
+import os
+import queue
+import threading
+import time
+
+
+class CloudPublisher:
+    def __init__(self, send, buffer_path, batch_interval=5.0, heartbeat_interval=60.0,
+                 max_queue=1000, max_batch=50, max_buffered=10000, max_backoff=300.0):
+        '''
+        :param send: Callable(message) that publishes one message; raises on failure
+        :param buffer_path: JSON-lines file for messages that could not be sent
+        :param batch_interval: Seconds between sends
+        :param heartbeat_interval: Seconds between full-state messages
+        :param max_queue: Messages held in memory before new deltas are dropped
+        :param max_batch: Messages per published batch
+        :param max_buffered: Messages kept on disk during an outage (oldest dropped first)
+        :param max_backoff: Longest wait between retries while the cloud is unreachable
+        '''
+        self.send = send
+        self.buffer_path = buffer_path
+        self.batch_interval = batch_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_batch = max_batch
+        self.max_buffered = max_buffered
+        self.max_backoff = max_backoff
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._state = {}          # Latest full state submitted
+        self._state_lock = threading.Lock()
+        self._seq = 0
+        self._last_heartbeat = 0.0
+        self._backoff = batch_interval
+        self._next_attempt = 0.0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._urgent = False
+        self._thread = None
+
+        # Statistics
+        self.submitted = 0
+        self.deltas = 0
+        self.dropped = 0
+        self.sent_batches = 0
+        self.sent_messages = 0
+        self.failures = 0
+        self.buffered = self._count_buffered()
+        self.last_send_latency = None
+
+    # ===== PUBLIC API =====
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        '''Stop the worker after one last attempt to send (or buffer) what is queued'''
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, state, urgent=False):
+        '''
+        Queue the fields of state that changed since the last call; never blocks
+
+        :param urgent: Send now rather than with the next batch
+        '''
+        self.submitted += 1
+        with self._state_lock:
+            changes = {key: value for key, value in state.items() if self._state.get(key, object()) != value}
+            if not changes:
+                return False
+            self._state.update(changes)
+            message = self._message(changes)
+        try:
+            self._queue.put_nowait(message)
+            self.deltas += 1
+        except queue.Full:
+            # The next heartbeat carries the full state again
+            self.dropped += 1
+        if urgent:
+            self._urgent = True
+            self._wake.set()
+        return True
+
+    def status(self):
+        return {
+            "submitted": self.submitted,
+            "deltas": self.deltas,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "buffered": self.buffered,
+            "sent_batches": self.sent_batches,
+            "sent_messages": self.sent_messages,
+            "failures": self.failures,
+            "last_send_latency": self.last_send_latency,
+        }
+
+    # ===== WORKER =====
+    def _message(self, fields, full=False):
+        self._seq += 1
+        message = {"seq": self._seq, "ts": round(time.time(), 3)}
+        if full:
+            message["full"] = True
+        message.update(fields)
+        return message
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.batch_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            urgent, self._urgent = self._urgent, False
+            self._cycle(urgent=urgent)
+        self._cycle(final=True)
+
+    def _cycle(self, final=False, urgent=False):
+        now = time.time()
+        if now - self._last_heartbeat >= self.heartbeat_interval:
+            with self._state_lock:
+                if self._state:
+                    self._queue_heartbeat(self._message(dict(self._state), full=True))
+            self._last_heartbeat = now
+
+        messages = self._drain()
+        if time.monotonic() < self._next_attempt and not (final or urgent):
+            # Still backing off: keep memory bounded by moving new messages to disk
+            self._append_buffer(messages)
+            return
+        if self.buffered and not urgent and not self._replay():
+            self._append_buffer(messages)
+            return
+        for start in range(0, len(messages), self.max_batch):
+            batch = messages[start:start + self.max_batch]
+            if not self._send_batch(batch):
+                self._append_buffer(messages[start:])
+                return
+        if self.buffered and urgent:
+            # The alarm is out; now catch up on the backlog
+            self._replay()
+
+    def _queue_heartbeat(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def _send_batch(self, batch):
+        if not batch:
+            return True
+        started = time.monotonic()
+        try:
+            self.send({"batch": batch})
+        except Exception as e:
+            self.failures += 1
+            self._next_attempt = time.monotonic() + self._backoff
+            print(f"[PubNub] Publish failed ({e}), retrying in {self._backoff:.1f}s")
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+            return False
+        self.last_send_latency = time.monotonic() - started
+        self.sent_batches += 1
+        self.sent_messages += len(batch)
+        self._backoff = self.batch_interval
+        return True
+
+    # ===== DISK BUFFER =====
+    def _count_buffered(self):
+        try:
+            with open(self.buffer_path, "r") as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def _append_buffer(self, messages):
+        if not messages:
+            return
+        with open(self.buffer_path, "a") as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.buffered += len(messages)
+        if self.buffered > self.max_buffered:
+            self._rewrite_buffer(self._read_buffer()[-self.max_buffered:])
+
+    def _read_buffer(self):
+        messages = []
+        try:
+            with open(self.buffer_path, "r") as f:
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass  # Torn last line from a power cut
+        except FileNotFoundError:
+            pass
+        return messages
+
+    def _rewrite_buffer(self, messages):
+        tmp_path = self.buffer_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+        os.replace(tmp_path, self.buffer_path)
+        self.buffered = len(messages)
+
+    def _replay(self):
+        '''Send the disk buffer in order; True once it is empty'''
+        messages = self._read_buffer()
+        sent = 0
+        for start in range(0, len(messages), self.max_batch):
+            if not self._send_batch(messages[start:start + self.max_batch]):
+                break
+            sent = start + self.max_batch
+        remaining = messages[sent:]
+        self._rewrite_buffer(remaining)
+        if not remaining:
+            print(f"[PubNub] Replayed {len(messages)} buffered messages")
+        return not remaining
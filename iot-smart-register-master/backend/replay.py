@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Replay recorded sensor history through the vent logic to tune its thresholds
+
+decide_positions() is a NumPy version of vent_control.decide_vent_position()
+that decides every row of a history at once, and simulate() applies the
+main loop's rate limit (at most one vent change per VENT_CHANGE_INTERVAL)
+to the decisions. Both are checked against the scalar function before
+anything is reported: decisions on random rows for every threshold
+setting, and the whole replay on a prefix of the history.
+
+For every combination of the threshold grids it reports:
+
+  changes     servo actuations (vent position changes)
+  open        share of the time the vent is fully open
+  opening     average opening (0 = closed, 1 = fully open)
+  comfort     share of occupied time without a comfort violation: warmer
+              or more humid than the comfort band while the vent is not
+              fully open, or colder than it while the vent is not closed
+  gas_wait    seconds with gas detected but the vent not yet fully open
+
+The replay is open loop: the recorded temperatures do not react to the
+simulated vent. Rows are the history samples the main loop records once
+per cycle (history.db), a CSV file with ts,temperature,humidity,motion,gas
+columns, or synthetic data.
+
+Usage:
+    python replay.py --db history.db --temp-high 24:28:1 --temp-low 16:20:1
+    python replay.py --synthetic 2000000 --humidity-high 60,70,80 --no-motion 300:1200:300
+'''
+
+import argparse
+import csv
+import itertools
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from vent_control import (decide_vent_position, TEMP_HIGH, TEMP_LOW, HUMIDITY_HIGH,
+                          NO_MOTION_TIME, VENT_CHANGE_INTERVAL)
+
+Thresholds = namedtuple('Thresholds', ['temp_high', 'temp_low', 'humidity_high', 'no_motion_time'])
+DEFAULT_THRESHOLDS = Thresholds(TEMP_HIGH, TEMP_LOW, HUMIDITY_HIGH, NO_MOTION_TIME)
+
+INITIAL_POSITION = 90
+NO_DECISION = -1   # No valid DHT11 reading and no gas: the loop leaves the vent alone
+MAX_GAP = 5.0      # Longest time one row counts for; longer gaps are missing data
+
+
+class History:
+    def __init__(self, ts, temperature, humidity, motion, gas):
+        '''
+        Sensor rows sorted by time; temperature and humidity are NaN where
+        there was no valid DHT11 reading
+        '''
+        order = np.argsort(ts, kind="stable")
+        self.ts = np.asarray(ts, dtype=np.float64)[order]
+        self.temperature = np.asarray(temperature, dtype=np.float64)[order]
+        self.humidity = np.asarray(humidity, dtype=np.float64)[order]
+        self.motion = np.asarray(motion, dtype=bool)[order]
+        self.gas = np.asarray(gas, dtype=bool)[order]
+
+        # last_motion_time as the loop sees it: the latest start of a motion
+        # period, or the start of the recording
+        rising = self.motion & ~np.concatenate(([False], self.motion[:-1]))
+        self.last_motion = np.maximum.accumulate(np.where(rising, self.ts, self.ts[0])) if len(self) else self.ts
+        self.since_motion = self.ts - self.last_motion
+        self.dt = np.minimum(np.diff(self.ts, append=self.ts[-1:]), MAX_GAP)
+        self.valid = ~np.isnan(self.temperature)
+        self._next_allowed = {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def next_allowed(self, interval):
+        '''
+        For every row, the first row more than interval seconds later (the
+        next time the loop may change the vent after changing it at that row)
+        '''
+        allowed = self._next_allowed.get(interval)
+        if allowed is None:
+            ts, n = self.ts, len(self.ts)
+            rows = np.arange(n)
+            allowed = np.searchsorted(ts, ts + interval, side="right")
+            # Use the loop's own test, ts[row] - last_change > interval, at the boundary
+            early = (allowed < n) & (ts[np.minimum(allowed, n - 1)] - ts <= interval)
+            allowed[early] += 1
+            late = (allowed - 1 > rows) & (ts[np.maximum(allowed - 1, 0)] - ts > interval)
+            allowed[late] -= 1
+            allowed = np.append(allowed, n)
+            self._next_allowed[interval] = allowed
+        return allowed
+
+    def head(self, rows):
+        return History(self.ts[:rows], self.temperature[:rows], self.humidity[:rows],
+                       self.motion[:rows], self.gas[:rows])
+
+
+# ===== LOADING =====
+def load_db(path, start=None, end=None):
+    '''Raw samples from a history.db written by history.HistoryStore'''
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT ts, temperature, humidity, motion, gas FROM samples WHERE ts >= ? AND ts < ? ORDER BY ts",
+        (start if start is not None else float('-inf'), end if end is not None else float('inf'))
+    ).fetchall()
+    conn.close()
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 5).T
+    return History(*columns)
+
+
+def load_csv(path):
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        rows = [(row['ts'], row['temperature'] or 'nan', row['humidity'] or 'nan', row['motion'], row['gas'])
+                for row in reader]
+    columns = np.array(rows, dtype=np.float64).reshape(-1, 5).T
+    return History(*columns)
+
+
+def synthetic(rows, seed=0):
+    '''One sample per second of a plausible room: daily temperature cycle, office hours, rare gas'''
+    rng = np.random.default_rng(seed)
+    ts = 1744156800.0 + np.arange(rows, dtype=np.float64)
+    day = (ts % 86400) / 86400
+    drift = np.repeat(rng.normal(0, 0.7, rows // 60 + 1), 60)[:rows]  # Changes about once a minute
+    temperature = np.round(22 + 5 * np.sin(2 * np.pi * (day - 0.35)) + drift)
+    humidity = np.round(np.clip(60 + 12 * np.sin(2 * np.pi * day) + rng.normal(0, 3, rows), 20, 95))
+    temperature[rng.random(rows) < 0.02] = np.nan  # Failed DHT11 reads
+    humidity[np.isnan(temperature)] = np.nan
+    office = (day > 0.35) & (day < 0.75)
+    motion = rng.random(rows) < np.where(office, 0.3, 0.002)
+    gas = np.zeros(rows, dtype=bool)
+    for start in rng.integers(0, rows, max(1, rows // 500000)):
+        gas[start:start + 120] = True
+    return History(ts, temperature, humidity, motion, gas)
+
+
+# ===== REPLAY =====
+def decide_positions(history, thresholds):
+    '''decide_vent_position() for every row at once; NO_DECISION where the loop would not decide'''
+    temp_high, temp_low, humidity_high, no_motion_time = thresholds
+    temp = history.temperature
+    with np.errstate(invalid="ignore"):
+        normal = (temp >= temp_low) & (temp <= temp_high)
+        position = np.where(temp > temp_high, 180, np.where(temp < temp_low, 0, 90)).astype(np.int16)
+        position[normal & (history.humidity > humidity_high)] = 180
+    position[~history.motion & (history.since_motion > no_motion_time)] = 180
+    position[~history.valid] = NO_DECISION
+    position[history.gas] = 180
+    return position
+
+
+def _next_change(desired, position):
+    '''For every row, the first row at or after it that would move a vent standing at position'''
+    n = len(desired)
+    rows = np.where((desired != position) & (desired != NO_DECISION), np.arange(n, dtype=np.int32), n)
+    return np.append(np.minimum.accumulate(rows[::-1])[::-1], n)
+
+
+def simulate(history, desired, interval=VENT_CHANGE_INTERVAL, initial=INITIAL_POSITION):
+    '''
+    Apply the loop's rate limit to per-row decisions
+
+    Python only steps from one vent change to the next, so the cost is
+    one NumPy pass per vent position reached plus one iteration per
+    actuation.
+
+    :return: (rows where the vent changed, position it changed to)
+    '''
+    n = len(desired)
+    next_allowed = history.next_allowed(interval)
+    next_change = {}
+    rows, positions = [], []
+    position = initial
+    # The loop starts with last_vent_change_time = 0
+    row = int(np.searchsorted(history.ts, interval, side="right"))
+    while True:
+        if position not in next_change:
+            next_change[position] = _next_change(desired, position)
+        row = next_change[position].item(row)
+        if row >= n:
+            break
+        position = desired.item(row)
+        rows.append(row)
+        positions.append(position)
+        row = next_allowed.item(row)
+    return np.array(rows, dtype=np.int64), np.array(positions, dtype=np.int16)
+
+
+def trace(n, rows, positions, initial=INITIAL_POSITION):
+    '''Vent position at every row from the changes returned by simulate()'''
+    segment = np.searchsorted(rows, np.arange(n), side="right")
+    return np.concatenate(([initial], positions)).astype(np.int16)[segment]
+
+
+def replay_scalar(history, thresholds, interval=VENT_CHANGE_INTERVAL, initial=INITIAL_POSITION):
+    '''The same replay one row at a time through decide_vent_position(), as the loop runs it'''
+    position, last_change = initial, 0.0
+    positions = np.empty(len(history), dtype=np.int16)
+    for row in range(len(history)):
+        current_time = float(history.ts[row])
+        temp = None if not history.valid[row] else float(history.temperature[row])
+        gas = bool(history.gas[row])
+        if (temp is not None or gas) and current_time - last_change > interval:
+            new_position, reason = decide_vent_position(
+                temp, float(history.humidity[row]), bool(history.motion[row]),
+                float(history.last_motion[row]), current_time, gas, *thresholds
+            )
+            if new_position != position:
+                position, last_change = new_position, current_time
+        positions[row] = position
+    return positions
+
+
+class Scorer:
+    def __init__(self, history, comfort_low, comfort_high, comfort_humidity, occupied_time):
+        '''
+        Precompute running totals of the time-weighted conditions, so a
+        replay is scored from its vent changes alone
+
+        :param comfort_low: Colder than this (Celsius) needs the vent closed
+        :param comfort_high: Warmer than this (Celsius) needs the vent fully open
+        :param comfort_humidity: More humid than this (percent) needs the vent fully open
+        :param occupied_time: Seconds after motion the room counts as occupied
+        '''
+        dt = history.dt
+        occupied = history.motion | (history.since_motion <= occupied_time)
+        with np.errstate(invalid="ignore"):
+            too_warm = (history.temperature > comfort_high) | (history.humidity > comfort_humidity)
+            too_cold = history.temperature < comfort_low
+
+        def running(weights):
+            return np.concatenate(([0.0], np.cumsum(weights)))
+
+        self.n = len(history)
+        self.time = running(dt)
+        self.warm = running(dt * (occupied & too_warm))
+        self.cold = running(dt * (occupied & too_cold))
+        self.either = running(dt * (occupied & (too_warm | too_cold)))  # Humid and cold at once
+        self.gas = running(dt * history.gas)
+        self.occupied = float(dt[occupied].sum())
+
+    def score(self, rows, positions, initial=INITIAL_POSITION):
+        starts = np.concatenate(([0], rows))
+        ends = np.concatenate((rows, [self.n]))
+        position = np.concatenate(([initial], positions))
+        time_in = self.time[ends] - self.time[starts]
+        total = self.time[-1] or 1.0
+        between = (position > 0) & (position < 180)
+        violation = ((self.warm[ends] - self.warm[starts])[position == 0].sum()
+                     + (self.either[ends] - self.either[starts])[between].sum()
+                     + (self.cold[ends] - self.cold[starts])[position == 180].sum())
+        return {
+            "changes": len(rows),
+            "changes_per_day": len(rows) / total * 86400,
+            "open": time_in[position == 180].sum() / total,
+            "opening": float((time_in * position).sum() / total / 180),
+            "comfort": 1 - violation / self.occupied if self.occupied else 1.0,
+            "gas_wait": float((self.gas[ends] - self.gas[starts])[position != 180].sum()),
+        }
+
+
+# ===== EQUIVALENCE CHECK =====
+def verify(history, settings, rows=2000, replay_rows=20000, seed=0):
+    '''Compare the NumPy replay with the scalar function; returns a list of mismatch descriptions'''
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(history), min(rows, len(history)), replace=False)
+    mismatches = []
+    for thresholds in settings:
+        desired = decide_positions(history, thresholds)
+        for row in sample:
+            if not history.valid[row] and not history.gas[row]:
+                if desired[row] != NO_DECISION:
+                    mismatches.append(f"{thresholds} row {row}: decided without a reading")
+                continue
+            temp = float(history.temperature[row]) if history.valid[row] else None
+            expected, reason = decide_vent_position(
+                temp, float(history.humidity[row]), bool(history.motion[row]),
+                float(history.last_motion[row]), float(history.ts[row]), bool(history.gas[row]), *thresholds
+            )
+            if desired[row] != expected:
+                mismatches.append(f"{thresholds} row {row}: {desired[row]} != {expected} ({reason})")
+
+    head = history.head(replay_rows)
+    for thresholds in settings[:3]:
+        rows, positions = simulate(head, decide_positions(head, thresholds))
+        replayed = trace(len(head), rows, positions)
+        expected = replay_scalar(head, thresholds)
+        if not np.array_equal(replayed, expected):
+            row = int(np.flatnonzero(replayed != expected)[0])
+            mismatches.append(f"{thresholds} replay row {row}: {replayed[row]} != {expected[row]}")
+    return mismatches
+
+
+# ===== COMMAND LINE =====
+def parse_grid(text):
+    '''"24:28:1" (inclusive range) or "24,26,28"'''
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        return [round(value, 6) for value in np.arange(start, stop + step / 2, step)]
+    return [float(part) for part in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay sensor history through the vent logic over threshold grids")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--db', help="history.db written by the backend")
+    source.add_argument('--csv', help="CSV with ts,temperature,humidity,motion,gas columns")
+    source.add_argument('--synthetic', type=int, metavar='ROWS', help="Generate this many rows (1 per second)")
+    parser.add_argument('--from', dest='start', type=float, help="Epoch seconds (--db only)")
+    parser.add_argument('--to', dest='end', type=float, help="Epoch seconds (--db only)")
+    parser.add_argument('--temp-high', type=parse_grid, default=[TEMP_HIGH])
+    parser.add_argument('--temp-low', type=parse_grid, default=[TEMP_LOW])
+    parser.add_argument('--humidity-high', type=parse_grid, default=[HUMIDITY_HIGH])
+    parser.add_argument('--no-motion', type=parse_grid, default=[NO_MOTION_TIME], help="Seconds")
+    parser.add_argument('--comfort-low', type=float, default=20, help="Comfort band lower temperature")
+    parser.add_argument('--comfort-high', type=float, default=25, help="Comfort band upper temperature")
+    parser.add_argument('--comfort-humidity', type=float, default=65, help="Comfort band upper humidity")
+    parser.add_argument('--occupied-time', type=float, default=NO_MOTION_TIME,
+                        help="Seconds after motion the room counts as occupied for comfort")
+    parser.add_argument('--verify-rows', type=int, default=2000, help="Random rows checked per setting")
+    parser.add_argument('--top', type=int, default=10, help="Settings printed")
+    parser.add_argument('--out', help="Write every setting's results to this CSV file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.db:
+        history = load_db(args.db, args.start, args.end)
+    elif args.csv:
+        history = load_csv(args.csv)
+    else:
+        history = synthetic(args.synthetic)
+    if not len(history):
+        sys.exit("No rows to replay")
+    print(f"Loaded {len(history)} rows ({(history.ts[-1] - history.ts[0]) / 86400:.1f} days) "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    settings = [Thresholds(*values) for values in itertools.product(
+        args.temp_high, args.temp_low, args.humidity_high, args.no_motion)]
+    started = time.perf_counter()
+    mismatches = verify(history, settings, rows=args.verify_rows)
+    if mismatches:
+        print("NumPy replay does not match decide_vent_position():")
+        for mismatch in mismatches[:20]:
+            print("  " + mismatch)
+        sys.exit(1)
+    print(f"Equivalence check passed for {len(settings)} settings in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    scorer = Scorer(history, args.comfort_low, args.comfort_high, args.comfort_humidity, args.occupied_time)
+    results = []
+    for thresholds in settings:
+        rows, positions = simulate(history, decide_positions(history, thresholds))
+        results.append((thresholds, scorer.score(rows, positions)))
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {len(settings)} settings in {elapsed:.2f}s "
+          f"({len(settings) * len(history) / elapsed / 1e6:.1f}M rows/s)")
+
+    results.sort(key=lambda item: (-item[1]["comfort"], item[1]["changes"]))
+    print(f"{'high':>5} {'low':>5} {'hum':>5} {'empty':>6} | {'changes':>8} {'/day':>7} "
+          f"{'open':>6} {'opening':>7} {'comfort':>7} {'gas_wait':>8}")
+    for thresholds, result in results[:args.top]:
+        marker = " *" if thresholds == DEFAULT_THRESHOLDS else ""
+        print(f"{thresholds.temp_high:>5g} {thresholds.temp_low:>5g} {thresholds.humidity_high:>5g} "
+              f"{thresholds.no_motion_time:>6g} | {result['changes']:>8} {result['changes_per_day']:>7.1f} "
+              f"{result['open']:>6.1%} {result['opening']:>7.2f} {result['comfort']:>7.1%} "
+              f"{result['gas_wait']:>8.0f}{marker}")
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(Thresholds._fields) + list(results[0][1]))
+            for thresholds, result in results:
+                writer.writerow(list(thresholds) + list(result.values()))
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
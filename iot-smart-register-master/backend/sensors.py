@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Per-sensor sampling threads and the shared sensor snapshot
+
+Each sensor is read by its own Sampler thread at its own rate, so a slow
+or failing DHT11 read no longer delays the PIR and MQ-2. Failed reads
+are retried with exponential backoff. Results go into SensorState,
+which swaps in a new snapshot dict on every update: readers (the control
+loop, the LCD, the web API, the publisher) take state.snapshot and get a
+consistent view without locking.
+'''
+
+import threading
+import time
+from collections import namedtuple
+
+# value: last good value (None until the first good read)
+# timestamp: time.time() of that read
+# errors: failed reads since then
+Reading = namedtuple('Reading', ['value', 'timestamp', 'errors'])
+
+
+class SensorReadError(Exception):
+    '''Raised by a read function when the sensor returned no valid data'''
+
+
+class SensorState:
+    def __init__(self):
+        self.snapshot = {}  # sensor name -> Reading; replaced, never modified
+        self._lock = threading.Lock()  # Serializes writers only
+
+    def record(self, name, value=None, ok=True):
+        '''Store a good value, or count a failed read; returns the new Reading'''
+        with self._lock:
+            previous = self.snapshot.get(name, Reading(None, None, 0))
+            if ok:
+                reading = Reading(value, time.time(), 0)
+            else:
+                reading = previous._replace(errors=previous.errors + 1)
+            snapshot = dict(self.snapshot)
+            snapshot[name] = reading
+            self.snapshot = snapshot
+        return reading
+
+    def get(self, name):
+        return self.snapshot.get(name, Reading(None, None, 0))
+
+    def value(self, name, max_age=None):
+        '''Last good value, or None if there is none (or it is older than max_age seconds)'''
+        reading = self.get(name)
+        if reading.timestamp is None:
+            return None
+        if max_age is not None and time.time() - reading.timestamp > max_age:
+            return None
+        return reading.value
+
+
+class Sampler:
+    def __init__(self, name, read, interval, state, retry_interval=None, max_backoff=30.0,
+                 on_change=None):
+        '''
+        :param name: Key of this sensor in the snapshot
+        :param read: Callable returning a value; raises on a failed read
+        :param interval: Seconds between good reads
+        :param state: SensorState to write to
+        :param retry_interval: Delay after the first failed read (default: interval),
+                               doubled for each further failure
+        :param max_backoff: Longest delay between retries
+        :param on_change: Callable(name, reading) run when the value changes
+        '''
+        self.name = name
+        self.read = read
+        self.interval = interval
+        self.state = state
+        self.retry_interval = retry_interval if retry_interval is not None else interval
+        self.max_backoff = max_backoff
+        self.on_change = on_change
+        self.reads = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"sampler-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def sample(self):
+        '''Read once and record the result; returns the seconds to wait before the next read'''
+        self.reads += 1
+        previous = self.state.get(self.name)
+        try:
+            value = self.read()
+        except Exception as e:
+            self.failures += 1
+            reading = self.state.record(self.name, ok=False)
+            print(f"[{self.name}] Sensor read failed ({e}), attempt: {reading.errors}")
+            return min(self.retry_interval * 2 ** (reading.errors - 1), self.max_backoff)
+
+        reading = self.state.record(self.name, value)
+        if self.on_change is not None and (previous.timestamp is None or value != previous.value):
+            self.on_change(self.name, reading)
+        return self.interval
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            delay = self.sample()
+            self._stop.wait(max(0.0, delay - (time.monotonic() - started)))
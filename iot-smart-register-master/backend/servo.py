@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Servo actuator thread for the SG90 vent servo
+
+All servo movement goes through one ServoActuator, which owns the PWM
+object. Callers (the main loop, the web API, the gas alarm) submit a
+command and return at once; the actuator thread executes it.
+
+- Latest wins: there is at most one pending command. A new command
+  replaces it, and interrupts the movement in progress, unless the
+  other command has a higher priority.
+- Priority: PRIORITY_ALARM > PRIORITY_MANUAL > PRIORITY_AUTO. A command
+  submitted with hold=True (the gas alarm opening the vent) rejects all
+  lower priority commands until release() is called.
+- Smooth motion: the angle follows a cosine ease-in/ease-out profile at
+  the configured speed, updated once per PWM period; the pulse is cut
+  after the servo has settled to stop jitter.
+'''
+
+import math
+import threading
+import time
+
+from jobs import JobRegistry
+
+PRIORITY_AUTO = 0    # Main loop vent decisions
+PRIORITY_MANUAL = 1  # Web API requests
+PRIORITY_ALARM = 2   # Gas/smoke alarm
+
+
+class ServoActuator:
+    def __init__(self, gpio, pin, frequency=50, min_pulse=500, max_pulse=2400,
+                 speed=360.0, step_interval=0.02, settle=0.2, initial_angle=90,
+                 on_change=None, on_command=None, jobs=None):
+        '''
+        :param gpio: Object with the RPi.GPIO interface
+        :param pin: Servo signal pin
+        :param frequency: PWM frequency in Hz
+        :param min_pulse: Pulse width for 0 degrees in microseconds
+        :param max_pulse: Pulse width for 180 degrees in microseconds
+        :param speed: Average speed of a movement in degrees per second
+        :param step_interval: Seconds between position updates during a movement
+        :param settle: Seconds the pulse is held after a movement before it is cut
+        :param initial_angle: Angle the servo is moved to on start()
+        :param on_change: Callable(angle) run whenever a movement ends or is interrupted
+        :param on_command: Callable(kind, latency, duration, state) run when a command ends:
+                           seconds from submit to its first movement, seconds it ran,
+                           and its final state
+        :param jobs: JobRegistry for command records (a private one if omitted)
+        '''
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.min_pulse = min_pulse
+        self.max_pulse = max_pulse
+        self.speed = speed
+        self.step_interval = step_interval
+        self.settle = settle
+        self.on_change = on_change
+        self.on_command = on_command
+        self.jobs = jobs if jobs is not None else JobRegistry()
+
+        self.position = initial_angle  # Last angle sent to the servo
+        self.target = initial_angle    # Where the servo is heading
+        self.hold_priority = None      # Priority of the current hold, if any
+        self._pending = None           # (job id, priority, segments, kind, submit time)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.pwm = None
+
+        # Statistics
+        self.commands = 0
+        self.completed = 0
+        self.superseded = 0
+        self.overridden = 0
+
+    def angle_to_duty_cycle(self, angle):
+        '''Convert angle (0 to 180 degrees) to duty cycle'''
+        angle = min(180, max(0, angle))
+        pulse_width = self.min_pulse + (angle / 180) * (self.max_pulse - self.min_pulse)
+        return pulse_width * self.frequency / 1e6 * 100
+
+    # ===== LIFECYCLE =====
+    def start(self):
+        self.gpio.setup(self.pin, self.gpio.OUT)
+        self.pwm = self.gpio.PWM(self.pin, self.frequency)
+        self.pwm.start(0)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.move(self.position, PRIORITY_AUTO, source="init")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.pwm is not None:
+            self.pwm.stop()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # ===== COMMANDS =====
+    def move(self, angle, priority=PRIORITY_MANUAL, source="api", hold=False):
+        '''
+        Move to an angle
+
+        :param hold: Keep rejecting lower priority commands until release(priority)
+        :return: Copy of the job record
+        '''
+        angle = min(180, max(0, angle))
+        return self._submit("move", priority, [(angle, self.speed)], source, hold, angle=angle)
+
+    def sweep(self, start_angle, end_angle, speed, priority=PRIORITY_MANUAL, source="api"):
+        '''Move to start_angle, then travel to end_angle at speed degrees per second'''
+        segments = [(start_angle, self.speed), (end_angle, min(speed, self.speed))]
+        return self._submit("sweep", priority, segments, source, False,
+                            start=start_angle, end=end_angle)
+
+    def release(self, priority):
+        '''End a hold taken with move(..., hold=True) at this priority'''
+        with self._cond:
+            if self.hold_priority == priority:
+                self.hold_priority = None
+
+    def _submit(self, kind, priority, segments, source, hold, **fields):
+        with self._cond:
+            self.commands += 1
+            job = self.jobs.create(kind, source=source, priority=priority, **fields)
+            blocked_by = [self.hold_priority] if self.hold_priority is not None else []
+            if self._pending is not None:
+                blocked_by.append(self._pending[1])
+            if blocked_by and priority < max(blocked_by):
+                self.overridden += 1
+                self.jobs.update(job["id"], "overridden")
+                job["state"] = "overridden"
+                return job
+            if self._pending is not None:
+                self.superseded += 1
+                self.jobs.update(self._pending[0], "superseded")
+            if hold:
+                self.hold_priority = priority
+            self._pending = (job["id"], priority, segments, kind, time.perf_counter())
+            self._cond.notify_all()
+        return job
+
+    def status(self):
+        with self._cond:
+            return {
+                "position": round(self.position, 1),
+                "target": self.target,
+                "hold_priority": self.hold_priority,
+                "pending": self._pending is not None,
+                "commands": self.commands,
+                "completed": self.completed,
+                "superseded": self.superseded,
+                "overridden": self.overridden,
+            }
+
+    # ===== ACTUATOR THREAD =====
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                job_id, priority, segments, kind, submitted = self._pending
+                self._pending = None
+            started = time.perf_counter()
+            self.jobs.update(job_id, "running")
+            finished = self._execute(priority, segments)
+            if self.on_change is not None:
+                self.on_change(round(self.position))
+            if finished:
+                self.completed += 1
+                self.jobs.update(job_id, "done", {"status": "success", "angle": round(self.position)})
+            else:
+                self.superseded += 1
+                self.jobs.update(job_id, "superseded", {"status": "superseded", "angle": round(self.position)})
+            if self.on_command is not None:
+                self.on_command(kind, started - submitted, time.perf_counter() - started,
+                                "done" if finished else "superseded")
+
+    def _preempted(self, priority):
+        '''True if a command that may preempt the current one is waiting (call with the lock held)'''
+        return not self._running or (self._pending is not None and self._pending[1] >= priority)
+
+    def _execute(self, priority, segments):
+        '''Run the segments of one command; False if it was interrupted'''
+        for angle, speed in segments:
+            self.target = angle
+            start = self.position
+            distance = angle - start
+            duration = max(self.step_interval, abs(distance) / speed)
+            steps = max(1, int(math.ceil(duration / self.step_interval)))
+            for step in range(1, steps + 1):
+                # Cosine ease-in/ease-out between start and target
+                fraction = (1 - math.cos(math.pi * step / steps)) / 2
+                self.position = start + distance * fraction
+                self.pwm.ChangeDutyCycle(self.angle_to_duty_cycle(self.position))
+                # Wait for the next step, or stop at once for a preempting command
+                with self._cond:
+                    if self._cond.wait_for(lambda: self._preempted(priority), duration / steps):
+                        return False
+        self.position = self.target
+
+        # Hold the pulse until the servo has settled, then cut it to prevent jitter
+        with self._cond:
+            busy = self._cond.wait_for(lambda: not self._running or self._pending is not None, self.settle)
+        if not busy:
+            self.pwm.ChangeDutyCycle(0)
+        return True
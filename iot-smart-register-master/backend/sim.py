@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Simulated hardware for backend.py (hardware.py uses it when SMART_REGISTER_SIM=1)
+
+Everything is scripted through `world`:
+
+  world.gpio          SimGPIO: a FakeGPIO whose input pins follow scripts
+                      (the PIR and MQ-2 outputs) and whose PWM channels
+                      report the servo angle they command
+  world.temperature   scripts read by the simulated DHT11, which also
+  world.humidity      fails a share of its reads like the real sensor
+  world.published     messages sent through the simulated PubNub, which
+                      has a configurable latency and failure rate
+
+A script is a function of simulated time in seconds; constant(), steps()
+and pulses() build the common ones. Simulated time runs world.speed
+times faster than the wall clock so that minutes of scenario play in
+seconds (the backend's own intervals are scaled to match by
+bench_backend.py).
+'''
+
+import bisect
+import random
+import threading
+import time
+
+from fake_gpio import FakeGPIO, FakePWM
+
+SERVO_MIN_PULSE = 500   # Microseconds at 0 degrees (SG90)
+SERVO_MAX_PULSE = 2400  # Microseconds at 180 degrees
+
+# Stand-ins for config.py
+publish_key = "sim-publish-key"
+subscribe_key = "sim-subscribe-key"
+uuid = "smart-register-sim"
+channel = "smart-register-sim"
+
+
+# ===== SCRIPTS =====
+def constant(value):
+    return lambda t: value
+
+
+def steps(*points):
+    '''Piecewise-constant script: steps((0, 22), (600, 27)) is 22 until t=600, then 27'''
+    times = [t for t, value in points]
+    values = [value for t, value in points]
+    return lambda t: values[max(0, bisect.bisect_right(times, t) - 1)]
+
+
+def pulses(period, width, start=0.0):
+    '''True for width seconds once every period seconds from start (someone passing the PIR)'''
+    return lambda t: t >= start and (t - start) % period < width
+
+
+# ===== GPIO =====
+class SimPWM(FakePWM):
+    @property
+    def angle(self):
+        '''Servo angle the current duty cycle commands, or None while the pulse is off'''
+        if not self.duty_cycle:
+            return None
+        pulse = self.duty_cycle / 100 / self.frequency * 1e6
+        return (pulse - SERVO_MIN_PULSE) / (SERVO_MAX_PULSE - SERVO_MIN_PULSE) * 180
+
+
+class SimGPIO(FakeGPIO):
+    def __init__(self, now, resolution=0.002):
+        '''
+        :param now: Callable returning the simulated time scripts are evaluated at
+        :param resolution: Wall seconds between checks of the driven pins for edges
+        '''
+        super().__init__()
+        self.now = now
+        self.resolution = resolution
+        self._drivers = {}  # pin -> script returning the level
+        self._thread = None
+
+    def drive(self, pin, script, active_low=False):
+        '''Make an input pin follow script (truthy means active)'''
+        if active_low:
+            self._drivers[pin] = lambda t: int(not script(t))
+        else:
+            self._drivers[pin] = lambda t: int(bool(script(t)))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._play, name="sim-signals", daemon=True)
+            self._thread.start()
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        super().setup(pin, direction, pull_up_down, initial)
+        if pin in self._drivers:
+            with self._lock:
+                self.levels[pin] = self._drivers[pin](self.now())
+
+    def input(self, pin):
+        driver = self._drivers.get(pin)
+        return driver(self.now()) if driver is not None else super().input(pin)
+
+    def PWM(self, pin, frequency):
+        pwm = SimPWM(self, pin, frequency)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def _play(self):
+        '''Fire edge callbacks from a thread of their own, as RPi.GPIO does'''
+        while True:
+            now = self.now()
+            for pin, driver in list(self._drivers.items()):
+                level = driver(now)
+                if self.levels.get(pin) != level:
+                    self.set_input(pin, level)
+            time.sleep(self.resolution)
+
+
+# ===== DHT11 =====
+class DHT11Result:
+    '''Same interface as the result of the dht11 library'''
+    ERR_NO_ERROR = 0
+    ERR_MISSING_DATA = 1
+    ERR_CRC = 2
+
+    def __init__(self, error_code, temperature, humidity):
+        self.error_code = error_code
+        self.temperature = temperature
+        self.humidity = humidity
+
+    def is_valid(self):
+        return self.error_code == DHT11Result.ERR_NO_ERROR
+
+
+class DHT11:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read(self):
+        time.sleep(world.dht_read_time)  # The real driver bit-bangs the pin for this long
+        if world.random.random() < world.dht_failure_rate:
+            return DHT11Result(DHT11Result.ERR_MISSING_DATA, 0, 0)
+        t = world.now()
+        return DHT11Result(DHT11Result.ERR_NO_ERROR, int(round(world.temperature(t))),
+                           int(round(world.humidity(t))))
+
+
+# ===== PUBNUB =====
+class PubNubException(Exception):
+    pass
+
+
+class PNConfiguration:
+    def __init__(self):
+        self.publish_key = None
+        self.subscribe_key = None
+        self.uuid = None
+
+
+class _Status:
+    def __init__(self, error_data=None):
+        self.error_data = error_data
+
+    def is_error(self):
+        return self.error_data is not None
+
+
+class _Envelope:
+    def __init__(self, status):
+        self.status = status
+
+
+class _Publish:
+    def __init__(self):
+        self._channel = None
+        self._message = None
+
+    def channel(self, channel):
+        self._channel = channel
+        return self
+
+    def message(self, message):
+        self._message = message
+        return self
+
+    def sync(self):
+        time.sleep(world.publish_latency)
+        if world.random.random() < world.publish_failure_rate:
+            return _Envelope(_Status("Simulated publish failure"))
+        world.published.append((time.monotonic(), self._channel, self._message))
+        return _Envelope(_Status())
+
+
+class PubNub:
+    def __init__(self, config):
+        self.config = config
+
+    def publish(self):
+        return _Publish()
+
+
+# ===== WORLD =====
+class Simulation:
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.speed = 1.0
+        self.started = time.monotonic()
+        self.gpio = SimGPIO(self.now)
+        self.temperature = constant(22)
+        self.humidity = constant(45)
+        self.dht_failure_rate = 0.05  # Share of DHT11 reads that fail
+        self.dht_read_time = 0.02     # Wall seconds one DHT11 read blocks
+        self.publish_latency = 0.05   # Wall seconds one PubNub publish blocks
+        self.publish_failure_rate = 0.0
+        self.published = []           # (time.monotonic(), channel, message)
+
+    def start(self, speed=1.0):
+        '''Restart simulated time at 0, running speed times faster than the wall clock'''
+        self.speed = speed
+        self.started = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self.started) * self.speed
+
+
+world = Simulation()
+GPIO = world.gpio
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Shared system status snapshot
+
+The main loop, the gas callback and the servo actuator update the
+snapshot whenever a value changes; HTTP handlers only read it. The JSON
+body is serialized once per change instead of once per request, and is
+replaced as a whole, so a reader never sees a half-updated status.
+
+Every change bumps the version and wakes the threads blocked in
+wait_for_change(), which is how /api/events pushes one shared update to
+all of its subscribers.
+'''
+
+import json
+import threading
+
+
+class StatusCache:
+    def __init__(self, **fields):
+        self._cond = threading.Condition()
+        self._fields = dict(fields)
+        self._body = json.dumps(self._fields).encode()
+        self.version = 0
+        self.subscribers = 0
+
+    def update(self, **fields):
+        '''Merge fields into the snapshot; returns True if anything changed'''
+        with self._cond:
+            if all(self._fields.get(key) == value for key, value in fields.items()):
+                return False
+            merged = dict(self._fields)
+            merged.update(fields)
+            self._body = json.dumps(merged).encode()
+            self._fields = merged
+            self.version += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, key, default=None):
+        return self._fields.get(key, default)
+
+    def fields(self):
+        '''The current snapshot (must not be modified)'''
+        return self._fields
+
+    def json_bytes(self):
+        '''The current snapshot, already serialized'''
+        return self._body
+
+    def add_subscriber(self, limit):
+        '''Count a new stream subscriber; False if limit are already connected'''
+        with self._cond:
+            if self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+
+    def remove_subscriber(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def wait_for_change(self, version, timeout=None):
+        '''
+        Block until the snapshot is newer than version
+
+        :return: (version, body), unchanged if the timeout expired first
+        '''
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version, self._body
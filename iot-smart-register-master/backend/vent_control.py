@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Vent decision logic of the control loop
+
+Kept free of hardware imports so that replay.py can check its NumPy
+version against this one and tune the thresholds on recorded data.
+'''
+
+# Configuration parameters
+TEMP_HIGH = 26  # High temperature threshold (Celsius)
+TEMP_LOW = 18   # Low temperature threshold (Celsius)
+HUMIDITY_HIGH = 70  # High humidity threshold (percentage)
+NO_MOTION_TIME = 600  # Time without motion to consider room empty (10 minutes = 600 seconds)
+VENT_CHANGE_INTERVAL = 10  # The main loop adjusts the vent at most once per this many seconds
+
+
+def decide_vent_position(temp, humidity, motion_detected, last_motion_time, current_time, gas_detected,
+                         temp_high=TEMP_HIGH, temp_low=TEMP_LOW, humidity_high=HUMIDITY_HIGH,
+                         no_motion_time=NO_MOTION_TIME):
+    '''Decide vent position based on sensor data - Modified for SG90 range'''
+    # Default position: half open (90 degrees)
+    position = 90
+    reason = "Normal ventilation"
+
+    # Gas detection takes highest priority - fully open if gas detected
+    if gas_detected:
+        position = 180  # Gas detected, fully open
+        reason = "Gas/smoke detected!"
+        return position, reason
+
+    # Adjust based on temperature
+    if temp > temp_high:
+        position = 180  # High temp, fully open
+        reason = f"High temp ({temp}C)"
+    elif temp < temp_low:
+        position = 0  # Low temp, closed
+        reason = f"Low temp ({temp}C)"
+
+    # Adjust based on humidity (only when temperature is in normal range)
+    if temp_low <= temp <= temp_high and humidity > humidity_high:
+        position = 180  # High humidity, fully open
+        reason = f"High humidity ({humidity}%)"
+
+    # Adjust based on motion detection
+    no_motion = current_time - last_motion_time
+    if not motion_detected and no_motion > no_motion_time:
+        # Long time no motion - room is likely empty, open vent to refresh air
+        position = 180  # Fully open for ventilation
+        reason = f"No motion ({int(no_motion//60)}min) - ventilating"
+
+    return position, reason
@@ -133,6 +133,39 @@ document.addEventListener('DOMContentLoaded', function () {
   // Configure motion detection persistence time (in milliseconds)
   const MOTION_PERSISTENCE_DURATION = 10000; // 10 seconds
 
+  // Last known state: each message only carries the fields that changed
+  const sensorState = {};
+
+  // Newest seq applied per field. An urgent message (the gas alarm) is sent
+  // before the backlog buffered during an outage, so older messages can
+  // arrive after newer ones and must not overwrite them.
+  const fieldSeq = {};
+  let lastSeq = 0;
+  let lastTs = 0;
+
+  // Merge a message into sensorState; false if it is older than what is shown
+  function applySensorMessage(message) {
+    if (message.seq === undefined) {
+      Object.assign(sensorState, message);
+      return true;
+    }
+    if (message.seq < lastSeq && message.ts > lastTs) {
+      // A lower seq measured later: the Pi restarted and counts from 1 again
+      Object.keys(fieldSeq).forEach(key => delete fieldSeq[key]);
+      lastSeq = 0;
+    }
+    Object.keys(message).forEach(key => {
+      if (!(fieldSeq[key] > message.seq)) {
+        sensorState[key] = message[key];
+        fieldSeq[key] = message.seq;
+      }
+    });
+    if (message.seq < lastSeq) return false;
+    lastSeq = message.seq;
+    lastTs = message.ts;
+    return true;
+  }
+
   // Helper function to determine if motion is detected
   function isMotionDetected(motionValue) {
     // Convert various motion value formats to boolean
@@ -269,6 +302,21 @@ document.addEventListener('DOMContentLoaded', function () {
     console.error('Error initializing servo angle:', error);
   }
 
+  // Live status pushed by the Pi whenever it changes (Server-Sent Events)
+  if (window.EventSource) {
+    const statusEvents = new EventSource(`${API_BASE_URL}/api/events`);
+    let lastGasDetected = false;
+    statusEvents.addEventListener('status', event => {
+      const status = JSON.parse(event.data);
+      if (angleDisplay) angleDisplay.textContent = status.angle;
+      updateServoArmVisual(status.angle);
+      if (status.gas_detected && !lastGasDetected) {
+        showStatus('Gas/smoke detected! Vent opened', true);
+      }
+      lastGasDetected = status.gas_detected;
+    });
+  }
+
   // API - Set angle
   function setAngle(angle) {
     return fetch(`${API_BASE_URL}/api/set_angle`, {
@@ -327,6 +375,19 @@ document.addEventListener('DOMContentLoaded', function () {
       });
   }
 
+  // API - Poll a servo job until it has finished
+  function waitForJob(jobId, interval = 500) {
+    return fetch(`${API_BASE_URL}/api/jobs/${jobId}`)
+      .then(response => response.json())
+      .then(job => {
+        if (job.state === 'queued' || job.state === 'running') {
+          return new Promise(resolve => setTimeout(resolve, interval))
+            .then(() => waitForJob(jobId, interval));
+        }
+        return job;
+      });
+  }
+
   // API - Execute sweep
   function startSweep(startAngle, endAngle, step, delay) {
     return fetch(`${API_BASE_URL}/api/sweep`, {
@@ -343,13 +404,21 @@ document.addEventListener('DOMContentLoaded', function () {
     })
       .then(response => response.json())
       .then(data => {
-        if (data.status === 'success') {
-          showStatus(`Sweep completed: ${data.start}° to ${data.end}°`);
-          fetchCurrentAngle(); // Update current angle display
-        } else {
+        if (data.status !== 'success') {
           showStatus(`Sweep failed: ${data.message}`, true);
+          return data;
         }
-        return data;
+        // The sweep runs in the background; wait for its job to finish
+        showStatus(`Sweeping: ${data.start}° to ${data.end}°`);
+        return waitForJob(data.job_id).then(job => {
+          if (job.state === 'done') {
+            showStatus(`Sweep completed: ${data.start}° to ${data.end}°`);
+          } else {
+            showStatus(`Sweep failed: ${job.result ? job.result.message : job.state}`, true);
+          }
+          fetchCurrentAngle(); // Update current angle display
+          return data;
+        });
       })
       .catch(error => {
         console.error('Sweep failed:', error);
@@ -479,118 +548,136 @@ document.addEventListener('DOMContentLoaded', function () {
   }
 
   // Update PubNub Listener for both monitoring and servo control
-  pubnub.addListener({
-    message: function (event) {
-      // Update connection status
-      const connectionStatus = document.getElementById('connection-status');
-      if (connectionStatus) {
-        connectionStatus.className = 'status connected';
-        connectionStatus.innerText = 'Connected - Receiving Data';
-      }
+  // Show one sensor message: a delta with the changed fields, or a full state
+  function handleSensorMessage(message) {
+    // Update connection status
+    const connectionStatus = document.getElementById('connection-status');
+    if (connectionStatus) {
+      connectionStatus.className = 'status connected';
+      connectionStatus.innerText = 'Connected - Receiving Data';
+    }
 
-      const data = event.message;
-      const timestamp = new Date();
-      const timeString = timestamp.toLocaleTimeString();
+    // Messages replayed after an outage carry the time they were measured
+    const timestamp = message.ts ? new Date(message.ts * 1000) : new Date();
+    const timeString = timestamp.toLocaleTimeString();
 
-      // Debug raw data
-      addDebugEntry(`Received raw data: ${JSON.stringify(data)}`);
+    // Debug raw data
+    addDebugEntry(`Received raw data: ${JSON.stringify(message)}`);
 
-      // Update dashboard values
-      if (data.temperature !== null && data.temperature !== undefined) {
-        const tempElement = document.getElementById('temperature-value');
-        if (tempElement) tempElement.innerText = data.temperature.toFixed(1);
-      }
+    // Apply the delta and render the merged state; a late (older) message
+    // only fills in fields nothing newer has set, and is not charted or logged
+    const isLatest = applySensorMessage(message);
+    const data = sensorState;
 
-      if (data.humidity !== null && data.humidity !== undefined) {
-        const humidityElement = document.getElementById('humidity-value');
-        if (humidityElement) humidityElement.innerText = data.humidity.toFixed(1);
-      }
+    // Update dashboard values
+    if (data.temperature !== null && data.temperature !== undefined) {
+      const tempElement = document.getElementById('temperature-value');
+      if (tempElement) tempElement.innerText = data.temperature.toFixed(1);
+    }
 
-      // Handle smoke/gas detection
-      if (data.gas !== undefined) {
-        const smokeValueElement = document.getElementById('smoke-value');
-        const smokeStatusElement = document.getElementById('smoke-status');
+    if (data.humidity !== null && data.humidity !== undefined) {
+      const humidityElement = document.getElementById('humidity-value');
+      if (humidityElement) humidityElement.innerText = data.humidity.toFixed(1);
+    }
 
-        if (smokeValueElement && smokeStatusElement) {
-          if (data.gas) {
-            smokeValueElement.innerText = 'Warning';
-            smokeValueElement.style.color = '#e74c3c';
-            smokeStatusElement.innerText = 'Gas or smoke detected!';
-          } else {
-            smokeValueElement.innerText = 'Normal';
-            smokeValueElement.style.color = '#3498db';
-            smokeStatusElement.innerText = 'No gas detected';
-          }
+    // Handle smoke/gas detection
+    if (data.gas !== undefined) {
+      const smokeValueElement = document.getElementById('smoke-value');
+      const smokeStatusElement = document.getElementById('smoke-status');
+
+      if (smokeValueElement && smokeStatusElement) {
+        if (data.gas) {
+          smokeValueElement.innerText = 'Warning';
+          smokeValueElement.style.color = '#e74c3c';
+          smokeStatusElement.innerText = 'Gas or smoke detected!';
+        } else {
+          smokeValueElement.innerText = 'Normal';
+          smokeValueElement.style.color = '#3498db';
+          smokeStatusElement.innerText = 'No gas detected';
         }
       }
+    }
 
-      // Handle motion detection with persistence
-      const motionElement = document.getElementById('motion-value');
-      const lastDetectedElement = document.getElementById('last-detected');
+    // Handle motion detection with persistence
+    const motionElement = document.getElementById('motion-value');
+    const lastDetectedElement = document.getElementById('last-detected');
 
-      // Debug motion value
-      addDebugEntry(`Motion value: ${data.motion} (Type: ${typeof data.motion})`);
+    // Debug motion value
+    addDebugEntry(`Motion value: ${data.motion} (Type: ${typeof data.motion})`);
 
-      // Check for motion detection using the helper function
-      const motionDetected = isMotionDetected(data.motion);
-      addDebugEntry(`Motion detected: ${motionDetected}`);
+    // Check for motion detection using the helper function
+    const motionDetected = isMotionDetected(data.motion);
+    addDebugEntry(`Motion detected: ${motionDetected}`);
 
-      if (motionDetected && motionElement && lastDetectedElement) {
-        // Clear any existing timeout
-        if (motionTimeoutId !== null) {
-          clearTimeout(motionTimeoutId);
-          addDebugEntry('Cleared previous motion timeout');
-        }
+    if (motionDetected && isLatest && motionElement && lastDetectedElement) {
+      // Clear any existing timeout: motion is only sent again when it changes,
+      // so it stays detected until the PIR reports it gone
+      if (motionTimeoutId !== null) {
+        clearTimeout(motionTimeoutId);
+        motionTimeoutId = null;
+        addDebugEntry('Cleared previous motion timeout');
+      }
 
-        // Set motion to detected state
-        motionElement.innerText = 'Motion Detected';
-        motionElement.className = 'value motion detected';
-        motionDetectionActive = true;
+      // Set motion to detected state
+      motionElement.innerText = 'Motion Detected';
+      motionElement.className = 'value motion detected';
+      motionDetectionActive = true;
+
+      // Update last detection time
+      lastMotionTime = timestamp;
+      lastDetectedElement.innerText = 'Last detected: Just now';
+      addDebugEntry('Updated motion status to "Detected"');
+    } else if (!motionDetected && motionDetectionActive && motionTimeoutId === null && motionElement) {
+      // Motion ended: keep showing it for the persistence duration
+      lastMotionTime = timestamp;
+      motionTimeoutId = setTimeout(() => {
+        motionElement.innerText = 'No Motion';
+        motionElement.className = 'value motion';
+        motionDetectionActive = false;
+        motionTimeoutId = null;
+        addDebugEntry('Motion persistence timeout expired, status reset to "No Motion"');
 
         // Update last detection time
-        lastMotionTime = timestamp;
-        lastDetectedElement.innerText = 'Last detected: Just now';
-        addDebugEntry('Updated motion status to "Detected"');
-
-        // Set timeout to clear motion after persistence duration
-        motionTimeoutId = setTimeout(() => {
-          motionElement.innerText = 'No Motion';
-          motionElement.className = 'value motion';
-          motionDetectionActive = false;
-          addDebugEntry('Motion persistence timeout expired, status reset to "No Motion"');
-
-          // Update last detection time
-          updateLastDetectedTime();
-        }, MOTION_PERSISTENCE_DURATION);
-      }
-
-      // Update "time ago" display for motion detection
-      if (lastMotionTime !== null) {
         updateLastDetectedTime();
-      }
+      }, MOTION_PERSISTENCE_DURATION);
+    }
 
-      // Update charts
-      if (data.temperature !== null && data.temperature !== undefined) {
-        addDataPoint(temperatureChart, timeString, data.temperature);
-      }
-      if (data.humidity !== null && data.humidity !== undefined) {
-        addDataPoint(humidityChart, timeString, data.humidity);
-      }
+    // Update "time ago" display for motion detection
+    if (lastMotionTime !== null) {
+      updateLastDetectedTime();
+    }
 
-      // Add log entry
-      addLogEntry(data, timeString);
-
-      // Update servo angle from PubNub data if available
-      if (data.vent_angle !== undefined) {
-        // Only update the servo visual and form elements when not on the control tab
-        const servoControlActive = document.getElementById('servo-control');
-        if (servoControlActive && !servoControlActive.classList.contains('active')) {
-          updateServoArmVisual(data.vent_angle);
-          if (angleDisplay) angleDisplay.textContent = data.vent_angle;
-          if (angleSlider) angleSlider.value = data.vent_angle;
-          if (angleInput) angleInput.value = data.vent_angle;
-        }
+    if (!isLatest) return;
+
+    // Update charts (only with readings this message brought)
+    if (message.temperature !== null && message.temperature !== undefined) {
+      addDataPoint(temperatureChart, timeString, message.temperature);
+    }
+    if (message.humidity !== null && message.humidity !== undefined) {
+      addDataPoint(humidityChart, timeString, message.humidity);
+    }
+
+    // Add log entry
+    addLogEntry(data, timeString);
+
+    // Update servo angle from PubNub data if available
+    if (data.vent_angle !== undefined) {
+      // Only update the servo visual and form elements when not on the control tab
+      const servoControlActive = document.getElementById('servo-control');
+      if (servoControlActive && !servoControlActive.classList.contains('active')) {
+        updateServoArmVisual(data.vent_angle);
+        if (angleDisplay) angleDisplay.textContent = data.vent_angle;
+        if (angleSlider) angleSlider.value = data.vent_angle;
+        if (angleInput) angleInput.value = data.vent_angle;
       }
+    }
+  }
+
+  pubnub.addListener({
+    message: function (event) {
+      // The Pi sends several messages per publish as {batch: [...]}
+      const messages = Array.isArray(event.message.batch) ? event.message.batch : [event.message];
+      messages.forEach(handleSensorMessage);
     },
     status: function (event) {
       addDebugEntry(`PubNub status: ${event.category}`);